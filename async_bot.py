@@ -0,0 +1,977 @@
+"""
+Асинхронная среда исполнения бота.
+
+Все обращения к VK API и базе данных неблокирующие, поэтому тысячи диалогов
+обслуживаются одним циклом событий. Логика шагов общая с vkinder.VkBot (bot_core).
+"""
+
+import asyncio
+import json
+import logging
+
+import aiohttp
+import asyncpg
+
+import messages
+import photos as top_photos
+
+from bot_core import BotCore, UserDataCache
+from cache import ResponseCache
+from cards import CardCache
+from config import (
+    SEARCH_CACHE_SIZE,
+    SEARCH_CACHE_TTL,
+    PHOTOS_CACHE_SIZE,
+    PHOTOS_CACHE_TTL,
+    CARDS_CACHE_SIZE,
+    CARDS_CACHE_TTL,
+    DELIVERY_MODE,
+    MAX_SESSIONS,
+    SESSION_IDLE_TIMEOUT,
+    MAX_SEEN_PROFILES,
+    SEARCH_FETCH_COUNT,
+    SEARCH_HAS_PHOTO,
+    SEARCH_SORT,
+    SEARCH_MAX_COUNT,
+    USER_TOKEN_STRATEGY,
+    USER_TOKEN_QUARANTINE,
+    CONNECT_TIMEOUT,
+    READ_TIMEOUT,
+)
+from dialog import Session, parse_command
+from pipeline import CandidateBuffer
+from query_planner import QueryPlanner
+from seen import SeenIndex
+from ratelimit import call_limited_async, get_bucket
+from scoring import SEARCH_FIELDS
+from search_stream import AsyncProfileStream
+from token_pool import TokenPool
+from transport import TransportError, backoff_delay
+from vk_client import call_many_async
+
+# Адрес и версия VK API
+VK_API_URL = "https://api.vk.com/method/"
+VK_API_VERSION = "5.92"
+
+# Событие long poll: новое сообщение
+LONGPOLL_MESSAGE_NEW = 4
+# Флаг исходящего сообщения
+LONGPOLL_FLAG_OUTBOX = 2
+# peer_id больше этого значения принадлежат беседам
+CHAT_PEER_OFFSET = 2000000000
+
+
+class AsyncApiError(Exception):
+    """
+    Ошибка VK API
+    """
+
+    def __init__(self, method: str, error: dict):
+        self.method = method
+        self.code = error.get("error_code")
+        self.error = error
+        super().__init__(f"[{self.code}] {error.get('error_msg')}")
+
+
+class AsyncVkApi:
+    """
+    Неблокирующий клиент VK API
+    """
+
+    def __init__(self, token: str, http: aiohttp.ClientSession, rate: float):
+        self.token = token
+        self.http = http
+        # Общий лимит запросов токена (совместно с синхронным ботом)
+        self.bucket = get_bucket(token, rate)
+
+    async def call(self, method: str, **params):
+        """
+        Вызов метода VK API с учётом лимита и повтором при ошибках 6/9.
+
+        Args:
+            method (str): Имя метода, например "users.search"
+            **params:     Параметры метода
+
+        Returns:
+            Поле response ответа VK
+        """
+        return await call_limited_async(self.bucket, self.request, method, **params)
+
+    async def request(self, method: str, **params):
+        """
+        Вызов метода VK API.
+
+        Args:
+            method (str): Имя метода, например "users.search"
+            **params:     Параметры метода
+
+        Returns:
+            Поле response ответа VK
+
+        Raises:
+            AsyncApiError:  Если VK вернул ошибку
+            TransportError: Ошибка сети или таймаут
+        """
+        params = {key: value for key, value in params.items() if value is not None}
+        params.update(access_token=self.token, v=VK_API_VERSION)
+        try:
+            async with self.http.post(VK_API_URL + method, data=params) as response:
+                data = await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+            raise TransportError(method, error) from error
+
+        if "error" in data:
+            raise AsyncApiError(method, data["error"])
+        return data["response"]
+
+
+class AsyncEvent:
+    """
+    Входящее сообщение пользователя
+    """
+
+    __slots__ = ("user_id", "text")
+
+    def __init__(self, user_id: int, text: str):
+        self.user_id = user_id
+        self.text = text
+
+
+# Ошибки, после которых long poll переподключается
+LONGPOLL_ERRORS = (
+    aiohttp.ClientError,
+    asyncio.TimeoutError,
+    AsyncApiError,
+    TransportError,
+    ValueError,
+)
+
+
+class AsyncLongPoll:
+    """
+    Неблокирующий клиент User Long Poll (messages.getLongPollServer)
+    """
+
+    def __init__(self, api: AsyncVkApi, wait: int = 25):
+        self.api = api
+        self.wait = wait
+        self.server = None
+        self.key = None
+        self.ts = None
+
+    async def update_server(self, update_ts: bool = True) -> None:
+        """
+        Получение адреса и ключа long poll сервера.
+
+        Args:
+            update_ts (bool): Обновить также номер последнего события
+        """
+        server = await self.api.call("messages.getLongPollServer", lp_version=3)
+        self.server = server["server"]
+        self.key = server["key"]
+        if update_ts:
+            self.ts = server["ts"]
+
+    async def check(self) -> list:
+        """
+        Один запрос к long poll серверу.
+
+        Returns:
+            list: Новые сообщения пользователей
+        """
+        params = {
+            "act": "a_check",
+            "key": self.key,
+            "ts": self.ts,
+            "wait": self.wait,
+            "mode": 2,
+            "version": 3,
+        }
+        timeout = aiohttp.ClientTimeout(total=self.wait + 10)
+        async with self.api.http.get(
+            f"https://{self.server}", params=params, timeout=timeout
+        ) as response:
+            data = await response.json(content_type=None)
+
+        failed = data.get("failed")
+        if failed == 1:
+            self.ts = data["ts"]
+        elif failed == 2:
+            await self.update_server(update_ts=False)
+        elif failed == 3:
+            await self.update_server()
+        if failed:
+            return []
+
+        self.ts = data["ts"]
+        return [
+            AsyncEvent(update[3], update[5])
+            for update in data.get("updates", [])
+            if update[0] == LONGPOLL_MESSAGE_NEW
+            and not update[2] & LONGPOLL_FLAG_OUTBOX
+            and update[3] < CHAT_PEER_OFFSET
+        ]
+
+    async def listen(self, backoff: float = 1.0):
+        """
+        Бесконечный поток входящих сообщений с переподключением при сбоях.
+
+        Args:
+            backoff (float): Начальная пауза перед переподключением, секунды
+
+        Yields:
+            AsyncEvent: Сообщение пользователя
+        """
+        attempt = 0
+        while True:
+            try:
+                if self.server is None:
+                    await self.update_server(update_ts=self.ts is None)
+                events = await self.check()
+            except LONGPOLL_ERRORS as error:
+                delay = backoff_delay(attempt, backoff)
+                logging.warning(
+                    "Соединение long poll потеряно (%s), переподключение через %.1f с",
+                    error,
+                    delay,
+                )
+                # Заново получаем адрес сервера и ключ, номер события сохраняется
+                self.server = None
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            attempt = 0
+            for event in events:
+                yield event
+
+
+class AsyncVKinder:
+    """
+    Асинхронный поиск пользователей
+    """
+
+    def __init__(self, tokens: TokenPool):
+        """
+        Args:
+            tokens (TokenPool): Пул токенов пользователя с клиентами AsyncVkApi
+        """
+        self.tokens = tokens
+        # Общие для всех пользователей кэши ответов API
+        self.search_cache = ResponseCache(
+            "users.search", SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL
+        )
+        self.photos_cache = ResponseCache(
+            "photos", PHOTOS_CACHE_SIZE, PHOTOS_CACHE_TTL
+        )
+        self.cards = CardCache(CARDS_CACHE_SIZE, CARDS_CACHE_TTL)
+        self.planner = QueryPlanner(SEARCH_HAS_PHOTO, SEARCH_SORT, SEARCH_MAX_COUNT)
+
+    # pylint: disable = too-many-arguments
+    async def search_users(
+        self,
+        age: int,
+        gender: int,
+        city: int,
+        status: int,
+        count: int = 15,
+        offset: int = 0,
+    ) -> list | None:
+        """
+        Поиск пользователей по заданным критериям.
+
+        Args:
+            age (int):    Возраст
+            gender (int): Пол
+            city (int):   Город
+            status (int): Семейное положение
+            count (int):  Количество пользователей
+            offset (int): Смещение
+
+        Returns:
+            list: Список пользователей / None
+        """
+        page = await self.search_page(age, gender, city, status, count, offset)
+        return None if page is None else page["items"]
+
+    # pylint: disable = too-many-arguments
+    async def search_page(
+        self,
+        age: int,
+        gender: int,
+        city: int,
+        status: int,
+        count: int = 15,
+        offset: int = 0,
+        birth_month: int | None = None,
+        birth_day: int | None = None,
+    ) -> dict | None:
+        """
+        Страница поиска вместе с размером выборки (см. VKinder.search_page).
+
+        Returns:
+            dict: {"items": анкеты, "count": размер выборки} / None
+        """
+        key = self.search_cache.key(
+            *(int(value) for value in (age, gender, city, status, count, offset)),
+            birth_month,
+            birth_day,
+        )
+        return await self.search_cache.get_or_load_async(
+            key,
+            lambda: self._search_page(
+                age,
+                gender,
+                city,
+                status,
+                count=count,
+                offset=offset,
+                birth_month=birth_month,
+                birth_day=birth_day,
+            ),
+        )
+
+    async def _search_page(self, age: int, gender: int, city: int, status: int, **kw):
+        """
+        Запрос users.search без кэша.
+
+        Returns:
+            dict: {"items": анкеты, "count": размер выборки} / None
+        """
+        try:
+            response = await self.tokens.call_async(
+                "users.search",
+                age_from=age,
+                age_to=age,
+                sex=gender,
+                city=city,
+                status=status,
+                fields=SEARCH_FIELDS,
+                **self.planner.filters,
+                **kw,
+            )
+        except (AsyncApiError, TransportError) as error:
+            logging.error("Ошибка при поиске пользователей:  %s", error)
+            return None
+
+        return {"items": response["items"], "count": response["count"]}
+
+    # pylint: disable = too-many-arguments
+    def iter_profiles(
+        self,
+        age: int,
+        gender: int,
+        city: int,
+        status: int,
+        seen=(),
+        position: int = 0,
+        page_size: int = 50,
+    ) -> AsyncProfileStream:
+        """
+        Асинхронный поток открытых и ещё не показанных анкет для async for
+        (см. VKinder.iter_profiles).
+
+        Returns:
+            AsyncProfileStream: Асинхронный итератор анкет с позицией поиска
+        """
+        params = {"age": age, "gender": gender, "city": city, "status": status}
+        return AsyncProfileStream(
+            self.search_page, params, seen, position, page_size, self.planner
+        )
+
+    async def get_top_photos(self, user_id: int, top_count: int = 3) -> list | None:
+        """
+        Получение топ N фото пользователя.
+
+        Args:
+            user_id (int): Идентификатор пользователя
+            top_count (int): Количество фото (по умолчанию 3)
+
+        Returns:
+            list: Топ N фото
+        """
+        return await self.photos_cache.get_or_load_async(
+            self.photos_cache.key(int(user_id), top_count),
+            lambda: self._get_top_photos(user_id, top_count),
+        )
+
+    async def _get_top_photos(self, user_id: int, top_count: int) -> list | None:
+        """
+        Запрос фото пользователя без кэша.
+
+        Returns:
+            list: Топ N фото
+        """
+        try:
+            photos = await self.tokens.call_async(
+                "photos.getAll", owner_id=user_id, extended=1
+            )
+        except (AsyncApiError, TransportError) as error:
+            logging.error("Ошибка при получении фото пользователя:  %s", error)
+            return None
+
+        return top_photos.top_photos(photos, top_count)
+
+    async def get_top_photos_batch(self, user_ids: list, top_count: int = 3) -> dict:
+        """
+        Получение топ N фото нескольких пользователей через execute.
+
+        Args:
+            user_ids (list): Идентификаторы пользователей
+            top_count (int): Количество фото (по умолчанию 3)
+
+        Returns:
+            dict: ID пользователя -> топ N фото / None
+        """
+
+        async def fetch(chunk: list) -> dict:
+            try:
+                response = await self.tokens.call_async(
+                    "execute", code=top_photos.top_photos_code(chunk)
+                )
+            except (AsyncApiError, TransportError) as error:
+                logging.error("Ошибка при получении фото пользователей:  %s", error)
+                response = None
+            fetched = top_photos.parse_top_photos(chunk, response, top_count)
+            for user_id, photos in fetched.items():
+                if photos is not None:
+                    self.photos_cache.memory.set(
+                        self.photos_cache.key(int(user_id), top_count), photos
+                    )
+            return fetched
+
+        result = {}
+        missing = []
+        for user_id in user_ids:
+            cached = self.photos_cache.memory.get(
+                self.photos_cache.key(int(user_id), top_count)
+            )
+            if cached is None:
+                missing.append(user_id)
+            else:
+                result[user_id] = cached
+
+        for part in await asyncio.gather(
+            *(fetch(chunk) for chunk in top_photos.chunks(missing))
+        ):
+            result.update(part)
+        return result
+
+    async def get_profile_cards(self, user_ids: list) -> dict:
+        """
+        Карточки анкет: из кэша, для остальных - по топ 3 фото.
+
+        Args:
+            user_ids (list): Идентификаторы анкет
+
+        Returns:
+            dict: ID анкеты -> cards.ProfileCard
+        """
+        cards, missing = self.cards.lookup(user_ids)
+        if missing:
+            cards.update(self.cards.store(await self.get_top_photos_batch(missing)))
+        return cards
+
+
+class AsyncCandidatePipeline(CandidateBuffer):
+    """
+    Буфер кандидатов с фоновой загрузкой в задаче asyncio
+    """
+
+    def __init__(self, stream, vkinder: AsyncVKinder, **kwargs):
+        """
+        Args:
+            stream:                 Поток анкет (AsyncVKinder.iter_profiles)
+            vkinder (AsyncVKinder): Клиент поиска (карточки анкет)
+            **kwargs:               Параметры CandidateBuffer
+        """
+        super().__init__(stream, **kwargs)
+        self.vkinder = vkinder
+        self.task = None
+        self.lock = asyncio.Lock()
+
+    async def next_page(self, seen) -> list | None:
+        """
+        Следующая страница анкет (из буфера, если она уже загружена).
+
+        Args:
+            seen: Уже показанные пользователю анкеты
+
+        Returns:
+            list: Анкеты / None при ошибке API
+        """
+        if self.task is not None:
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+        async with self.lock:
+            self.error = False
+            await self._fill(seen)
+            page = self.take(seen)
+
+        if not page and self.error:
+            return None
+        return page
+
+    def prefetch(self, seen) -> None:
+        """
+        Фоновая загрузка следующей страницы.
+
+        Args:
+            seen: Уже показанные пользователю анкеты
+        """
+        if self.task is not None or self.ready():
+            return
+        self.task = asyncio.create_task(self._prefetch(seen))
+
+    async def _prefetch(self, seen) -> None:
+        """
+        Пополнение буфера в фоновой задаче.
+
+        Args:
+            seen: Уже показанные пользователю анкеты
+        """
+        async with self.lock:
+            await self._fill(seen)
+
+    async def _fill(self, seen) -> None:
+        """
+        Пополнение буфера до размера страницы.
+
+        Args:
+            seen: Уже показанные пользователю анкеты
+        """
+        self.stream.seen = seen
+        for _ in range(self.max_requests):
+            if not self.needs_search() or self.error:
+                break
+            self.pool.extend(await self.stream.fetch())
+
+        best = self.select()
+        if best:
+            self.add(
+                best,
+                await self.vkinder.get_profile_cards([user["id"] for user in best]),
+            )
+
+
+class AsyncSaver:
+    """
+    Асинхронное сохранение состояния пользователя
+    """
+
+    def __init__(
+        self,
+        pool: asyncpg.Pool,
+        table: str = "seen_profiles",
+        sessions_table: str = "sessions",
+    ):
+        self.pool = pool
+        self.table = table
+        self.sessions_table = sessions_table
+
+    @classmethod
+    async def create(cls, connection_string: str, table: str = "seen_profiles"):
+        """
+        Миграция схемы БД и создание пула соединений.
+
+        Схема приводится к последней версии теми же версионными миграциями,
+        что и у синхронного бота (database.migrate, один раз при запуске).
+
+        Args:
+            connection_string (str): Строка подключения к БД
+            table (str):             Имя таблицы
+
+        Returns:
+            AsyncSaver: Объект работы с БД
+        """
+        # pylint: disable = import-outside-toplevel
+        from database import migrate
+
+        version = await asyncio.to_thread(migrate, connection_string, table=table)
+        logging.info("Версия схемы БД: %s", version)
+        pool = await asyncpg.create_pool(connection_string)
+        return cls(pool, table)
+
+    async def save_state(self, user_id: int, state: dict) -> None:
+        """
+        Сохраняет состояние диалога пользователя.
+
+        Args:
+            user_id (int): ID пользователя ВКонтакте
+            state (dict):  Состояние диалога
+        """
+        await self.pool.execute(
+            f"""
+            INSERT INTO {self.sessions_table} (user_id, state, updated_at)
+            VALUES ($1, $2, now())
+            ON CONFLICT (user_id) DO UPDATE SET
+                state = EXCLUDED.state,
+                updated_at = EXCLUDED.updated_at;
+            """,
+            user_id,
+            json.dumps(state),
+        )
+
+    async def load_state(self, user_id: int) -> dict | None:
+        """
+        Извлекает сохранённое состояние диалога.
+
+        Args:
+            user_id (int): ID пользователя
+
+        Returns:
+            dict: Состояние диалога или None
+        """
+        result = await self.pool.fetchval(
+            f"SELECT state FROM {self.sessions_table} WHERE user_id = $1;", user_id
+        )
+        return json.loads(result) if result else None
+
+    async def save_session_to_db(self, user_id: int, searched_users: list) -> None:
+        """
+        Сохраняет показанные пользователю анкеты одной вставкой.
+
+        Args:
+            user_id (int):         ID пользователя ВКонтакте
+            searched_users (list): Найденные пользователи
+        """
+        if not searched_users:
+            return
+        await self.pool.execute(
+            f"""
+            INSERT INTO {self.table} (user_id, profile_id)
+            SELECT $1, unnest($2::INTEGER[])
+            ON CONFLICT DO NOTHING;
+            """,
+            user_id,
+            searched_users,
+        )
+
+    async def get_user_data_from_db(self, user_id: int) -> SeenIndex:
+        """
+        Извлекает данные о пользователе из базы данных.
+
+        Args:
+            user_id (int): ID пользователя
+
+        Returns:
+            SeenIndex: Индекс найденных пользователей
+        """
+        rows = await self.pool.fetch(
+            f"SELECT profile_id FROM {self.table} WHERE user_id = $1;", user_id
+        )
+        return SeenIndex(row[0] for row in rows)
+
+    async def close(self) -> None:
+        """
+        Закрытие пула соединений.
+        """
+        await self.pool.close()
+
+
+class AsyncVkBot(BotCore):
+    """
+    Асинхронный бот для группы
+    """
+
+    def __init__(
+        self,
+        group_api: AsyncVkApi,
+        vkinder: AsyncVKinder,
+        saver: AsyncSaver,
+        delivery: str = DELIVERY_MODE,
+    ):
+        super().__init__(
+            UserDataCache(MAX_SESSIONS, SESSION_IDLE_TIMEOUT, MAX_SEEN_PROFILES),
+            delivery,
+        )
+        self.api = group_api
+        self.vkinder = vkinder
+        self.worker_db = saver
+        # Блокировки сохраняют порядок сообщений одного пользователя
+        self.user_locks = {}
+        # Количество ожидающих сообщений пользователя
+        self.user_pending = {}
+
+    async def send_message(
+        self, user_id: int, message: str, attachments: str | None = None
+    ) -> None:
+        """
+        Отправка сообщения пользователю.
+
+        Args:
+            user_id (int): Идентификатор пользователя.
+            message (str): Сообщение.
+            attachments (str, optional): Прикрепленные объекты VK. Defaults to None.
+        """
+        try:
+            await self.api.call(
+                "messages.send",
+                user_id=user_id,
+                message=message,
+                attachment=attachments,
+                random_id=0,
+            )
+        except (AsyncApiError, TransportError) as error:
+            logging.error("Ошибка отправки сообщения: %s", error)
+
+    async def send_profiles(
+        self, user_id: int, profiles: list, header: str | None = None
+    ) -> None:
+        """
+        Отправка профилей
+
+        Args:
+            user_id (int):  ID пользователя
+            profiles:       Список профилей пользователей
+            header (str):   Сообщение перед анкетами
+        """
+        # Карточки анкет, не подготовленных заранее (кэш или один запрос фото)
+        cards = await self.vkinder.get_profile_cards(self.missing_cards(profiles))
+
+        # Заголовок и анкеты одним запросом execute
+        calls = [
+            ("messages.send", self.message_params(user_id, *item))
+            for item in self.page_messages(profiles, cards, header)
+        ]
+        try:
+            await call_many_async(self.api.call, calls)
+        except (AsyncApiError, TransportError) as error:
+            logging.error("Ошибка отправки сообщений: %s", error)
+
+    async def send_prompt(self, user_id: int, handler_name: str) -> str:
+        """
+        Отправка вопроса шага.
+
+        Args:
+            user_id (int):      Идентификатор пользователя.
+            handler_name (str): Имя обработчика шага.
+
+        Returns:
+            str: Статус пользователя в боте.
+        """
+        message, next_step = self.prompt_steps[handler_name]
+        await self.send_message(user_id, message)
+        return next_step
+
+    async def process_age(self, user_id: int, *_) -> str:
+        """
+        Обработка ввода года рождения.
+        """
+        return await self.send_prompt(user_id, "process_age")
+
+    async def process_gender(self, user_id: int, *_) -> str:
+        """
+        Обработка ввода пола.
+        """
+        return await self.send_prompt(user_id, "process_gender")
+
+    async def process_city(self, user_id: int, *_) -> str:
+        """
+        Обработка ввода города.
+        """
+        return await self.send_prompt(user_id, "process_city")
+
+    async def process_status(self, user_id: int, *_) -> str:
+        """
+        Обработка ввода семейного положения.
+        """
+        return await self.send_prompt(user_id, "process_status")
+
+    async def process_search_users(self, user_id: int, data: Session) -> str:
+        """
+        Обработка поиска пользователей
+
+        Args:
+            user_id (int):  Идентификатор пользователя
+            data (Session): Диалог пользователя
+
+        Returns:
+            str: Следующий шаг
+        """
+        current_step = data.step
+        pipeline = self.candidate_pipeline(data)
+        profiles = await pipeline.next_page(data.seen)
+
+        # Найдены ли пользователи
+        if profiles is None:
+            await self.send_message(user_id, messages.ERROR_TOKEN)
+            return current_step
+        if not profiles:
+            await self.send_message(user_id, self.empty_result_message(current_step))
+            return current_step
+
+        data.offset = pipeline.offset
+        data.profiles = profiles
+        await self.send_profiles(user_id, profiles, self.search_header(current_step))
+
+        # Сохраняем новые результаты в бд
+        await self.worker_db.save_session_to_db(
+            user_id, self.remember_profiles(data, profiles)
+        )
+        # Готовим следующую страницу, пока пользователь смотрит текущую
+        pipeline.prefetch(data.seen)
+        return "final"
+
+    def create_pipeline(self, params: dict) -> AsyncCandidatePipeline:
+        """
+        Создание буфера кандидатов с фоновой загрузкой.
+
+        Args:
+            params (dict): Параметры поиска.
+
+        Returns:
+            AsyncCandidatePipeline: Буфер кандидатов.
+        """
+        return AsyncCandidatePipeline(
+            self.vkinder.iter_profiles(**params, page_size=SEARCH_FETCH_COUNT),
+            self.vkinder,
+            scorer=self.scorer,
+        )
+
+    async def process_message(self, event: AsyncEvent) -> None:
+        """
+        Обработка входящего сообщения с сохранением порядка для пользователя.
+
+        Args:
+            event (AsyncEvent): Событие.
+        """
+        lock = self.user_locks.setdefault(event.user_id, asyncio.Lock())
+        self.user_pending[event.user_id] = self.user_pending.get(event.user_id, 0) + 1
+        try:
+            async with lock:
+                await self._process_message(event)
+        finally:
+            # Освобождаем блокировку, если сообщений пользователя больше нет
+            self.user_pending[event.user_id] -= 1
+            if not self.user_pending[event.user_id]:
+                del self.user_pending[event.user_id]
+                del self.user_locks[event.user_id]
+
+    async def _process_message(self, event: AsyncEvent) -> None:
+        """
+        Обработка сообщения под блокировкой пользователя.
+
+        Args:
+            event (AsyncEvent): Событие.
+        """
+        if not event.text:
+            await self.send_message(event.user_id, messages.ERROR_MESSAGE_TYPE)
+            return
+
+        data = self.worker_cache.get_user_data(event.user_id)
+        if data is None:
+            # Восстанавливаем диалог, сохранённый при вытеснении или перезапуске
+            state = await self.worker_db.load_state(event.user_id)
+            data = self.worker_cache.initialize_user_data(
+                event.user_id,
+                await self.worker_db.get_user_data_from_db(event.user_id),
+                state,
+            )
+            # Отправим приветствие
+            if data.step is None:
+                await self.send_message(event.user_id, self.greet_message(data))
+
+        await self.handle_current_step(event.user_id, event.text, data)
+        await self.persist_sessions(self.worker_cache.collect_evicted())
+
+    async def persist_sessions(self, sessions: list) -> None:
+        """
+        Сохранение вытесненных из кэша диалогов в БД.
+
+        Args:
+            sessions (list): Пары (user_id, состояние).
+        """
+        for user_id, state in sessions:
+            try:
+                await self.worker_db.save_state(user_id, state)
+            # pylint: disable = broad-exception-caught
+            except Exception as error:
+                logging.error("Ошибка сохранения диалога %s: %s", user_id, error)
+                self.worker_cache.save_failed(user_id)
+            else:
+                self.worker_cache.confirm_saved(user_id)
+
+    async def handle_current_step(self, user_id: int, text: str, data: Session) -> None:
+        """
+        Обработка текущего шага бота
+
+        Args:
+            user_id (int):  Идентификатор пользователя
+            text (str):     Текст сообщения
+            data (Session): Диалог пользователя
+        """
+        command = parse_command(text)
+        if self.is_again_command(command):
+            await self.send_message(
+                user_id, "\n".join([messages.GREET_AGAIN, messages.PROCESS_AGE])
+            )
+            data.step = "age"
+            return
+
+        handler = self.resolve_handler(data, text, command)
+        if handler is None:
+            await self.send_message(user_id, messages.ERROR_MESSAGE_DATA)
+            return
+        data.step = await handler(user_id, data)
+
+
+# pylint: disable = too-many-arguments
+async def run_async_bot(
+    group_token: str,
+    user_tokens: list,
+    connection_string: str,
+    group_rps: float,
+    user_rps: float,
+    max_tasks: int = 1000,
+) -> None:
+    """
+    Запуск асинхронного бота.
+
+    Args:
+        group_token (str):       Токен группы
+        user_tokens (list):      Токены пользователя для поиска
+        connection_string (str): Строка подключения к БД
+        group_rps (float):       Лимит запросов токена группы в секунду
+        user_rps (float):        Лимит запросов токена пользователя в секунду
+        max_tasks (int):         Максимум одновременно обрабатываемых сообщений
+    """
+    timeout = aiohttp.ClientTimeout(
+        sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT
+    )
+    async with aiohttp.ClientSession(timeout=timeout) as http:
+        group_api = AsyncVkApi(group_token, http, group_rps)
+        user_tokens = TokenPool(
+            [(token, AsyncVkApi(token, http, user_rps)) for token in user_tokens],
+            user_rps,
+            USER_TOKEN_STRATEGY,
+            quarantine=USER_TOKEN_QUARANTINE,
+        )
+        saver = await AsyncSaver.create(connection_string)
+        bot = AsyncVkBot(group_api, AsyncVKinder(user_tokens), saver)
+        longpoll = AsyncLongPoll(group_api)
+        semaphore = asyncio.Semaphore(max_tasks)
+        tasks = set()
+
+        async def handle(event: AsyncEvent) -> None:
+            try:
+                await bot.process_message(event)
+            # pylint: disable = broad-exception-caught
+            except Exception as error:
+                logging.exception("Ошибка при обработке сообщения: %s", error)
+            finally:
+                semaphore.release()
+
+        logging.info("VKinder бот запущен (asyncio)!")
+        try:
+            async for event in longpoll.listen():
+                # Ограничиваем количество одновременных задач
+                await semaphore.acquire()
+                task = asyncio.create_task(handle(event))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            await bot.persist_sessions(bot.worker_cache.drain())
+            await saver.close()
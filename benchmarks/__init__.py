@@ -0,0 +1,3 @@
+"""
+Нагрузочные тесты бота на поддельном VK API
+"""
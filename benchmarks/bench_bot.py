@@ -0,0 +1,267 @@
+"""
+Нагрузочный тест бота на поддельном VK API.
+
+N пользователей одновременно проходят сценарий dialog.STATES
+(приветствие -> возраст -> пол -> город -> семейное положение -> "Дальше"...).
+Замеряются сообщения в секунду, задержка ответа (p50/p99), вызовы API на диалог
+и записи в БД. Результат можно сохранить и сравнить с прошлым запуском.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_bot --users 50 --pages 3 --latency 0.05
+    python -m benchmarks.bench_bot --output new.json --baseline old.json
+"""
+
+import argparse
+import json
+import logging
+import threading
+import time
+
+import messages
+
+from benchmarks.fake_vk import FakeEvent, FakeLongPoll, FakeSaver, FakeVkSession
+from cards import PAGE_LAYOUTS
+from config import DELIVERY_MODE
+from dispatcher import EventDispatcher
+from main import handle_event
+from vkinder import VkBot, VKinder
+
+# Метрики, для которых меньше - лучше
+LOWER_IS_BETTER = (
+    "duration_s",
+    "reply_p50_ms",
+    "reply_p99_ms",
+    "step_p50_ms",
+    "step_p99_ms",
+)
+
+
+class ReplyTracker:
+    """
+    Учёт исходящих сообщений и задержки первого ответа на сообщение пользователя
+    """
+
+    def __init__(self):
+        self.waiting = {}
+        self.latencies = []
+        self.sent = 0
+        self._lock = threading.Lock()
+
+    def expect(self, event: FakeEvent) -> None:
+        """
+        Пользователь отправил сообщение и ждёт ответ.
+
+        Args:
+            event (FakeEvent): Сообщение пользователя
+        """
+        with self._lock:
+            self.waiting[event.user_id] = event.created
+
+    def on_send(self, user_id: int, *_) -> None:
+        """
+        Бот отправил сообщение (вызывается поддельным messages.send).
+
+        Args:
+            user_id (int): Получатель
+        """
+        now = time.perf_counter()
+        with self._lock:
+            self.sent += 1
+            created = self.waiting.pop(user_id, None)
+            if created is not None:
+                self.latencies.append(now - created)
+
+
+def percentile(values: list, share: float) -> float:
+    """
+    Перцентиль выборки.
+
+    Args:
+        values (list):  Значения
+        share (float):  Доля (0.5 - медиана)
+
+    Returns:
+        float: Значение перцентиля или 0 для пустой выборки
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+def conversation(user_id: int, pages: int, cities: int) -> list:
+    """
+    Сценарий диалога одного пользователя.
+
+    Args:
+        user_id (int): Идентификатор пользователя
+        pages (int):   Сколько раз запросить следующую страницу
+        cities (int):  Количество разных городов среди пользователей
+
+    Returns:
+        list: Сообщения пользователя по порядку
+    """
+    return [
+        "Привет",
+        str(18 + user_id % 30),
+        str(1 + user_id % 2),
+        str(1 + user_id % cities),
+        "1",
+    ] + [messages.NEXT_PEOPLE] * pages
+
+
+# pylint: disable = too-many-locals
+def run_benchmark(args) -> dict:
+    """
+    Прогон нагрузочного теста.
+
+    Args:
+        args: Параметры командной строки
+
+    Returns:
+        dict: Метрики прогона
+    """
+    tracker = ReplyTracker()
+    group_session = FakeVkSession(
+        args.latency, args.error_rate, on_send=tracker.on_send, seed=1
+    )
+    user_session = FakeVkSession(args.latency, args.error_rate, seed=2)
+    saver = FakeSaver()
+    bot = VkBot(
+        "bench-group-token",
+        None,
+        session=group_session,
+        vkinder=VKinder("bench-user-token", rate=args.user_rps, session=user_session),
+        saver=saver,
+        group_rate=args.group_rps,
+        delivery=args.delivery,
+    )
+
+    step_latencies = []
+    step_lock = threading.Lock()
+
+    def handler(event: FakeEvent) -> None:
+        try:
+            handle_event(bot, event)
+        finally:
+            with step_lock:
+                step_latencies.append(time.perf_counter() - event.created)
+            event.done.set()
+
+    dispatcher = EventDispatcher(handler, workers=args.workers, queue_size=1000)
+    dispatcher.start()
+    longpoll = FakeLongPoll()
+
+    def receive() -> None:
+        for event in longpoll.listen():
+            dispatcher.dispatch(event.user_id, event)
+
+    def simulate(user_id: int) -> None:
+        for text in conversation(user_id, args.pages, args.cities):
+            event = FakeEvent(user_id, text)
+            tracker.expect(event)
+            longpoll.push(event)
+            event.done.wait(args.timeout)
+            if args.think:
+                time.sleep(args.think)
+
+    receiver = threading.Thread(target=receive, daemon=True)
+    receiver.start()
+    started = time.perf_counter()
+    users = [
+        threading.Thread(target=simulate, args=(1000 + index,), daemon=True)
+        for index in range(args.users)
+    ]
+    for thread in users:
+        thread.start()
+    for thread in users:
+        thread.join()
+
+    longpoll.stop()
+    receiver.join()
+    dispatcher.stop()
+    # Дожидаемся отправки всех сообщений из очереди
+    bot.close()
+    duration = time.perf_counter() - started
+
+    api_calls = group_session.calls + user_session.calls
+    return {
+        "users": args.users,
+        "duration_s": round(duration, 3),
+        "messages_sent": tracker.sent,
+        "messages_per_sec": round(tracker.sent / duration, 2),
+        "reply_p50_ms": round(percentile(tracker.latencies, 0.5) * 1000, 2),
+        "reply_p99_ms": round(percentile(tracker.latencies, 0.99) * 1000, 2),
+        "step_p50_ms": round(percentile(step_latencies, 0.5) * 1000, 2),
+        "step_p99_ms": round(percentile(step_latencies, 0.99) * 1000, 2),
+        "api_calls_per_conversation": {
+            method: round(count / args.users, 2)
+            for method, count in sorted(api_calls.items())
+        },
+        "db_writes": dict(saver.writes),
+        "cache": bot.vkinder.cache_stats(),
+        "search_planner": bot.vkinder.planner.stats(),
+    }
+
+
+def compare(
+    result: dict, baseline: dict, lower_is_better: tuple = LOWER_IS_BETTER
+) -> None:
+    """
+    Печать изменений относительно прошлого прогона.
+
+    Args:
+        result (dict):           Текущие метрики
+        baseline (dict):         Метрики прошлого прогона
+        lower_is_better (tuple): Метрики, для которых меньше - лучше
+    """
+    print("\nСравнение с базовым прогоном:")
+    for key, value in result.items():
+        old = baseline.get(key)
+        if not isinstance(value, (int, float)) or not isinstance(old, (int, float)):
+            continue
+        change = (value - old) / old * 100 if old else 0.0
+        better = change < 0 if key in lower_is_better else change > 0
+        mark = "+" if better else ("-" if change else " ")
+        print(f"  {mark} {key:<20} {old:>10} -> {value:<10} ({change:+.1f}%)")
+
+
+def main() -> None:
+    """
+    Разбор аргументов и запуск теста.
+    """
+    parser = argparse.ArgumentParser(description="Нагрузочный тест VKinder")
+    parser.add_argument("--users", type=int, default=20, help="одновременных диалогов")
+    parser.add_argument("--pages", type=int, default=3, help='запросов "Дальше"')
+    parser.add_argument("--cities", type=int, default=5, help="разных городов")
+    parser.add_argument("--workers", type=int, default=4, help="воркеров диспетчера")
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка API, с")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ошибок")
+    parser.add_argument("--group-rps", type=float, default=20, help="лимит группы")
+    parser.add_argument("--user-rps", type=float, default=3, help="лимит пользователя")
+    parser.add_argument(
+        "--delivery",
+        choices=sorted(PAGE_LAYOUTS),
+        default=DELIVERY_MODE,
+        help="отправка страницы анкет",
+    )
+    parser.add_argument("--think", type=float, default=0.0, help="пауза между шагами")
+    parser.add_argument("--timeout", type=float, default=60, help="ожидание ответа, с")
+    parser.add_argument("--output", help="сохранить метрики в JSON")
+    parser.add_argument("--baseline", help="сравнить с сохранёнными метриками")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    result = run_benchmark(args)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            compare(result, json.load(file))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Тест времени запуска бота.
+
+Замеряются импорт main в новом интерпретаторе (медиана из --runs запусков, без
+времени запуска самого интерпретатора), самые медленные импортируемые пакеты,
+создание VkBot на поддельном VK API и обработка первого диалога после запуска
+(с --warm - после прогрева VkBot.warm_up).
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_startup --runs 5
+    python -m benchmarks.bench_startup --output new.json --baseline old.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.bench_bot import compare, conversation, percentile
+from benchmarks.fake_vk import FakeEvent, FakeSaver, FakeVkSession
+
+# Корень репозитория: main.py и settings.ini
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Метрики, для которых меньше - лучше
+LOWER_IS_BETTER = (
+    "interpreter_ms",
+    "import_main_ms",
+    "ready_ms",
+    "warm_up_ms",
+    "first_conversation_ms",
+)
+
+
+def run_python(code: str, *options: str) -> tuple:
+    """
+    Запуск кода в новом интерпретаторе.
+
+    Args:
+        code (str):     Код для python -c
+        *options (str): Параметры интерпретатора (например, "-X", "importtime")
+
+    Returns:
+        tuple: (время выполнения в секундах, вывод stderr)
+    """
+    started = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, *options, "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return time.perf_counter() - started, process.stderr
+
+
+def median_time(code: str, runs: int) -> float:
+    """
+    Медианное время выполнения кода в новом интерпретаторе, секунды.
+    """
+    return percentile([run_python(code)[0] for _ in range(runs)], 0.5)
+
+
+def slowest_packages(count: int) -> dict:
+    """
+    Пакеты верхнего уровня, дольше всего импортируемые при импорте main.
+
+    Args:
+        count (int): Сколько пакетов вывести
+
+    Returns:
+        dict: Пакет -> суммарное время импорта, мс
+    """
+    _, stderr = run_python("import main", "-X", "importtime")
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        name = name.strip()
+        if not cumulative.strip().isdigit() or "." in name or name == "main":
+            continue
+        packages[name] = max(packages.get(name, 0), int(cumulative) / 1000)
+    slowest = sorted(packages.items(), key=lambda item: -item[1])[:count]
+    return {name: round(value, 1) for name, value in slowest}
+
+
+def run_benchmark(args) -> dict:
+    """
+    Прогон теста запуска.
+
+    Args:
+        args: Параметры командной строки
+
+    Returns:
+        dict: Метрики прогона
+    """
+    interpreter = median_time("pass", args.runs)
+    import_main = median_time("import main", args.runs) - interpreter
+
+    # Дальше замеры в этом процессе: импорт уже измерен выше.
+    # Лимиты запросов подняты, чтобы замерять работу бота, а не ожидание
+    # pylint: disable = import-outside-toplevel
+    from main import handle_event
+    from vkinder import VkBot, VKinder
+
+    started = time.perf_counter()
+    bot = VkBot(
+        "startup-group-token",
+        None,
+        session=FakeVkSession(seed=1),
+        vkinder=VKinder(
+            "startup-user-token", rate=1000, session=FakeVkSession(seed=2)
+        ),
+        saver=FakeSaver(),
+        group_rate=1000,
+    )
+    ready = time.perf_counter() - started
+
+    warm_up = 0.0
+    if args.warm:
+        started = time.perf_counter()
+        bot.warm_up()
+        warm_up = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for text in conversation(1000, 1, 1):
+        handle_event(bot, FakeEvent(1000, text))
+    first_conversation = time.perf_counter() - started
+    bot.close()
+
+    return {
+        "runs": args.runs,
+        "warm": args.warm,
+        "interpreter_ms": round(interpreter * 1000, 1),
+        "import_main_ms": round(import_main * 1000, 1),
+        "ready_ms": round(ready * 1000, 2),
+        "warm_up_ms": round(warm_up * 1000, 2),
+        "first_conversation_ms": round(first_conversation * 1000, 2),
+        "slowest_imports_ms": slowest_packages(args.top),
+    }
+
+
+def main() -> None:
+    """
+    Разбор аргументов и запуск теста.
+    """
+    parser = argparse.ArgumentParser(description="Тест времени запуска VKinder")
+    parser.add_argument("--runs", type=int, default=5, help="запусков интерпретатора")
+    parser.add_argument("--top", type=int, default=8, help="медленных импортов")
+    parser.add_argument(
+        "--warm", action="store_true", help="прогреть бота перед первым диалогом"
+    )
+    parser.add_argument("--output", help="сохранить метрики в JSON")
+    parser.add_argument("--baseline", help="сравнить с сохранёнными метриками")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    result = run_benchmark(args)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            compare(result, json.load(file), LOWER_IS_BETTER)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+"""
+Поддельный VK API для нагрузочного тестирования без сети.
+
+FakeVkSession заменяет vk_api.VkApi: get_api() возвращает объект с теми же
+методами (users.search, photos.getAll, photos.getById, messages.send, execute,
+utils.getServerTime),
+ответы детерминированы, задержка и доля ошибок настраиваются.
+"""
+
+import json
+import queue
+import random
+import re
+import threading
+import time
+
+from collections import Counter
+
+from vk_api.exceptions import ApiError
+
+# Анкет в одной выборке (age, gender, city, status)
+PROFILES_PER_BUCKET = 300
+# Доля закрытых профилей
+CLOSED_SHARE = 0.2
+# Вызов в коде vk_client.execute_code: API.метод({параметры}),
+EXECUTE_CALL = re.compile(r"^API\.([\w.]+)\((\{.*\})\),$", re.MULTILINE)
+
+
+class FakeVkSession:
+    """
+    Сессия поддельного VK API
+    """
+
+    # pylint: disable = too-many-arguments
+    def __init__(
+        self,
+        latency: float | dict = 0.0,
+        error_rate: float = 0.0,
+        error_code: int = 6,
+        on_send=None,
+        seed: int = 0,
+    ):
+        """
+        Args:
+            latency (float | dict): Задержка ответа в секундах (общая или по методам)
+            error_rate (float):     Доля запросов, завершающихся ошибкой
+            error_code (int):       Код ошибки VK (6 - слишком много запросов)
+            on_send:                Функция on_send(user_id, message, attachment)
+            seed (int):             Зерно генератора ошибок
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.on_send = on_send
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def get_api(self):
+        """
+        Объект вызова методов, как у vk_api.VkApi.
+
+        Returns:
+            FakeApiMethod: Корневой объект методов
+        """
+        return FakeApiMethod(self)
+
+    def method(self, method: str, values: dict | None = None):
+        """
+        Выполнение метода.
+
+        Args:
+            method (str):  Имя метода
+            values (dict): Параметры
+
+        Returns:
+            Ответ метода
+
+        Raises:
+            ApiError: С вероятностью error_rate
+        """
+        with self._lock:
+            self.calls[method] += 1
+            failed = self.random.random() < self.error_rate
+
+        latency = self.latency
+        if isinstance(latency, dict):
+            latency = latency.get(method, latency.get("default", 0.0))
+        if latency:
+            time.sleep(latency)
+
+        if failed:
+            error = {"error_code": self.error_code, "error_msg": "Fake error"}
+            raise ApiError(self, method, values, {"error": error}, error)
+
+        handler = getattr(self, "api_" + method.replace(".", "_"))
+        return handler(**(values or {}))
+
+    @staticmethod
+    def bucket_ids(age, gender, city, status) -> list:
+        """
+        Детерминированный набор ID анкет для параметров поиска.
+
+        Returns:
+            list: ID анкет
+        """
+        base = hash((int(age), int(gender), int(city), int(status))) % 10_000_000
+        return [100_000_000 + base * 10 + index for index in range(PROFILES_PER_BUCKET)]
+
+    # pylint: disable = too-many-arguments, unused-argument
+    def api_users_search(
+        self,
+        count=20,
+        offset=0,
+        age_from=None,
+        age_to=None,
+        sex=None,
+        city=None,
+        status=None,
+        **_,
+    ) -> dict:
+        """
+        users.search
+        """
+        ids = self.bucket_ids(age_from, sex, city, status)
+        now = int(time.time())
+        items = [
+            {
+                "id": profile_id,
+                "first_name": "Имя",
+                "last_name": "Фамилия",
+                "is_closed": profile_id % 100 < CLOSED_SHARE * 100,
+                "can_access_closed": True,
+                # Поля для ранжирования (scoring.SEARCH_FIELDS)
+                "has_photo": 1 if profile_id % 8 else 0,
+                "bdate": "1.1.1990" if profile_id % 2 else "1.1",
+                "interests": "музыка" if profile_id % 3 == 0 else "",
+                "common_count": profile_id % 7,
+                "last_seen": {"time": now - (profile_id % 240) * 3600},
+                "online": 1 if profile_id % 5 == 0 else 0,
+            }
+            for profile_id in ids[int(offset) : int(offset) + int(count)]
+        ]
+        return {"count": len(ids), "items": items}
+
+    @staticmethod
+    def api_photos_getAll(owner_id, **_) -> dict:  # pylint: disable = invalid-name
+        """
+        photos.getAll
+        """
+        photos_count = owner_id % 8
+        items = [
+            {
+                "id": 1000 + index,
+                "owner_id": owner_id,
+                "likes": {"count": (owner_id * (index + 1)) % 97},
+                "comments": {"count": index},
+            }
+            for index in range(photos_count)
+        ]
+        return {"count": photos_count, "items": items}
+
+    @staticmethod
+    def api_photos_getById(photos, **_) -> list:  # pylint: disable = invalid-name
+        """
+        photos.getById
+        """
+        owner_id, photo_id = str(photos).split("_")
+        return [
+            {
+                "id": int(photo_id),
+                "owner_id": int(owner_id),
+                "likes": {"count": int(photo_id) % 50},
+                "comments": {"count": 1},
+            }
+        ]
+
+    def api_messages_send(self, user_id, message=None, attachment=None, **_) -> int:
+        """
+        messages.send
+        """
+        if self.on_send is not None:
+            self.on_send(user_id, message, attachment)
+        return 1
+
+    @staticmethod
+    def api_utils_getServerTime(**_) -> int:  # pylint: disable = invalid-name
+        """
+        utils.getServerTime
+        """
+        return int(time.time())
+
+    def api_execute(self, code, **_) -> list:
+        """
+        execute: поддерживаются код photos.TOP_PHOTOS_CODE и список вызовов
+        vk_client.execute_code
+        """
+        calls = EXECUTE_CALL.findall(code)
+        if calls:
+            results = []
+            for method, params in calls:
+                with self._lock:
+                    self.calls["execute:" + method] += 1
+                handler = getattr(self, "api_" + method.replace(".", "_"))
+                results.append(handler(**json.loads(params)))
+            return results
+
+        ids = re.search(r"var ids = \[([^\]]*)\]", code)
+        owner_ids = [int(value) for value in ids.group(1).split(",") if value.strip()]
+        with self._lock:
+            self.calls["execute:photos.getAll"] += len(owner_ids)
+        return [self.api_photos_getAll(owner_id) for owner_id in owner_ids]
+
+
+class FakeApiMethod:
+    """
+    Цепочка атрибутов api.users.search -> вызов метода "users.search"
+    """
+
+    __slots__ = ("_session", "_method")
+
+    def __init__(self, session: FakeVkSession, method: str | None = None):
+        self._session = session
+        self._method = method
+
+    def __getattr__(self, name: str):
+        method = name if self._method is None else f"{self._method}.{name}"
+        return FakeApiMethod(self._session, method)
+
+    def __call__(self, **values):
+        return self._session.method(self._method, values)
+
+
+class FakeEvent:
+    """
+    Входящее сообщение long poll
+    """
+
+    __slots__ = ("user_id", "text", "created", "done")
+
+    def __init__(self, user_id: int, text: str):
+        self.user_id = user_id
+        self.text = text
+        self.created = time.perf_counter()
+        self.done = threading.Event()
+
+
+class FakeLongPoll:
+    """
+    Поддельный long poll: события, добавленные через push, выдаются listen()
+    """
+
+    _STOP = object()
+
+    def __init__(self):
+        self.events = queue.Queue()
+
+    def push(self, event: FakeEvent) -> None:
+        """
+        Добавление входящего сообщения.
+
+        Args:
+            event (FakeEvent): Сообщение
+        """
+        self.events.put(event)
+
+    def stop(self) -> None:
+        """
+        Завершение listen().
+        """
+        self.events.put(self._STOP)
+
+    def listen(self):
+        """
+        Поток входящих сообщений.
+
+        Yields:
+            FakeEvent: Сообщение
+        """
+        while True:
+            event = self.events.get()
+            if event is self._STOP:
+                return
+            yield event
+
+
+class FakeSaver:
+    """
+    Хранилище в памяти с интерфейсом database.Saver и счётчиками записей
+    """
+
+    def __init__(self):
+        self.seen = {}
+        self.states = {}
+        self.positions = {}
+        self.writes = Counter()
+        self._lock = threading.Lock()
+
+    def get_user_data_from_db(self, user_id: int):
+        """
+        Показанные анкеты пользователя.
+        """
+        # pylint: disable = import-outside-toplevel
+        from seen import SeenIndex
+
+        with self._lock:
+            return SeenIndex(self.seen.get(user_id, ()))
+
+    def save_session_to_db(self, user_id: int, searched_users: list) -> None:
+        """
+        Сохранение показанных анкет.
+        """
+        with self._lock:
+            self.seen.setdefault(user_id, set()).update(searched_users)
+            self.writes["seen_batches"] += 1
+            self.writes["seen_rows"] += len(searched_users)
+
+    def filter_seen(self, user_id: int, profile_ids) -> list:
+        """
+        Отбор непоказанных анкет.
+        """
+        with self._lock:
+            seen = self.seen.get(user_id, set())
+            return [profile_id for profile_id in profile_ids if profile_id not in seen]
+
+    def save_state(self, user_id: int, state: dict) -> None:
+        """
+        Сохранение состояния диалога.
+        """
+        with self._lock:
+            self.states[user_id] = dict(state)
+            self.writes["states"] += 1
+
+    def load_state(self, user_id: int) -> dict | None:
+        """
+        Чтение состояния диалога.
+        """
+        with self._lock:
+            return self.states.get(user_id)
+
+    def load_longpoll_ts(self, name: str):
+        """
+        Сохранённая позиция long poll.
+        """
+        with self._lock:
+            return self.positions.get(name)
+
+    def save_longpoll_ts(self, name: str, ts) -> None:
+        """
+        Сохранение позиции long poll.
+        """
+        with self._lock:
+            self.positions[name] = str(ts)
+            self.writes["longpoll_ts"] += 1
+
+    def warm_up(self, connections: int) -> None:
+        """
+        Соединений нет.
+        """
+
+    def cache_purge(self) -> None:
+        """
+        Постоянный кэш не используется.
+        """
+
+    def close(self) -> None:
+        """
+        Нечего закрывать.
+        """
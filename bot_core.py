@@ -0,0 +1,438 @@
+"""
+Общая логика шагов диалога, независимая от способа ввода-вывода.
+
+Используется синхронным ботом (vkinder.VkBot) и асинхронным (async_bot.AsyncVkBot):
+здесь только вычисления над данными пользователя, а отправку сообщений и
+обращения к API выполняет конкретная среда исполнения.
+"""
+
+import threading
+import time
+
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+import messages
+
+from cards import COMPACT, PAGE_LAYOUTS, ProfileCard, build_card, page_messages
+from dialog import AGAIN, PROMPTS, STATES, Session
+from scoring import CandidateScorer
+
+
+class UserDataCache:
+    """
+    Класс для кэширования данных пользователей.
+
+    Размер кэша ограничен: давно неактивные и наименее используемые диалоги
+    вытесняются, а их состояние сохраняется средой исполнения в БД
+    (см. collect_evicted) и восстанавливается при следующем сообщении.
+    """
+
+    def __init__(
+        self,
+        max_users: int = 10000,
+        idle_timeout: float = 1800,
+        max_seen: int = 1000000,
+        sweep_interval: float = 60,
+    ):
+        """
+        Args:
+            max_users (int):        Максимум диалогов в памяти
+            idle_timeout (float):   Время бездействия до вытеснения, секунды
+            max_seen (int):         Максимум показанных анкет во всех диалогах
+            sweep_interval (float): Период проверки неактивных диалогов, секунды
+        """
+        self.cache = OrderedDict()
+        self.last_access = {}
+        # Вытесненные диалоги, которые ещё не сохранены в БД, и те из них,
+        # сохранение которых не удалось (повторяется при следующей проверке)
+        self.pending = {}
+        self.retry = set()
+        self.max_users = max_users
+        self.idle_timeout = idle_timeout
+        self.max_seen = max_seen
+        self.sweep_interval = sweep_interval
+        self.last_sweep = time.monotonic()
+        self._lock = threading.Lock()
+
+    def initialize_user_data(
+        self, user_id: int, in_db, state: dict | None = None
+    ) -> Session:
+        """
+        Инициализация данных пользователя при первом взаимодействии.
+
+        Args:
+            user_id (int): Идентификатор пользователя.
+            in_db:         Ранее показанные пользователю анкеты
+                           (SeenIndex или список ID).
+            state (dict):  Сохранённое состояние диалога или None.
+
+        Returns:
+            Session: Диалог пользователя.
+        """
+        data = Session(in_db, state)
+        with self._lock:
+            self.cache[user_id] = data
+            self.last_access[user_id] = time.monotonic()
+        return data
+
+    def get_user_data(self, user_id: int) -> Session | None:
+        """
+        Получение данных пользователя из кэша.
+
+        Args:
+            user_id (int): Идентификатор пользователя.
+
+        Returns:
+            Session or None: Диалог пользователя или None, если пользователь не найден.
+        """
+        with self._lock:
+            data = self.cache.get(user_id)
+            if data is None:
+                # Диалог вытеснен, но ещё не сохранён: возвращаем в кэш
+                data = self.pending.pop(user_id, None)
+                if data is None:
+                    return None
+                self.cache[user_id] = data
+            self.cache.move_to_end(user_id)
+            self.last_access[user_id] = time.monotonic()
+            return data
+
+    def add_user_to_db(self, user_id: int, profile_id: int) -> None:
+        """
+        Добавление ID пользователя в базу данных.
+
+        Args:
+            user_id (int):    Идентификатор пользователя.
+            profile_id (int): ID профиля.
+        """
+        if user_id in self.cache:
+            self.cache[user_id].seen.add(profile_id)
+
+    def collect_evicted(self, force: bool = False) -> list:
+        """
+        Вытеснение лишних и неактивных диалогов.
+
+        Возвращённые состояния нужно сохранить в БД и подтвердить через
+        confirm_saved (или save_failed при ошибке: тогда диалог вернётся
+        при следующей проверке неактивных диалогов).
+
+        Args:
+            force (bool): Проверить неактивные диалоги вне расписания.
+
+        Returns:
+            list: Пары (user_id, состояние) вытесненных диалогов.
+        """
+        now = time.monotonic()
+        evicted = []
+        with self._lock:
+            sweep = force or now - self.last_sweep >= self.sweep_interval
+            if sweep:
+                self.last_sweep = now
+                seen = 0
+                for user_id in list(self.cache):
+                    if now - self.last_access[user_id] >= self.idle_timeout:
+                        evicted.append(user_id)
+                    else:
+                        seen += len(self.cache[user_id].seen)
+                # Ограничение памяти: вытесняем самые старые диалоги
+                for user_id in self.cache:
+                    if seen <= self.max_seen:
+                        break
+                    if user_id not in evicted:
+                        evicted.append(user_id)
+                        seen -= len(self.cache[user_id].seen)
+
+            overflow = len(self.cache) - len(evicted) - self.max_users
+            for user_id in self.cache:
+                if overflow <= 0:
+                    break
+                if user_id not in evicted:
+                    evicted.append(user_id)
+                    overflow -= 1
+
+            result = []
+            for user_id in evicted:
+                data = self.cache.pop(user_id)
+                del self.last_access[user_id]
+                self.pending[user_id] = data
+                result.append((user_id, data.export_state()))
+            if sweep:
+                # Повтор неудавшихся сохранений (если диалог не вернулся в кэш)
+                for user_id in self.retry:
+                    if user_id in self.pending and user_id not in evicted:
+                        result.append((user_id, self.pending[user_id].export_state()))
+                self.retry = set()
+        return result
+
+    def drain(self) -> list:
+        """
+        Вытеснение всех диалогов (при завершении работы).
+
+        Returns:
+            list: Пары (user_id, состояние) всех диалогов.
+        """
+        with self._lock:
+            self.last_access = {user_id: float("-inf") for user_id in self.cache}
+        return self.collect_evicted(force=True)
+
+    def confirm_saved(self, user_id: int) -> None:
+        """
+        Подтверждение сохранения вытесненного диалога в БД.
+
+        Args:
+            user_id (int): Идентификатор пользователя.
+        """
+        with self._lock:
+            self.pending.pop(user_id, None)
+
+    def save_failed(self, user_id: int) -> None:
+        """
+        Диалог не удалось сохранить в БД: он остаётся среди вытесненных
+        и возвращается collect_evicted для повторного сохранения.
+
+        Args:
+            user_id (int): Идентификатор пользователя.
+        """
+        with self._lock:
+            self.retry.add(user_id)
+
+    def __len__(self) -> int:
+        return len(self.cache)
+
+
+class BotCore(ABC):
+    """
+    Общие шаги диалога с пользователем
+    """
+
+    # Количество сохраняемых пользователей за один поиск
+    users_in_find = 5
+
+    # Обработчики-вопросы: имя -> (сообщение, следующий шаг)
+    prompt_steps = PROMPTS
+
+    def __init__(
+        self, worker_cache: UserDataCache | None = None, delivery: str = COMPACT
+    ):
+        if delivery not in PAGE_LAYOUTS:
+            raise ValueError(f"Неизвестный способ отправки анкет: {delivery}")
+        # Локальное сохранение данных
+        self.worker_cache = worker_cache or UserDataCache()
+        # Раскладка страницы анкет по сообщениям (cards.PAGE_LAYOUTS)
+        self.delivery = delivery
+        # Ранжирование найденных анкет
+        self.scorer = CandidateScorer()
+
+        # Состояния при работе с пользователем: шаг -> (состояние, обработчик)
+        self.step_handlers = {
+            step: (state, getattr(self, state.handler))
+            for step, state in STATES.items()
+        }
+
+    @staticmethod
+    def greet_message(data: Session) -> str:
+        """
+        Приветствие в зависимости от наличия истории поиска.
+
+        Args:
+            data (Session): Диалог пользователя.
+
+        Returns:
+            str: Текст приветствия.
+        """
+        return messages.GREET_AGAIN if data.seen else messages.GREET_FIRST
+
+    @staticmethod
+    def is_again_command(command: str | None) -> bool:
+        """
+        Проверка команды повторного поиска.
+
+        Args:
+            command (str): Команда из dialog.parse_command.
+
+        Returns:
+            bool: True, если пользователь начинает поиск заново.
+        """
+        return command == AGAIN
+
+    def resolve_handler(self, data: Session, text: str, command: str | None):
+        """
+        Разбор ввода текущего шага и выбор обработчика.
+
+        Корректное значение сразу сохраняется в поле диалога.
+
+        Args:
+            data (Session): Диалог пользователя.
+            text (str):     Текст сообщения.
+            command (str):  Команда из dialog.parse_command.
+
+        Returns:
+            Обработчик шага или None, если ввод некорректен.
+        """
+        entry = self.step_handlers.get(data.step)
+        if entry is None:
+            return None
+        state, handler = entry
+        value = state.read(text, command)
+        if value is None:
+            return None
+        if state.field is not None:
+            setattr(data, state.field, value)
+        return handler
+
+    @abstractmethod
+    def create_pipeline(self, params: dict):
+        """
+        Создание буфера кандидатов для среды исполнения.
+
+        Args:
+            params (dict): Параметры поиска.
+
+        Returns:
+            pipeline.CandidateBuffer: Буфер кандидатов.
+        """
+
+    def candidate_pipeline(self, data: Session):
+        """
+        Буфер кандидатов пользователя: новый при вводе последнего фильтра,
+        иначе текущий.
+
+        Args:
+            data (Session): Диалог пользователя.
+
+        Returns:
+            pipeline.CandidateBuffer: Буфер кандидатов.
+        """
+        if data.step == "status" or data.pipeline is None:
+            data.pipeline = self.create_pipeline(data.search_params())
+            data.pipeline.page_size = self.users_in_find
+            # Продолжаем восстановленный после перезапуска поиск
+            if data.step != "status":
+                data.pipeline.offset = data.offset
+        return data.pipeline
+
+    @staticmethod
+    def empty_result_message(current_step: str) -> str:
+        """
+        Сообщение, если анкет не найдено.
+
+        Args:
+            current_step (str): Текущий шаг.
+
+        Returns:
+            str: Текст сообщения.
+        """
+        return (
+            messages.ERROR_FIND
+            if current_step == "status"
+            else messages.NO_MORE_PROFILES
+        )
+
+    @staticmethod
+    def search_header(current_step: str) -> str:
+        """
+        Сообщение перед выдачей анкет.
+
+        Args:
+            current_step (str): Текущий шаг.
+
+        Returns:
+            str: Текст сообщения.
+        """
+        # Добавим интуитивное взаимодействие
+        return (
+            messages.PROCESS_FINAL
+            if current_step == "status"
+            else messages.PROCESS_NEXT_PROFILES
+        )
+
+    @staticmethod
+    def missing_cards(profiles: list) -> list:
+        """
+        Анкеты, для которых карточки ещё не подготовлены.
+
+        Args:
+            profiles (list): Анкеты.
+
+        Returns:
+            list: ID анкет без карточек.
+        """
+        return [profile["id"] for profile in profiles if profile.get("card") is None]
+
+    @staticmethod
+    def profile_card(profile: dict, cards: dict) -> ProfileCard:
+        """
+        Карточка анкеты: подготовленная заранее, загруженная или ссылка без фото.
+
+        Args:
+            profile (dict): Анкета пользователя.
+            cards (dict):   ID анкеты -> карточка (VKinder.get_profile_cards).
+
+        Returns:
+            ProfileCard: Карточка.
+        """
+        return (
+            profile.get("card")
+            or cards.get(profile["id"])
+            or build_card(profile["id"], None)
+        )
+
+    def page_messages(self, profiles: list, cards: dict, header: str | None) -> list:
+        """
+        Сообщения страницы анкет в выбранном способе отправки.
+
+        Args:
+            profiles (list): Анкеты страницы.
+            cards (dict):    ID анкеты -> карточка (VKinder.get_profile_cards).
+            header (str):    Сообщение перед анкетами или None.
+
+        Returns:
+            list: cards.PageMessage в порядке отправки.
+        """
+        page = [self.profile_card(profile, cards) for profile in profiles]
+        return page_messages(page, header, self.delivery)
+
+    @staticmethod
+    def remember_profiles(data: Session, profiles: list) -> list:
+        """
+        Запоминание показанных анкет в данных пользователя.
+
+        Args:
+            data (Session):  Диалог пользователя.
+            profiles (list): Показанные анкеты.
+
+        Returns:
+            list: ID показанных анкет для сохранения в БД.
+        """
+        profiles_id = [profile["id"] for profile in profiles]
+        # Добавим в список найденных пользователей, чтобы не обращаться заново к базе
+        data.seen.extend(profiles_id)
+        return profiles_id
+
+    @staticmethod
+    def message_params(
+        user_id: int,
+        message: str,
+        attachments: str | None = None,
+        template: str | None = None,
+    ) -> dict:
+        """
+        Параметры messages.send для пакетной отправки через execute.
+
+        Args:
+            user_id (int):     Идентификатор пользователя.
+            message (str):     Сообщение.
+            attachments (str): Прикрепленные объекты VK.
+            template (str):    Шаблон сообщения (карусель) в JSON.
+
+        Returns:
+            dict: Параметры метода.
+        """
+        return {
+            "user_id": user_id,
+            "message": message,
+            "attachment": attachments,
+            "template": template,
+            "random_id": 0,
+        }
@@ -0,0 +1,334 @@
+"""
+Кэш ответов VK API: TTL + LRU, объединение одинаковых запросов и постоянный уровень
+"""
+
+import json
+import logging
+import threading
+import time
+
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Потокобезопасный LRU-кэш с временем жизни записей
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 600):
+        """
+        Args:
+            maxsize (int): Максимальное количество записей
+            ttl (float):   Время жизни записи, секунды
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Получение значения по ключу.
+
+        Args:
+            key:     Ключ
+            default: Значение, если записи нет или она устарела
+
+        Returns:
+            Значение из кэша или default
+        """
+        with self._lock:
+            item = self.data.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self.data[key]
+                self.misses += 1
+                return default
+            self.data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def peek(self, key, default=None):
+        """
+        Получение значения без учёта в статистике попаданий и промахов
+        (повторная проверка уже учтённого запроса).
+
+        Args:
+            key:     Ключ
+            default: Значение, если записи нет или она устарела
+
+        Returns:
+            Значение из кэша или default
+        """
+        with self._lock:
+            item = self.data.get(key)
+            if item is None or item[0] < time.monotonic():
+                return default
+            return item[1]
+
+    def set(self, key, value, ttl: float | None = None) -> None:
+        """
+        Сохранение значения.
+
+        Args:
+            key:         Ключ
+            value:       Значение
+            ttl (float): Время жизни записи (по умолчанию ttl кэша)
+        """
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self.data[key] = (expires, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def stats(self) -> dict:
+        """
+        Статистика кэша.
+
+        Returns:
+            dict: Количество записей, попаданий и промахов
+        """
+        with self._lock:
+            return {"size": len(self.data), "hits": self.hits, "misses": self.misses}
+
+
+class SingleFlight:
+    """
+    Объединение одновременных одинаковых запросов: выполняется только первый,
+    остальные потоки ждут его результат.
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, loader):
+        """
+        Выполнение loader один раз для всех одновременных вызовов с ключом key.
+
+        Args:
+            key:    Ключ запроса
+            loader: Функция без аргументов
+
+        Returns:
+            Результат loader
+        """
+        with self._lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = {"event": threading.Event(), "result": None}
+
+        if not leader:
+            call["event"].wait()
+            return call["result"]
+
+        try:
+            call["result"] = loader()
+        finally:
+            with self._lock:
+                del self.calls[key]
+            call["event"].set()
+        return call["result"]
+
+
+class AsyncSingleFlight:
+    """
+    Объединение одновременных одинаковых запросов в asyncio
+    """
+
+    def __init__(self):
+        self.calls = {}
+
+    async def do(self, key, loader):
+        """
+        Выполнение корутины loader() один раз для всех одновременных вызовов.
+
+        Args:
+            key:    Ключ запроса
+            loader: Функция без аргументов, возвращающая корутину
+
+        Returns:
+            Результат loader
+        """
+        # pylint: disable = import-outside-toplevel
+        import asyncio
+
+        future = self.calls.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self.calls[key] = future
+        try:
+            result = await loader()
+        except BaseException:
+            future.set_result(None)
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            del self.calls[key]
+        return result
+
+
+class ResponseCache:
+    """
+    Двухуровневый кэш ответов API: память и необязательное постоянное хранилище.
+
+    Запросы обслуживаются только из памяти. Постоянное хранилище не стоит на
+    пути запроса: записи уходят в него отложенно (cache_store ставит их
+    в очередь), а читаются один раз при прогреве (preload), чтобы кэш
+    пережил перезапуск.
+
+    Пустые ответы (None) не кэшируются, чтобы ошибка API не запоминалась.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float, store=None):
+        """
+        Args:
+            name (str):    Имя кэша (префикс ключей в хранилище)
+            maxsize (int): Максимальное количество записей в памяти
+            ttl (float):   Время жизни записи, секунды
+            store:         Постоянное хранилище с методами cache_load_many
+                           и cache_store (отложенная запись)
+        """
+        self.name = name
+        self.memory = TTLCache(maxsize, ttl)
+        self.store = store
+        self.flight = SingleFlight()
+        self.async_flight = AsyncSingleFlight()
+
+    def key(self, *parts) -> str:
+        """
+        Ключ записи.
+
+        Args:
+            *parts: Части ключа (параметры запроса)
+
+        Returns:
+            str: Ключ
+        """
+        return json.dumps([self.name, *parts])
+
+    def get(self, key):
+        """
+        Поиск записи в памяти.
+
+        Args:
+            key (str): Ключ
+
+        Returns:
+            Значение или None
+        """
+        return self.memory.get(key)
+
+    def preload(self) -> int:
+        """
+        Загрузка записей этого кэша из постоянного хранилища в память
+        (при прогреве, до maxsize самых свежих записей).
+
+        Returns:
+            int: Количество загруженных записей
+        """
+        if self.store is None:
+            return 0
+        try:
+            # Ключи этого кэша начинаются с '["имя",'
+            entries = self.store.cache_load_many(
+                self.key()[:-1] + ",", self.memory.maxsize
+            )
+        # pylint: disable = broad-exception-caught
+        except Exception as error:
+            logging.error("Ошибка чтения кэша из базы данных: %s", error)
+            return 0
+        for key, value, ttl in entries:
+            self.memory.set(key, value, ttl)
+        return len(entries)
+
+    def set(self, key, value) -> None:
+        """
+        Сохранение записи в памяти и в очереди записи постоянного хранилища.
+
+        Args:
+            key (str): Ключ
+            value:     Значение
+        """
+        if value is None:
+            return
+        self.memory.set(key, value)
+        if self.store is None:
+            return
+        try:
+            self.store.cache_store(key, value, self.memory.ttl)
+        # pylint: disable = broad-exception-caught
+        except Exception as error:
+            logging.error("Ошибка записи кэша в базу данных: %s", error)
+
+    def get_or_load(self, key, loader):
+        """
+        Значение из кэша или результат loader() с объединением одинаковых запросов.
+
+        Args:
+            key (str): Ключ
+            loader:    Функция загрузки без аргументов
+
+        Returns:
+            Значение
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        def load():
+            # Запрос мог выполниться, пока мы ждали (промах уже учтён)
+            cached = self.memory.peek(key)
+            if cached is not None:
+                return cached
+            result = loader()
+            self.set(key, result)
+            return result
+
+        return self.flight.do(key, load)
+
+    async def get_or_load_async(self, key, loader):
+        """
+        Асинхронный вариант get_or_load (только уровень памяти).
+
+        Args:
+            key (str): Ключ
+            loader:    Функция без аргументов, возвращающая корутину
+
+        Returns:
+            Значение
+        """
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+
+        async def load():
+            # Промах уже учтён, повторная проверка без статистики
+            cached = self.memory.peek(key)
+            if cached is not None:
+                return cached
+            result = await loader()
+            if result is not None:
+                self.memory.set(key, result)
+            return result
+
+        return await self.async_flight.do(key, load)
+
+    def stats(self) -> dict:
+        """
+        Статистика кэша в памяти.
+
+        Returns:
+            dict: Количество записей, попаданий и промахов
+        """
+        return self.memory.stats()
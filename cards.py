@@ -0,0 +1,259 @@
+"""
+Карточки анкет: готовые ссылка и строка вложений для messages.send, и раскладка
+страницы анкет по сообщениям
+"""
+
+import json
+
+from typing import NamedTuple
+
+import messages
+
+from cache import TTLCache
+
+# Способы отправки страницы анкет: сообщение на анкету, анкеты вместе
+# с заголовком в минимуме сообщений, карусель
+SEPARATE = "separate"
+COMPACT = "compact"
+CAROUSEL = "carousel"
+# Максимум вложений в одном сообщении и элементов в карусели
+ATTACHMENTS_LIMIT = 10
+CAROUSEL_LIMIT = 10
+
+
+class ProfileCard(NamedTuple):
+    """
+    Карточка анкеты (кортеж из двух строк, без словаря атрибутов)
+    """
+
+    link: str
+    attachments: str
+
+
+class PageMessage(NamedTuple):
+    """
+    Сообщение страницы анкет (параметры messages.send)
+    """
+
+    message: str
+    attachments: str | None = None
+    template: str | None = None
+
+
+def profile_url(profile_id: int) -> str:
+    """
+    Ссылка на страницу VK.
+
+    Args:
+        profile_id (int): ID анкеты
+
+    Returns:
+        str: Ссылка
+    """
+    return f"https://vk.com/id{profile_id}"
+
+
+def attachment_string(photos: list | None) -> str:
+    """
+    Строка вложений для фото.
+
+    Args:
+        photos (list): Фото в формате photos.top_photos
+
+    Returns:
+        str: Вложения в формате VK (photo{owner_id}_{id} через запятую)
+    """
+    return ",".join(f"photo{photo['owner_id']}_{photo['id']}" for photo in photos or [])
+
+
+def build_card(profile_id: int, photos: list | None) -> ProfileCard:
+    """
+    Карточка анкеты.
+
+    Args:
+        profile_id (int): ID анкеты
+        photos (list):    Топ фото анкеты или None
+
+    Returns:
+        ProfileCard: Карточка
+    """
+    return ProfileCard(profile_url(profile_id), attachment_string(photos))
+
+
+def attachment_count(card: ProfileCard) -> int:
+    """
+    Количество вложений карточки.
+    """
+    return card.attachments.count(",") + 1 if card.attachments else 0
+
+
+def separate_messages(cards: list, header: str | None) -> list:
+    """
+    Заголовок и каждая анкета отдельным сообщением.
+
+    Args:
+        cards (list):  Карточки страницы
+        header (str):  Сообщение перед анкетами или None
+
+    Returns:
+        list: PageMessage
+    """
+    page = [PageMessage(header)] if header else []
+    page.extend(PageMessage(card.link, card.attachments) for card in cards)
+    return page
+
+
+def compact_messages(cards: list, header: str | None) -> list:
+    """
+    Анкеты в минимуме сообщений: заголовок в первом сообщении, в каждом
+    сообщении пронумерованные ссылки и фото этих анкет (не больше
+    ATTACHMENTS_LIMIT вложений). Фото анкеты не разрываются между сообщениями.
+
+    Args:
+        cards (list):  Карточки страницы
+        header (str):  Сообщение перед анкетами или None
+
+    Returns:
+        list: PageMessage
+    """
+    page = []
+    lines = [header.rstrip()] if header else []
+    attachments = []
+    used = 0
+    in_message = 0
+    for number, card in enumerate(cards, 1):
+        count = attachment_count(card)
+        if in_message and used + count > ATTACHMENTS_LIMIT:
+            page.append(PageMessage("\n".join(lines), ",".join(attachments)))
+            lines, attachments, used, in_message = [], [], 0, 0
+        lines.append(f"{number}. {card.link}")
+        if count:
+            attachments.append(card.attachments)
+            used += count
+        in_message += 1
+    if lines:
+        page.append(PageMessage("\n".join(lines), ",".join(attachments) or None))
+    return page
+
+
+def carousel_messages(cards: list, header: str | None) -> list:
+    """
+    Анкеты каруселью в одном сообщении с заголовком (не больше CAROUSEL_LIMIT,
+    остальные - компактно). Элемент карусели открывает страницу анкеты,
+    фото элемента - первое фото анкеты, если фото есть у всех анкет
+    (элементы карусели должны быть однотипными).
+
+    Args:
+        cards (list):  Карточки страницы
+        header (str):  Сообщение перед анкетами или None
+
+    Returns:
+        list: PageMessage
+    """
+    if not cards:
+        return separate_messages(cards, header)
+    shown = cards[:CAROUSEL_LIMIT]
+    with_photos = all(card.attachments for card in shown)
+    elements = []
+    for card in shown:
+        element = {
+            "title": card.link.removeprefix("https://"),
+            "description": messages.CAROUSEL_DESCRIPTION,
+            "action": {"type": "open_link", "link": card.link},
+        }
+        if with_photos:
+            element["photo_id"] = card.attachments.split(",")[0].removeprefix("photo")
+        elements.append(element)
+    template = json.dumps({"type": "carousel", "elements": elements})
+    page = [PageMessage(header or shown[0].link, template=template)]
+    return page + compact_messages(cards[CAROUSEL_LIMIT:], None)
+
+
+# Способ отправки -> функция раскладки страницы
+PAGE_LAYOUTS = {
+    SEPARATE: separate_messages,
+    COMPACT: compact_messages,
+    CAROUSEL: carousel_messages,
+}
+
+
+def page_messages(cards: list, header: str | None, mode: str = COMPACT) -> list:
+    """
+    Раскладка страницы анкет по сообщениям.
+
+    Args:
+        cards (list):  Карточки страницы (ProfileCard)
+        header (str):  Сообщение перед анкетами или None
+        mode (str):    SEPARATE, COMPACT или CAROUSEL
+
+    Returns:
+        list: PageMessage в порядке отправки
+    """
+    return PAGE_LAYOUTS[mode](cards, header)
+
+
+class CardCache:
+    """
+    Кэш карточек анкет по ID (LRU + TTL).
+
+    Популярную анкету показывают многим пользователям: карточка строится
+    один раз и до истечения ttl отправляется без запросов фото.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        """
+        Args:
+            maxsize (int): Максимальное количество карточек
+            ttl (float):   Время жизни карточки, секунды (потом фото
+                           загружаются заново)
+        """
+        self.memory = TTLCache(maxsize, ttl)
+
+    def lookup(self, profile_ids: list) -> tuple:
+        """
+        Поиск карточек в кэше.
+
+        Args:
+            profile_ids (list): ID анкет
+
+        Returns:
+            tuple: (ID -> карточка для найденных, список ID без карточек)
+        """
+        found = {}
+        missing = []
+        for profile_id in profile_ids:
+            card = self.memory.get(int(profile_id))
+            if card is None:
+                missing.append(profile_id)
+            else:
+                found[profile_id] = card
+        return found, missing
+
+    def store(self, photos: dict) -> dict:
+        """
+        Построение и сохранение карточек по загруженным фото.
+
+        Анкеты без доступных фото (None) кэшируются карточкой без вложений;
+        анкет из неудавшегося запроса в photos нет, они загрузятся снова.
+
+        Args:
+            photos (dict): ID анкеты -> топ фото / None
+
+        Returns:
+            dict: ID анкеты -> карточка (для всех ID из photos)
+        """
+        cards = {}
+        for profile_id, top in photos.items():
+            card = build_card(profile_id, top)
+            self.memory.set(int(profile_id), card)
+            cards[profile_id] = card
+        return cards
+
+    def stats(self) -> dict:
+        """
+        Статистика кэша.
+
+        Returns:
+            dict: Количество карточек, попаданий и промахов
+        """
+        return self.memory.stats()
@@ -0,0 +1,143 @@
+"""
+Распределённый режим: приёмник long poll и воркеры, читающие очередь в PostgreSQL.
+
+Приёмник публикует входящие сообщения в таблицу очереди, каждое сообщение
+получает шард user_id % shards. Каждый шард читает ровно один процесс-воркер,
+поэтому сообщения пользователя обрабатываются по порядку, а процессы можно
+запускать на разных ядрах и машинах. Состояние диалогов воркеры сохраняют
+в общей БД через Saver.
+"""
+
+import logging
+import threading
+import time
+
+from database import CONNECTION_ERRORS
+from dispatcher import EventDispatcher
+from group_longpoll import receive_batches
+from transport import backoff_delay
+
+
+class QueuedEvent:
+    """
+    Сообщение пользователя, полученное из очереди
+    """
+
+    __slots__ = ("event_id", "user_id", "text")
+
+    def __init__(self, event_id: int, user_id: int, text: str):
+        self.event_id = event_id
+        self.user_id = user_id
+        self.text = text
+
+
+def run_receiver(session, saver, shards: int, group_id: int = 0) -> None:
+    """
+    Приём сообщений через Bots Long Poll и публикация их в очередь.
+
+    Args:
+        session:        Сессия VK группы
+        saver:          database.Saver
+        shards (int):   Общее количество шардов
+        group_id (int): ID группы (0 - определить по токену)
+    """
+    logging.info("Приёмник VKinder запущен! Шардов: %s", shards)
+    last_ts = None
+    for name, events, ts in receive_batches(session, saver, group_id):
+        if not events and ts == last_ts:
+            continue
+        # Все сообщения одного ответа long poll публикуются одной вставкой
+        # в одной транзакции с новой позицией: сообщение не теряется и
+        # не публикуется дважды
+        rows = [(event.user_id, event.text) for event in events]
+        publish(saver, rows, shards, (name, ts))
+        last_ts = ts
+
+
+def publish(saver, events: list, shards: int, position: tuple) -> None:
+    """
+    Публикация пачки в очередь с повтором, пока БД недоступна.
+
+    Пачка не пропускается: пока она не опубликована, позиция long poll
+    не сдвигается и следующие сообщения не принимаются.
+
+    Args:
+        saver:            database.Saver
+        events (list):    Пары (user_id, текст)
+        shards (int):     Общее количество шардов
+        position (tuple): (имя потока, ts) после этих событий
+    """
+    attempt = 0
+    while True:
+        try:
+            saver.publish_events(events, shards, position)
+            return
+        except CONNECTION_ERRORS as error:
+            delay = backoff_delay(attempt, 1.0)
+            logging.warning(
+                "Очередь в БД недоступна (%s), повтор через %.1f с", error, delay
+            )
+            time.sleep(delay)
+            attempt += 1
+
+
+class QueueConsumer:
+    """
+    Чтение очереди событий своих шардов и передача их в пул воркеров
+    """
+
+    # pylint: disable = too-many-arguments
+    def __init__(
+        self,
+        saver,
+        shards: list,
+        handler,
+        workers: int = 4,
+        batch_size: int = 100,
+        poll_interval: float = 1.0,
+    ):
+        """
+        Args:
+            saver:                 database.Saver
+            shards (list):         Номера шардов этого процесса
+            handler:               Функция обработки события handler(event)
+            workers (int):         Потоков обработки в процессе
+            batch_size (int):      Событий за одно чтение очереди
+            poll_interval (float): Максимальная пауза между чтениями, секунды
+        """
+        self.saver = saver
+        self.shards = list(shards)
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        # События уже удалены из очереди, поэтому ждём места без ограничения
+        self.dispatcher = EventDispatcher(
+            handler, workers=workers, queue_size=batch_size, put_timeout=None
+        )
+        self._stop = threading.Event()
+
+    def stop(self) -> None:
+        """
+        Остановка чтения очереди.
+        """
+        self._stop.set()
+
+    def run(self) -> None:
+        """
+        Чтение очереди до вызова stop().
+        """
+        listener = self.saver.listen()
+        self.dispatcher.start()
+        logging.info("Воркер VKinder запущен! Шарды: %s", self.shards)
+        try:
+            while not self._stop.is_set():
+                rows = self.saver.claim_events(self.shards, self.batch_size)
+                for event_id, user_id, text in rows:
+                    self.dispatcher.dispatch(
+                        user_id, QueuedEvent(event_id, user_id, text)
+                    )
+                if len(rows) < self.batch_size:
+                    # Очередь пуста: ждём уведомления от приёмника
+                    self.saver.wait_notify(listener, self.poll_interval)
+        finally:
+            listener.close()
+            self.dispatcher.stop()
@@ -16,9 +16,96 @@ if len(config.read("settings.ini")) == 0:
 # Получение значений из файла конфигурации
 try:
     TOKEN_USER = config.get("tokens", "user_token")
+    # Несколько токенов пользователя через запятую и способ выбора токена
+    # для запроса: round_robin (по очереди) или least_loaded (наименее занятый)
+    USER_TOKENS = [token.strip() for token in TOKEN_USER.split(",") if token.strip()]
+    USER_TOKEN_STRATEGY = config.get("tokens", "strategy", fallback="round_robin")
     TOKEN_GROUP = config.get("tokens", "group_token")
     LOGGING_FILE = config.get("logging", "logging_file")
     CONNSTR = config.get("database", "connstr")
+    # Пул соединений и отложенная запись показанных анкет
+    DB_POOL_MIN = config.getint("database", "pool_min", fallback=1)
+    DB_POOL_MAX = config.getint("database", "pool_max", fallback=10)
+    DB_FLUSH_INTERVAL = (
+        config.getint("database", "flush_interval_ms", fallback=200) / 1000
+    )
+    DB_FLUSH_ROWS = config.getint("database", "flush_rows", fallback=500)
+    # Параметры пула обработчиков (необязательные)
+    WORKERS = config.getint("bot", "workers", fallback=4)
+    QUEUE_SIZE = config.getint("bot", "queue_size", fallback=100)
+    # Отправка страницы анкет: separate (сообщение на анкету), compact
+    # (минимум сообщений, до 10 фото в каждом) или carousel (карусель)
+    DELIVERY_MODE = config.get("bot", "delivery", fallback="compact")
+    # Bots Long Poll: ID группы (0 - определить по токену), ожидание ответа
+    # сервера (секунды) и сколько последних событий помнить для отбрасывания
+    # повторов
+    GROUP_ID = config.getint("bot", "group_id", fallback=0)
+    LONGPOLL_WAIT = config.getint("bot", "longpoll_wait", fallback=25)
+    LONGPOLL_DEDUPE = config.getint("bot", "longpoll_dedupe", fallback=10000)
+    # Лимиты запросов к VK API в секунду для токенов группы и пользователя
+    GROUP_RPS = config.getfloat("limits", "group_rps", fallback=20)
+    USER_RPS = config.getfloat("limits", "user_rps", fallback=3)
+    # Карантин токена пользователя после ошибки лимита (секунды, удваивается)
+    USER_TOKEN_QUARANTINE = config.getfloat("limits", "token_quarantine", fallback=1)
+    # Таймауты HTTP-запросов к VK API (соединение и чтение, секунды), повторы
+    # при временных ошибках с начальной и максимальной паузой (секунды)
+    CONNECT_TIMEOUT = config.getfloat("network", "connect_timeout", fallback=3.05)
+    READ_TIMEOUT = config.getfloat("network", "read_timeout", fallback=10)
+    API_RETRIES = config.getint("network", "retries", fallback=3)
+    API_BACKOFF = config.getfloat("network", "backoff", fallback=1)
+    BACKOFF_CAP = config.getfloat("network", "backoff_cap", fallback=30)
+    # Предохранитель метода: ошибок подряд до отключения и пауза до пробы
+    BREAKER_THRESHOLD = config.getint("network", "breaker_threshold", fallback=5)
+    BREAKER_RESET = config.getfloat("network", "breaker_reset", fallback=30)
+    # Соединений keep-alive с api.vk.com в пуле сессии одного токена
+    HTTP_POOL_SIZE = config.getint("network", "pool_size", fallback=16)
+    # Кэш ответов users.search и фото: размер (записей) и время жизни (секунды)
+    SEARCH_CACHE_SIZE = config.getint("cache", "search_size", fallback=1024)
+    SEARCH_CACHE_TTL = config.getfloat("cache", "search_ttl", fallback=600)
+    PHOTOS_CACHE_SIZE = config.getint("cache", "photos_size", fallback=4096)
+    PHOTOS_CACHE_TTL = config.getfloat("cache", "photos_ttl", fallback=3600)
+    # Кэш карточек анкет (ссылка и строка вложений): размер и время жизни
+    CARDS_CACHE_SIZE = config.getint("cache", "cards_size", fallback=16384)
+    CARDS_CACHE_TTL = config.getfloat("cache", "cards_ttl", fallback=3600)
+    # Сохранять кэш в базе данных, чтобы он переживал перезапуск
+    CACHE_PERSISTENT = config.getboolean("cache", "persistent", fallback=False)
+    # Диалоги в памяти: максимум диалогов, время бездействия до сохранения в БД
+    # (секунды) и общий лимит показанных анкет в памяти
+    MAX_SESSIONS = config.getint("sessions", "max_users", fallback=10000)
+    SESSION_IDLE_TIMEOUT = config.getfloat("sessions", "idle_timeout", fallback=1800)
+    MAX_SEEN_PROFILES = config.getint("sessions", "max_seen", fallback=1000000)
+    # Подходящих анкет от одного запроса users.search: из них на страницу
+    # отбираются лучшие
+    SEARCH_FETCH_COUNT = config.getint("search", "fetch_count", fallback=50)
+    # Фильтры users.search на стороне VK (только с фото, порядок выдачи) и
+    # максимум анкет в запросе, размер которого подбирает query_planner
+    SEARCH_HAS_PHOTO = config.getboolean("search", "has_photo", fallback=True)
+    SEARCH_SORT = config.getint("search", "sort", fallback=0)
+    SEARCH_MAX_COUNT = config.getint("search", "max_count", fallback=200)
+    # Локальный индекс анкет (harvester.py): искать сначала в нём, срок годности
+    # собранной выборки, окно сбора (часы "с-по" по местному времени), сколько
+    # популярных выборок собирать и резервные параметры для пустой статистики
+    INDEX_ENABLED = config.getboolean("harvester", "use_index", fallback=False)
+    INDEX_TTL = config.getfloat("harvester", "ttl_hours", fallback=24) * 3600
+    HARVEST_HOURS = config.get("harvester", "hours", fallback="2-6")
+    HARVEST_BUCKETS = config.getint("harvester", "buckets", fallback=200)
+    HARVEST_CITIES = config.get("harvester", "cities", fallback="1,2")
+    HARVEST_AGES = config.get("harvester", "ages", fallback="18-40")
+    # Распределённый режим: общее число шардов очереди, событий за одно чтение
+    # и максимальная пауза между чтениями очереди (секунды)
+    CLUSTER_SHARDS = config.getint("cluster", "shards", fallback=4)
+    CLUSTER_BATCH = config.getint("cluster", "batch_size", fallback=100)
+    CLUSTER_POLL_INTERVAL = config.getfloat("cluster", "poll_interval", fallback=1)
+    # HTTP-эндпоинт /metrics (порт 0 - выключен) и сэмплирующий профилировщик
+    METRICS_HOST = config.get("metrics", "host", fallback="127.0.0.1")
+    METRICS_PORT = config.getint("metrics", "port", fallback=0)
+    PROFILER_ENABLED = config.getboolean("metrics", "profiler", fallback=False)
+    PROFILER_INTERVAL = (
+        config.getint("metrics", "profile_interval_ms", fallback=10) / 1000
+    )
 except configparser.NoOptionError as error:
     print(f"Добавьте поле: {error}")
     sys.exit(1)
+except ValueError as error:
+    print(f"Некорректное значение в settings.ini: {error}")
+    sys.exit(1)
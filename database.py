@@ -2,103 +2,937 @@
 Файл с описанием класса подклюения к БД
 """
 
+import json
 import logging
+import select
 import sys
+import threading
+import time
+
+from contextlib import contextmanager
 
 import psycopg2
 
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
+
+from metrics import DB_LATENCY
+from seen import SeenIndex
+
+# Ошибки соединения с БД: сервер недоступен или соединение оборвалось,
+# запрос можно повторить после паузы
+CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+class WriteBehind:
+    """
+    Отложенная запись строк в БД пачками.
+
+    Строки копятся в памяти и сбрасываются фоновым потоком каждые interval
+    секунд или при накоплении batch_size строк. При ошибке пачка повторяется
+    с нарастающей паузой; пачка, не записанная за max_retries попыток
+    (например, из-за нарушения ограничения), выводится в журнал и
+    отбрасывается, чтобы не блокировать последующие записи. close()
+    дописывает всё оставшееся.
+    """
+
+    # pylint: disable = too-many-arguments
+    def __init__(self, flush, interval=0.2, batch_size=500, close_retries=3,
+                 max_retries=5):
+        """
+        :param flush:         Функция записи пачки строк flush(rows).
+        :param interval:      Период сброса в секундах.
+        :param batch_size:    Количество строк для немедленного сброса.
+        :param close_retries: Попыток записи при завершении работы.
+        :param max_retries:   Попыток записи пачки до её отбрасывания.
+        """
+        self.flush = flush
+        self.interval = interval
+        self.batch_size = batch_size
+        self.close_retries = close_retries
+        self.max_retries = max_retries
+        self.rows = []
+        self.inflight = []
+        self.closed = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, name='vkinder-db-writer',
+                                       daemon=True)
+        self.thread.start()
+
+    def add(self, rows):
+        """
+        Постановка строк в очередь записи.
+        :param rows: Список кортежей для вставки.
+        """
+        with self.condition:
+            self.rows.extend(rows)
+            if len(self.rows) >= self.batch_size:
+                self.condition.notify()
+
+    def pending(self, predicate):
+        """
+        Строки, ещё не записанные в БД.
+        :param predicate: Фильтр строк.
+        :return:          Подходящие строки из очереди.
+        """
+        with self.condition:
+            return [row for row in self.inflight + self.rows if predicate(row)]
+
+    def close(self):
+        """
+        Запись оставшихся строк и остановка потока.
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()
+
+    def _run(self):
+        """
+        Цикл фонового сброса строк.
+        """
+        failures = 0
+        while True:
+            with self.condition:
+                self.condition.wait_for(
+                    lambda: self.closed or len(self.rows) >= self.batch_size,
+                    timeout=self.interval
+                )
+                closed = self.closed
+                self.inflight, self.rows = self.rows, []
+
+            if self.inflight:
+                try:
+                    self.flush(self.inflight)
+                    failures = 0
+                # pylint: disable = broad-exception-caught
+                except Exception as error:
+                    failures += 1
+                    logging.error("Ошибка отложенной записи в БД: %s", error)
+                    if closed and failures >= self.close_retries:
+                        logging.error("Не записано строк при завершении: %s",
+                                      len(self.inflight) + len(self.rows))
+                        return
+                    if failures >= self.max_retries:
+                        logging.error("Отброшена пачка после %s попыток (%s строк): %r",
+                                      failures, len(self.inflight), self.inflight)
+                        failures = 0
+                    else:
+                        with self.condition:
+                            self.rows = self.inflight + self.rows
+                        time.sleep(min(self.interval * 2 ** failures, 5))
+                finally:
+                    with self.condition:
+                        self.inflight = []
+
+            if closed and not self.rows:
+                return
+
 
 class Saver:
     """
     Сохранение состояния пользователя
     """
 
-    def __init__(self, connection_string=None, table='users_new'):
+    # Версии схемы БД: номер -> метод, приводящий схему к этой версии.
+    # Изменения схемы добавляются только в конец списка.
+    migrations = (
+        (1, 'table_create'),
+        (2, 'migrate_legacy_table'),
+        (3, 'sessions_table_create'),
+        (4, 'cache_table_create'),
+        (5, 'event_queue_create'),
+        (6, 'profile_index_create'),
+        (7, 'longpoll_table_create'),
+    )
+    # Ключ advisory-блокировки, под которой выполняется миграция
+    migration_lock = 0x766b6e64
+
+    # pylint: disable = too-many-arguments, too-many-instance-attributes
+    def __init__(self, connection_string=None, table='seen_profiles',
+                 cache_table='api_cache', sessions_table='sessions',
+                 legacy_table='users_new', events_table='event_queue',
+                 index_table='profile_index', schema_table='schema_version',
+                 longpoll_table='longpoll_state',
+                 pool_size=(1, 10), flush_interval=0.2, flush_rows=500,
+                 health_check_interval=30):
         """
         Инициализация объекта работы с БД
         """
 
         self.logger = logging.getLogger(__name__)
-        self.connection = None
         self.table = table
+        self.schema_table = schema_table
+        self.cache_table = cache_table
+        self.sessions_table = sessions_table
+        self.events_table = events_table
+        # Позиция (ts) Bots Long Poll для продолжения после перезапуска
+        self.longpoll_table = longpoll_table
+        # Локальный индекс анкет и список собранных выборок
+        self.index_table = index_table
+        self.buckets_table = f'{index_table}_buckets'
+        # Старая таблица с массивом INTEGER[] на пользователя
+        self.legacy_table = legacy_table
+        # Пул соединений общий для всех воркеров
+        self.pool = None
+        self.slots = threading.BoundedSemaphore(pool_size[1])
+        # Соединение, закреплённое за потоком (миграция под advisory-блокировкой)
+        self.pinned = threading.local()
+        self.health_check_interval = health_check_interval
+        self.last_used = {}
+        # Параметры подключения (нужны и для отдельного соединения LISTEN)
+        if connection_string:
+            self.connect_params = {'dsn': connection_string}
+        else:
+            self.connect_params = {
+                'database': 'user_data',
+                'user': 'admin',
+                'password': 'password',
+                'host': 'localhost',
+                'port': 5252,
+            }
         try:
-            if connection_string:
-                self.connection = psycopg2.connect(connection_string)
-            else:
-                self.connection = psycopg2.connect(
-                    database='user_data',
-                    user='admin',
-                    password='password',
-                    host='localhost',
-                    port=5252
-                )
-            self.table_check()
+            self.pool = ThreadedConnectionPool(*pool_size, **self.connect_params)
+            self.migrate()
         except psycopg2.Error as error:
             logging.error("Ошибка при подключении к базе данных: %s", error)
             sys.exit(1)
 
+        # Показанные анкеты и записи кэша ответов API пишутся в фоне пачками
+        self.writer = WriteBehind(self.insert_seen, flush_interval, flush_rows)
+        self.cache_writer = WriteBehind(self.cache_flush, flush_interval, flush_rows)
+
+    def get_connection(self):
+        """
+        Получение рабочего соединения из пула.
+        Закрытые и не прошедшие проверку соединения заменяются новыми.
+        :return: Соединение psycopg2.
+        """
+        self.slots.acquire()
+        try:
+            connection = self.pool.getconn()
+            if not self.is_alive(connection):
+                logging.warning('Соединение с БД потеряно, переподключаюсь')
+                self.last_used.pop(id(connection), None)
+                self.pool.putconn(connection, close=True)
+                connection = self.pool.getconn()
+        except BaseException:
+            self.slots.release()
+            raise
+        return connection
+
+    def is_alive(self, connection):
+        """
+        Проверка соединения: закрытое - нерабочее, долго простаивавшее
+        проверяется запросом SELECT 1.
+        :param connection: Соединение psycopg2.
+        :return:           True, если соединением можно пользоваться.
+        """
+        if connection.closed:
+            return False
+        idle = time.monotonic() - self.last_used.get(id(connection), 0)
+        if idle < self.health_check_interval:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1;')
+            connection.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def release_connection(self, connection, broken=False):
+        """
+        Возврат соединения в пул.
+        :param connection: Соединение psycopg2.
+        :param broken:     Соединение сломано и должно быть закрыто.
+        """
+        try:
+            if broken:
+                self.last_used.pop(id(connection), None)
+            else:
+                self.last_used[id(connection)] = time.monotonic()
+            self.pool.putconn(connection, close=broken)
+        finally:
+            self.slots.release()
+
+    @contextmanager
+    def cursor(self, operation='query'):
+        """
+        Курсор на соединении из пула. Транзакция фиксируется при выходе,
+        при ошибке откатывается; разорванное соединение закрывается.
+
+        :param operation: имя операции для метрики времени запросов
+        """
+        started = time.perf_counter()
+        connection = getattr(self.pinned, 'connection', None)
+        if connection is not None:
+            # Соединение закреплено за потоком: слот пула не нужен, соединение
+            # возвращает в пул тот, кто его закрепил
+            try:
+                with connection.cursor() as cursor:
+                    yield cursor
+                connection.commit()
+            except BaseException:
+                if not connection.closed:
+                    connection.rollback()
+                raise
+            finally:
+                DB_LATENCY.observe(time.perf_counter() - started, operation=operation)
+            return
+
+        connection = self.get_connection()
+        try:
+            with connection.cursor() as cursor:
+                yield cursor
+            connection.commit()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            self.release_connection(connection, broken=True)
+            raise
+        except BaseException:
+            if not connection.closed:
+                connection.rollback()
+            self.release_connection(connection, broken=bool(connection.closed))
+            raise
+        else:
+            self.release_connection(connection)
+        finally:
+            DB_LATENCY.observe(time.perf_counter() - started, operation=operation)
+
+    def close(self):
+        """
+        Запись отложенных данных и закрытие соединений.
+        """
+        self.writer.close()
+        self.cache_writer.close()
+        self.pool.closeall()
+
     def table_create(self):
         """
         Создание таблицы, если она не существует.
         """
-        with self.connection.cursor() as cursor:
+        with self.cursor('table_create') as cursor:
             cursor.execute(
                 f"""
                 CREATE TABLE IF NOT EXISTS {self.table} (
-                    user_id INTEGER PRIMARY KEY,
-                    searched_users INTEGER[] NOT NULL
+                    user_id INTEGER NOT NULL,
+                    profile_id INTEGER NOT NULL,
+                    shown_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                    PRIMARY KEY (user_id, profile_id)
+                );
+                """
+            )
+
+    def schema_version(self):
+        """
+        Текущая версия схемы БД.
+        :return: Номер последней применённой миграции (0 - схема не создавалась).
+        """
+        with self.cursor('schema_version') as cursor:
+            cursor.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {self.schema_table} (
+                    version INTEGER PRIMARY KEY,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
                 );
+                SELECT COALESCE(max(version), 0) FROM {self.schema_table};
                 """
             )
-            self.connection.commit()
+            return cursor.fetchone()[0]
+
+    def migrate(self):
+        """
+        Приведение схемы БД к последней версии без участия пользователя.
+        Если схема актуальна, это один запрос. Одновременно запущенные процессы
+        ждут друг друга на advisory-блокировке, поэтому каждая миграция
+        применяется один раз. Миграции выполняются на соединении, которое
+        держит блокировку, поэтому хватает пула из одного соединения.
+        :return: Версия схемы после миграции.
+        """
+        version = self.schema_version()
+        if version >= self.migrations[-1][0]:
+            return version
+
+        connection = self.get_connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_lock(%s);', (self.migration_lock,))
+            connection.commit()
+            self.pinned.connection = connection
+            try:
+                # Пока ждали блокировку, схему мог обновить другой процесс
+                version = self.schema_version()
+                for number, name in self.migrations:
+                    if number <= version:
+                        continue
+                    getattr(self, name)()
+                    with self.cursor('migrate') as cursor:
+                        cursor.execute(
+                            f'INSERT INTO {self.schema_table} (version) VALUES (%s)'
+                            f' ON CONFLICT DO NOTHING;', (number,)
+                        )
+                    version = number
+                    logging.info('Схема БД обновлена до версии %s: %s', number, name)
+            finally:
+                self.pinned.connection = None
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT pg_advisory_unlock(%s);',
+                                   (self.migration_lock,))
+                connection.commit()
+        finally:
+            self.release_connection(connection)
+        return version
 
-    def table_check(self):
+    def warm_up(self, connections):
         """
-        Проверка существования таблицы, создание при необходимости.
+        Заблаговременное открытие соединений пула, чтобы первые запросы после
+        запуска не ждали подключения к БД.
+        :param connections: Сколько соединений открыть.
         """
-        with self.connection.cursor() as cursor:
+        opened = []
+        try:
+            for _ in range(min(connections, self.pool.maxconn)):
+                if not self.slots.acquire(blocking=False):
+                    break
+                try:
+                    opened.append(self.pool.getconn())
+                except BaseException:
+                    self.slots.release()
+                    raise
+        finally:
+            for connection in opened:
+                self.release_connection(connection)
+
+    def table_exists(self, table):
+        """
+        Проверка существования таблицы.
+        :param table: Имя таблицы.
+        :return:      True, если таблица есть.
+        """
+        with self.cursor('table_exists') as cursor:
             cursor.execute(
                 "SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_name = %s);",
-                (self.table,)
-            )
-            if not cursor.fetchone()[0]:
-                response = input('Создать базу? (Y/N): ').upper()
-                if response == 'Y':
-                    self.table_create()
-                    logging.info('Таблица создана, запускаю бота!')
-                else:
-                    print('Выхожу...')
-                    sys.exit(0)
-            else:
-                logging.info('База существует, запускаю бота')
+                (table,)
+            )
+            return cursor.fetchone()[0]
+
+    def migrate_legacy_table(self):
+        """
+        Перенос показанных анкет из старой таблицы с массивами в нормализованную.
+        Старая таблица после переноса переименовывается в <имя>_migrated.
+        """
+        if not self.table_exists(self.legacy_table):
+            return
+
+        with self.cursor('migrate_legacy_table') as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {self.table} (user_id, profile_id)
+                SELECT user_id, unnest(searched_users) FROM {self.legacy_table}
+                ON CONFLICT DO NOTHING;
+                ALTER TABLE {self.legacy_table} RENAME TO {self.legacy_table}_migrated;
+                """
+            )
+        logging.info('Данные из таблицы %s перенесены в %s',
+                     self.legacy_table, self.table)
 
     def save_session_to_db(self, user_id, searched_users):
         """
-        Сохраняет или обновляет сессию пользователя в базе данных.
+        Сохраняет показанные пользователю анкеты в базе данных.
+        Запись отложенная: строки уходят в БД пачкой из фонового потока.
         :param user_id:          ID пользователя ВКонтакте.
         :param searched_users:   Найденные пользователи.
         """
-        with self.connection.cursor() as cursor:
-            cursor.execute(
+        self.writer.add([(user_id, profile_id) for profile_id in searched_users])
+
+    def insert_seen(self, rows):
+        """
+        Вставка пачки показанных анкет одним запросом.
+        Стоимость не зависит от длины истории пользователя.
+        :param rows: Кортежи (user_id, profile_id).
+        """
+        with self.cursor('insert_seen') as cursor:
+            execute_values(
+                cursor,
                 f"""
-                INSERT INTO {self.table} (user_id, searched_users)
-                VALUES (%s, %s)
-                ON CONFLICT (user_id) DO UPDATE SET
-                    searched_users = {self.table}.searched_users || %s;
+                INSERT INTO {self.table} (user_id, profile_id)
+                VALUES %s
+                ON CONFLICT DO NOTHING;
                 """,
-                (user_id, searched_users, searched_users)
+                rows,
+                page_size=len(rows)
             )
-            self.connection.commit()
 
     def get_user_data_from_db(self, user_id):
         """
         Извлекает данные о пользователе из базы данных.
         :param user_id: ID пользователя.
-        :return:        Список найденных пользователей, либо None.
+        :return:        Индекс найденных пользователей (пустой, если их нет).
+        """
+        with self.cursor('get_user_data_from_db') as cursor:
+            cursor.execute(f"SELECT profile_id FROM {self.table}"
+                           f" WHERE user_id = %s;", (user_id,))
+            result = cursor.fetchall()
+
+        # Учитываем анкеты, ещё не записанные в БД
+        pending = self.writer.pending(lambda row: row[0] == user_id)
+        return SeenIndex([row[0] for row in result] + [row[1] for row in pending])
+
+    def filter_seen(self, user_id, profile_ids):
+        """
+        Отбор анкет, которые пользователю ещё не показывали (по индексу PK).
+        :param user_id:     ID пользователя.
+        :param profile_ids: ID анкет для проверки.
+        :return:            ID непоказанных анкет в исходном порядке.
+        """
+        profile_ids = list(profile_ids)
+        if not profile_ids:
+            return []
+        with self.cursor('filter_seen') as cursor:
+            cursor.execute(f"SELECT profile_id FROM {self.table}"
+                           f" WHERE user_id = %s AND profile_id = ANY(%s);",
+                           (user_id, profile_ids))
+            seen = {row[0] for row in cursor.fetchall()}
+        pending = self.writer.pending(lambda row: row[0] == user_id)
+        seen.update(row[1] for row in pending)
+
+        return [profile_id for profile_id in profile_ids if profile_id not in seen]
+
+    def cache_table_create(self):
+        """
+        Создание таблицы кэша ответов API, если она не существует.
+        """
+        with self.cursor('cache_table_create') as cursor:
+            cursor.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {self.cache_table} (
+                    key TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    expires_at TIMESTAMPTZ NOT NULL
+                );
+                """
+            )
+
+    def cache_purge(self):
+        """
+        Удаление устаревших записей кэша ответов API.
+        """
+        with self.cursor('cache_purge') as cursor:
+            cursor.execute(f"DELETE FROM {self.cache_table} WHERE expires_at < now();")
+
+    def cache_load_many(self, prefix, limit):
+        """
+        Чтение самых свежих действующих записей кэша (прогрев кэша в памяти).
+        :param prefix: Начало ключей записей.
+        :param limit:  Максимальное количество записей.
+        :return:       Кортежи (ключ, значение, оставшееся время жизни в секундах).
+        """
+        with self.cursor('cache_load_many') as cursor:
+            cursor.execute(
+                f"""
+                SELECT key, payload,
+                       EXTRACT(EPOCH FROM expires_at - now())::float
+                FROM {self.cache_table}
+                WHERE left(key, length(%s)) = %s AND expires_at > now()
+                ORDER BY expires_at DESC
+                LIMIT %s;
+                """,
+                (prefix, prefix, limit)
+            )
+            result = cursor.fetchall()
+
+        return [(key, json.loads(payload), ttl) for key, payload, ttl in result]
+
+    def cache_store(self, key, value, ttl):
+        """
+        Сохранение записи кэша. Запись отложенная: вызов не ждёт БД,
+        строка уходит пачкой из фонового потока.
+        :param key:   Ключ записи.
+        :param value: Значение (сериализуемое в JSON).
+        :param ttl:   Время жизни записи в секундах.
+        """
+        self.cache_writer.add([(key, json.dumps(value), ttl)])
+
+    def cache_flush(self, rows):
+        """
+        Запись пачки записей кэша одним запросом.
+        :param rows: Кортежи (ключ, значение в JSON, время жизни в секундах).
+        """
+        # Один ключ дважды в одном INSERT ... ON CONFLICT недопустим:
+        # остаётся последняя запись
+        rows = list({row[0]: row for row in rows}.values())
+        with self.cursor('cache_flush') as cursor:
+            execute_values(
+                cursor,
+                f"""
+                INSERT INTO {self.cache_table} (key, payload, expires_at)
+                VALUES %s
+                ON CONFLICT (key) DO UPDATE SET
+                    payload = EXCLUDED.payload,
+                    expires_at = EXCLUDED.expires_at;
+                """,
+                rows,
+                template="(%s, %s, now() + %s * interval '1 second')",
+                page_size=len(rows)
+            )
+
+    def sessions_table_create(self):
+        """
+        Создание таблицы состояний диалогов, если она не существует.
+        """
+        with self.cursor('sessions_table_create') as cursor:
+            cursor.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {self.sessions_table} (
+                    user_id INTEGER PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                );
+                """
+            )
+
+    def save_state(self, user_id, state):
+        """
+        Сохраняет состояние диалога пользователя.
+        :param user_id: ID пользователя ВКонтакте.
+        :param state:   Состояние диалога (шаг, смещение, фильтры).
+        """
+        with self.cursor('save_state') as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {self.sessions_table} (user_id, state, updated_at)
+                VALUES (%s, %s, now())
+                ON CONFLICT (user_id) DO UPDATE SET
+                    state = EXCLUDED.state,
+                    updated_at = EXCLUDED.updated_at;
+                """,
+                (user_id, json.dumps(state))
+            )
+
+    def load_state(self, user_id):
+        """
+        Извлекает сохранённое состояние диалога.
+        :param user_id: ID пользователя.
+        :return:        Состояние диалога, либо None.
         """
-        with self.connection.cursor() as cursor:
-            cursor.execute(f"SELECT searched_users FROM {self.table}"
+        with self.cursor('load_state') as cursor:
+            cursor.execute(f"SELECT state FROM {self.sessions_table}"
                            f" WHERE user_id = %s;", (user_id,))
             result = cursor.fetchone()
 
-        return result[0] if result else []
+        return json.loads(result[0]) if result else None
+
+    def event_queue_create(self):
+        """
+        Создание таблицы очереди входящих событий, если она не существует.
+        """
+        with self.cursor('event_queue_create') as cursor:
+            cursor.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {self.events_table} (
+                    id BIGSERIAL PRIMARY KEY,
+                    shard INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                );
+                CREATE INDEX IF NOT EXISTS {self.events_table}_shard_idx
+                    ON {self.events_table} (shard, id);
+                """
+            )
+
+    def publish_events(self, events, shards, position=None):
+        """
+        Добавляет входящие сообщения в очередь и будит воркеров.
+        :param events:   Пары (user_id, текст сообщения).
+        :param shards:   Общее количество шардов.
+        :param position: (имя потока, ts) - позиция long poll после этих
+                         событий, сохраняется в той же транзакции.
+        """
+        rows = [(user_id % shards, user_id, text) for user_id, text in events]
+        if not rows and position is None:
+            return
+        with self.cursor('publish_events') as cursor:
+            if rows:
+                execute_values(
+                    cursor,
+                    f"INSERT INTO {self.events_table} (shard, user_id, text)"
+                    f" VALUES %s;",
+                    rows
+                )
+                cursor.execute('SELECT pg_notify(%s, %s);',
+                               (self.events_table, ''))
+            if position is not None:
+                self._store_longpoll_ts(cursor, *position)
+
+    def longpoll_table_create(self):
+        """
+        Создание таблицы позиций long poll, если она не существует.
+        """
+        with self.cursor('longpoll_table_create') as cursor:
+            cursor.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {self.longpoll_table} (
+                    name TEXT PRIMARY KEY,
+                    ts TEXT NOT NULL,
+                    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                );
+                """
+            )
+
+    def load_longpoll_ts(self, name):
+        """
+        Извлекает сохранённую позицию long poll.
+        :param name: Имя потока событий (например, group123).
+        :return:     ts, либо None.
+        """
+        with self.cursor('load_longpoll_ts') as cursor:
+            cursor.execute(f"SELECT ts FROM {self.longpoll_table}"
+                           f" WHERE name = %s;", (name,))
+            result = cursor.fetchone()
+
+        return result[0] if result else None
+
+    def save_longpoll_ts(self, name, ts):
+        """
+        Сохраняет позицию long poll после обработанных событий.
+        :param name: Имя потока событий.
+        :param ts:   Номер последнего полученного события.
+        """
+        with self.cursor('save_longpoll_ts') as cursor:
+            self._store_longpoll_ts(cursor, name, ts)
+
+    def _store_longpoll_ts(self, cursor, name, ts):
+        """
+        Запись позиции long poll в открытой транзакции.
+        """
+        cursor.execute(
+            f"""
+            INSERT INTO {self.longpoll_table} (name, ts, updated_at)
+            VALUES (%s, %s, now())
+            ON CONFLICT (name) DO UPDATE SET
+                ts = EXCLUDED.ts,
+                updated_at = EXCLUDED.updated_at;
+            """,
+            (name, str(ts))
+        )
+
+    def claim_events(self, shards, limit=100):
+        """
+        Забирает из очереди самые старые события своих шардов.
+        Событие удаляется из очереди при получении (доставка не более одного
+        раза), порядок событий шарда сохраняется.
+        :param shards: Номера шардов воркера.
+        :param limit:  Максимум событий за раз.
+        :return:       Список (id, user_id, text) в порядке поступления.
+        """
+        with self.cursor('claim_events') as cursor:
+            cursor.execute(
+                f"""
+                DELETE FROM {self.events_table}
+                WHERE id IN (
+                    SELECT id FROM {self.events_table}
+                    WHERE shard = ANY(%s)
+                    ORDER BY id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, user_id, text;
+                """,
+                (list(shards), limit)
+            )
+            rows = cursor.fetchall()
+
+        return sorted(rows)
+
+    def listen(self):
+        """
+        Отдельное соединение, подписанное на уведомления о новых событиях.
+        :return: Соединение psycopg2 в режиме autocommit.
+        """
+        connection = psycopg2.connect(**self.connect_params)
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN {self.events_table};')
+        return connection
+
+    @staticmethod
+    def wait_notify(connection, timeout):
+        """
+        Ожидание уведомления о новых событиях.
+        :param connection: Соединение из listen().
+        :param timeout:    Максимальное время ожидания, секунды.
+        :return:           True, если пришло уведомление.
+        """
+        if not connection.notifies:
+            select.select([connection], [], [], timeout)
+            connection.poll()
+        received = bool(connection.notifies)
+        connection.notifies.clear()
+        return received
+
+    def profile_index_create(self):
+        """
+        Создание таблиц локального индекса анкет, если они не существуют.
+        """
+        with self.cursor('profile_index_create') as cursor:
+            cursor.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {self.buckets_table} (
+                    age SMALLINT NOT NULL,
+                    gender SMALLINT NOT NULL,
+                    city INTEGER NOT NULL,
+                    status SMALLINT NOT NULL,
+                    profiles INTEGER NOT NULL,
+                    total INTEGER NOT NULL,
+                    harvested_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                    PRIMARY KEY (age, gender, city, status)
+                );
+                CREATE TABLE IF NOT EXISTS {self.index_table} (
+                    age SMALLINT NOT NULL,
+                    gender SMALLINT NOT NULL,
+                    city INTEGER NOT NULL,
+                    status SMALLINT NOT NULL,
+                    position INTEGER NOT NULL,
+                    profile_id INTEGER NOT NULL,
+                    first_name TEXT NOT NULL,
+                    last_name TEXT NOT NULL,
+                    bdate TEXT,
+                    interests TEXT,
+                    last_seen INTEGER,
+                    photo_ids INTEGER[] NOT NULL,
+                    PRIMARY KEY (age, gender, city, status, position)
+                );
+                """
+            )
+
+    def store_bucket(self, bucket, profiles, total):
+        """
+        Заменяет выборку в индексе новыми анкетами.
+        :param bucket:   Параметры выборки (age, gender, city, status).
+        :param profiles: Записи profile_index.compact_profile в порядке выдачи.
+        :param total:    Размер выборки по данным users.search.
+        """
+        with self.cursor('store_bucket') as cursor:
+            cursor.execute(
+                f"DELETE FROM {self.index_table}"
+                f" WHERE (age, gender, city, status) = (%s, %s, %s, %s);",
+                bucket
+            )
+            execute_values(
+                cursor,
+                f"""
+                INSERT INTO {self.index_table} (
+                    age, gender, city, status, position, profile_id,
+                    first_name, last_name, bdate, interests, last_seen, photo_ids
+                ) VALUES %s;
+                """,
+                [(*bucket, position, *profile)
+                 for position, profile in enumerate(profiles)]
+            )
+            cursor.execute(
+                f"""
+                INSERT INTO {self.buckets_table}
+                    (age, gender, city, status, profiles, total, harvested_at)
+                VALUES (%s, %s, %s, %s, %s, %s, now())
+                ON CONFLICT (age, gender, city, status) DO UPDATE SET
+                    profiles = EXCLUDED.profiles,
+                    total = EXCLUDED.total,
+                    harvested_at = EXCLUDED.harvested_at;
+                """,
+                (*bucket, len(profiles), total)
+            )
+
+    def search_index(self, bucket, count, offset, ttl):
+        """
+        Страница выборки из индекса.
+        :param bucket: Параметры выборки (age, gender, city, status).
+        :param count:  Количество анкет.
+        :param offset: Смещение.
+        :param ttl:    Срок годности выборки, секунды.
+        :return:       Пара (размер выборки в VK, записи анкет), либо None,
+                       если выборка не собрана или устарела.
+        """
+        with self.cursor('search_index') as cursor:
+            cursor.execute(
+                f"""
+                SELECT total FROM {self.buckets_table}
+                WHERE (age, gender, city, status) = (%s, %s, %s, %s)
+                    AND harvested_at > now() - make_interval(secs => %s);
+                """,
+                (*bucket, ttl)
+            )
+            bucket_row = cursor.fetchone()
+            if bucket_row is None:
+                return None
+            cursor.execute(
+                f"""
+                SELECT profile_id, first_name, last_name, bdate, interests,
+                    last_seen, photo_ids
+                FROM {self.index_table}
+                WHERE (age, gender, city, status) = (%s, %s, %s, %s)
+                    AND position >= %s
+                ORDER BY position
+                LIMIT %s;
+                """,
+                (*bucket, offset, count)
+            )
+            return bucket_row[0], cursor.fetchall()
+
+    def harvested_buckets(self):
+        """
+        Собранные выборки и их возраст.
+        :return: Словарь (age, gender, city, status) -> секунд с момента сбора.
+        """
+        with self.cursor('harvested_buckets') as cursor:
+            cursor.execute(
+                f"SELECT age, gender, city, status,"
+                f" EXTRACT(EPOCH FROM now() - harvested_at)"
+                f" FROM {self.buckets_table};"
+            )
+            return {tuple(row[:4]): float(row[4]) for row in cursor.fetchall()}
+
+    def popular_buckets(self, limit):
+        """
+        Самые частые параметры поиска пользователей бота.
+        :param limit: Максимум выборок.
+        :return:      Список (age, gender, city, status) по убыванию частоты.
+        """
+        with self.cursor('popular_buckets') as cursor:
+            cursor.execute(
+                f"""
+                SELECT state::jsonb ->> 'age', state::jsonb ->> 'gender',
+                    state::jsonb ->> 'city', state::jsonb ->> 'status'
+                FROM {self.sessions_table}
+                WHERE state::jsonb ?& array['age', 'gender', 'city', 'status']
+                GROUP BY 1, 2, 3, 4
+                ORDER BY count(*) DESC
+                LIMIT %s;
+                """,
+                (limit,)
+            )
+            rows = cursor.fetchall()
+
+        buckets = []
+        for row in rows:
+            try:
+                buckets.append(tuple(int(value) for value in row))
+            except ValueError:
+                continue
+        return buckets
+
+
+def migrate(connection_string=None, **tables):
+    """
+    Приведение схемы БД к последней версии для процессов, которые работают
+    с БД без Saver (асинхронный бот): те же версионные миграции под той же
+    advisory-блокировкой.
+    :param connection_string: Строка подключения к БД.
+    :param tables:            Имена таблиц, как в Saver.
+    :return:                  Версия схемы после миграции.
+    """
+    saver = Saver(connection_string, pool_size=(1, 1), **tables)
+    try:
+        return saver.schema_version()
+    finally:
+        saver.close()
@@ -0,0 +1,234 @@
+"""
+Конечный автомат диалога: состояния, разбор ввода и сессия пользователя.
+
+Таблица состояний собирается один раз при импорте. Каждое состояние разбирает
+и проверяет ввод одной функцией, которая возвращает типизированное значение
+(или None, если ввод некорректен). Новый фильтр поиска добавляется функцией
+разбора, полем сессии и строкой таблицы STATES.
+"""
+
+import messages
+
+from seen import SeenIndex
+
+# Команды пользователя (сравниваются без учёта регистра)
+AGAIN = "again"
+NEXT = "next"
+COMMANDS = {
+    messages.AGAIN_SEARCH.lower(): AGAIN,
+    messages.NEXT_PEOPLE.lower(): NEXT,
+}
+# Длиннее самой длинной команды текст сравнивать не нужно
+COMMAND_LENGTH = max(len(command) for command in COMMANDS)
+
+# Допустимый возраст (не включая границы)
+MIN_AGE = 12
+MAX_AGE = 90
+GENDERS = (1, 2)
+STATUSES = range(6)
+
+
+def parse_command(text: str) -> str | None:
+    """
+    Команда в тексте сообщения.
+
+    Args:
+        text (str): Текст сообщения
+
+    Returns:
+        str: AGAIN, NEXT или None
+    """
+    if len(text) > COMMAND_LENGTH:
+        return None
+    return COMMANDS.get(text.lower())
+
+
+def parse_number(text: str) -> int | None:
+    """
+    Неотрицательное целое число или None.
+    """
+    return int(text) if text.isdecimal() else None
+
+
+def parse_greeting(text: str) -> str:
+    """
+    Первое сообщение: подходит любое.
+    """
+    return text
+
+
+def parse_age(text: str) -> int | None:
+    """
+    Возраст от MIN_AGE до MAX_AGE (не включая границы).
+    """
+    age = parse_number(text)
+    return age if age is not None and MIN_AGE < age < MAX_AGE else None
+
+
+def parse_gender(text: str) -> int | None:
+    """
+    Пол: 1 - женский, 2 - мужской.
+    """
+    gender = parse_number(text)
+    return gender if gender in GENDERS else None
+
+
+def parse_status(text: str) -> int | None:
+    """
+    Семейное положение 0-5 (см. messages.PROCESS_STATUS).
+    """
+    status = parse_number(text)
+    return status if status in STATUSES else None
+
+
+class State:
+    """
+    Состояние диалога
+    """
+
+    __slots__ = ("step", "parse", "field", "handler", "commands")
+
+    # pylint: disable = too-many-arguments
+    def __init__(
+        self,
+        step: str | None,
+        handler: str,
+        parse=None,
+        field: str | None = None,
+        commands: tuple = (),
+    ):
+        """
+        Args:
+            step (str):        Имя состояния (None - новый диалог)
+            handler (str):     Имя обработчика бота для корректного ввода
+            parse:             Функция разбора ввода parse(text) -> значение/None
+            field (str):       Поле сессии для разобранного значения
+            commands (tuple):  Команды, которые принимает состояние (вместо parse)
+        """
+        self.step = step
+        self.handler = handler
+        self.parse = parse
+        self.field = field
+        self.commands = commands
+
+    def read(self, text: str, command: str | None):
+        """
+        Разбор ввода в этом состоянии.
+
+        Args:
+            text (str):    Текст сообщения
+            command (str): Результат parse_command(text)
+
+        Returns:
+            Значение ввода или None, если ввод некорректен
+        """
+        if self.commands:
+            return command if command in self.commands else None
+        return self.parse(text)
+
+
+# Переходы: ввод в состоянии step обрабатывает handler, который возвращает
+# следующее состояние
+STATES = {
+    state.step: state
+    for state in (
+        State(None, "process_age", parse_greeting),
+        State("age", "process_gender", parse_age, "age"),
+        State("gender", "process_city", parse_gender, "gender"),
+        State("city", "process_status", parse_number, "city"),
+        State("status", "process_search_users", parse_status, "status"),
+        State("final", "process_search_users", commands=(NEXT, AGAIN)),
+        State("again", "process_age", commands=(AGAIN,)),
+    )
+}
+
+# Обработчики-вопросы: имя -> (сообщение, следующее состояние)
+PROMPTS = {
+    "process_age": (messages.PROCESS_AGE, "age"),
+    "process_gender": (messages.PROCESS_GENDER, "gender"),
+    "process_city": (messages.PROCESS_CITY, "city"),
+    "process_status": (messages.PROCESS_STATUS, "status"),
+}
+
+
+class Session:
+    """
+    Диалог пользователя в памяти
+    """
+
+    __slots__ = (
+        "step",
+        "seen",
+        "offset",
+        "age",
+        "gender",
+        "city",
+        "status",
+        "pipeline",
+        "profiles",
+    )
+
+    # Поля, которые сохраняются в БД при вытеснении диалога
+    state_fields = ("step", "offset", "age", "gender", "city", "status")
+    # Числовые поля сохранённого состояния
+    int_fields = ("offset", "age", "gender", "city", "status")
+
+    def __init__(self, seen, state: dict | None = None):
+        """
+        Args:
+            seen:         Ранее показанные анкеты (SeenIndex или список ID)
+            state (dict): Сохранённое состояние диалога или None
+        """
+        self.step = None
+        self.seen = seen if isinstance(seen, SeenIndex) else SeenIndex(seen)
+        self.offset = 0
+        self.age = None
+        self.gender = None
+        self.city = None
+        self.status = None
+        self.pipeline = None
+        self.profiles = None
+        if state:
+            self.restore(state)
+
+    def restore(self, state: dict) -> None:
+        """
+        Восстановление сохранённого состояния.
+
+        Args:
+            state (dict): Состояние (старые версии хранили числа строками)
+        """
+        for key in self.state_fields:
+            value = state.get(key)
+            if value is not None and key in self.int_fields:
+                value = int(value)
+            if value is not None or key == "step":
+                setattr(self, key, value)
+
+    def export_state(self) -> dict:
+        """
+        Состояние диалога для сохранения в БД.
+
+        Returns:
+            dict: Сериализуемое состояние
+        """
+        state = {"step": self.step, "offset": self.offset}
+        for key in ("age", "gender", "city", "status"):
+            value = getattr(self, key)
+            if value is not None:
+                state[key] = value
+        return state
+
+    def search_params(self) -> dict:
+        """
+        Параметры поиска.
+
+        Returns:
+            dict: Параметры для VKinder.search_users
+        """
+        return {
+            "age": self.age,
+            "gender": self.gender,
+            "city": self.city,
+            "status": self.status,
+        }
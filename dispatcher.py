@@ -0,0 +1,219 @@
+"""
+Диспетчер событий: пул воркеров с сохранением порядка сообщений пользователя
+"""
+
+import logging
+import queue
+import threading
+import time
+
+# Маркер остановки воркера
+_STOP = object()
+
+
+class _Barrier:
+    """
+    Отметка в очередях воркеров после пачки событий: когда её достигли все
+    очереди, все принятые события пачки обработаны
+    """
+
+    __slots__ = ("remaining", "callback", "lock")
+
+    def __init__(self, queues: int, callback):
+        self.remaining = queues
+        self.callback = callback
+        self.lock = threading.Lock()
+
+    def reach(self) -> None:
+        """
+        Отметка достигнута одной очередью.
+        """
+        with self.lock:
+            self.remaining -= 1
+            if self.remaining:
+                return
+        self.callback()
+
+
+class EventDispatcher:
+    """
+    Распределение событий по пулу потоков.
+
+    События одного пользователя всегда попадают в одну и ту же очередь
+    (шардирование по user_id), поэтому обрабатываются строго по порядку,
+    а разные пользователи обслуживаются параллельно.
+    """
+
+    # pylint: disable = too-many-arguments
+    def __init__(
+        self,
+        handler,
+        workers: int = 4,
+        queue_size: int = 100,
+        put_timeout: float | None = 1.0,
+        stats_interval: float = 60.0,
+    ):
+        """
+        Args:
+            handler:              Функция обработки события handler(event)
+            workers (int):        Количество воркеров
+            queue_size (int):     Максимальная длина очереди одного воркера
+            put_timeout (float):  Сколько ждать места в очереди, секунды
+                                  (None - ждать без ограничения)
+            stats_interval (float): Период записи статистики в лог, секунды
+        """
+        self.handler = handler
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+        self.put_timeout = put_timeout
+        self.stats_interval = stats_interval
+        self.threads = []
+
+        # Метрики очередей
+        self.dropped = 0
+        self.peak_depth = 0
+        self._last_stats = time.monotonic()
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """
+        Запуск воркеров.
+        """
+        for index, worker_queue in enumerate(self.queues):
+            thread = threading.Thread(
+                target=self._worker,
+                args=(worker_queue,),
+                name=f"vkinder-worker-{index}",
+                daemon=True,
+            )
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self, timeout: float | None = None) -> None:
+        """
+        Остановка воркеров после обработки уже принятых событий.
+
+        Args:
+            timeout (float, optional): Время ожидания каждого воркера
+        """
+        for worker_queue in self.queues:
+            worker_queue.put(_STOP)
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+
+    def shard(self, user_id: int) -> int:
+        """
+        Номер очереди для пользователя.
+
+        Args:
+            user_id (int): Идентификатор пользователя
+
+        Returns:
+            int: Индекс очереди
+        """
+        return user_id % len(self.queues)
+
+    def dispatch(self, user_id: int, event) -> bool:
+        """
+        Постановка события в очередь пользователя.
+
+        Если очередь переполнена дольше put_timeout, событие отбрасывается.
+
+        Args:
+            user_id (int): Идентификатор пользователя
+            event:         Событие
+
+        Returns:
+            bool: True, если событие принято, иначе False
+        """
+        worker_queue = self.queues[self.shard(user_id)]
+        try:
+            worker_queue.put(event, timeout=self.put_timeout)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            logging.warning(
+                "Очередь воркера переполнена, событие пользователя %s отброшено",
+                user_id,
+            )
+            return False
+
+        self._update_stats()
+        return True
+
+    def dispatch_batch(self, events: list, on_handled=None) -> list:
+        """
+        Постановка пачки событий (ответ long poll) в очереди пользователей.
+
+        Args:
+            events (list): События с атрибутом user_id в порядке получения
+            on_handled:    Функция без аргументов, вызываемая воркером, когда
+                           все принятые события пачки обработаны
+
+        Returns:
+            list: Отброшенные события (очередь переполнена)
+        """
+        dropped = [event for event in events if not self.dispatch(event.user_id, event)]
+        if on_handled is not None:
+            shards = {self.shard(event.user_id) for event in events}
+            if not shards:
+                on_handled()
+                return dropped
+            barrier = _Barrier(len(shards), on_handled)
+            for shard in shards:
+                # Отметку нельзя отбросить: ждём места в очереди
+                self.queues[shard].put(barrier)
+        return dropped
+
+    def queue_depth(self) -> list:
+        """
+        Текущая длина очередей воркеров.
+
+        Returns:
+            list: Количество ожидающих событий по каждому воркеру
+        """
+        return [worker_queue.qsize() for worker_queue in self.queues]
+
+    def _update_stats(self) -> None:
+        """
+        Обновление пиковой длины очереди и периодическая запись в лог.
+        """
+        depth = self.queue_depth()
+        now = time.monotonic()
+        with self._lock:
+            self.peak_depth = max(self.peak_depth, max(depth))
+            if now - self._last_stats < self.stats_interval:
+                return
+            self._last_stats = now
+            peak, dropped = self.peak_depth, self.dropped
+            self.peak_depth = 0
+
+        logging.info(
+            "Очереди воркеров: всего %s, по воркерам %s, пик %s, отброшено %s",
+            sum(depth),
+            depth,
+            peak,
+            dropped,
+        )
+
+    def _worker(self, worker_queue: queue.Queue) -> None:
+        """
+        Цикл обработки событий одного воркера.
+
+        Args:
+            worker_queue (queue.Queue): Очередь воркера
+        """
+        while True:
+            event = worker_queue.get()
+            try:
+                if event is _STOP:
+                    return
+                if isinstance(event, _Barrier):
+                    event.reach()
+                    continue
+                self.handler(event)
+            # pylint: disable = broad-exception-caught
+            except Exception as error:
+                logging.exception("Ошибка при обработке сообщения: %s", error)
+            finally:
+                worker_queue.task_done()
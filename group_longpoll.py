@@ -0,0 +1,253 @@
+"""
+Приём сообщений группы через Bots Long Poll API.
+
+Ответ сервера обрабатывается целиком: сообщения пользователей из одного ответа
+передаются обработчику пачкой. Повторно полученные события (после
+переподключения или перезапуска) отбрасываются, а позиция ts сохраняется в БД
+после обработки пачки, поэтому после перезапуска приём продолжается с места
+остановки, без потери сообщений.
+"""
+
+import logging
+import threading
+
+from collections import OrderedDict, deque
+
+from vk_api.bot_longpoll import VkBotEventType, VkBotLongPoll
+
+from config import CONNECT_TIMEOUT, READ_TIMEOUT, LONGPOLL_DEDUPE, LONGPOLL_WAIT
+from database import CONNECTION_ERRORS
+from transport import reconnecting
+
+
+class GroupMessage:
+    """
+    Входящее сообщение пользователя (атрибуты как у события VkLongPoll)
+    """
+
+    __slots__ = ("event_id", "user_id", "text")
+
+    def __init__(self, event_id: str, user_id: int, text: str):
+        self.event_id = event_id
+        self.user_id = user_id
+        self.text = text
+
+
+class GroupLongPoll(VkBotLongPoll):
+    """
+    Клиент Bots Long Poll, продолжающий приём с сохранённой позиции
+    """
+
+    __slots__ = ()
+
+    def __init__(self, vk, group_id: int, wait: int = LONGPOLL_WAIT, ts=None):
+        """
+        Args:
+            vk:             Сессия VK группы (vk_api.VkApi)
+            group_id (int): ID группы
+            wait (int):     Ожидание событий сервером, секунды
+            ts:             Сохранённая позиция или None (только новые события)
+        """
+        super().__init__(vk, group_id, wait)
+        if ts is not None:
+            self.ts = ts
+
+    def check(self) -> list:
+        """
+        Один запрос к серверу long poll.
+
+        Returns:
+            list: События (VkBotEvent), пустой список при ошибке ключа или ts
+        """
+        params = {"act": "a_check", "key": self.key, "ts": self.ts, "wait": self.wait}
+        response = self.session.get(
+            self.url, params=params, timeout=(CONNECT_TIMEOUT, self.wait + READ_TIMEOUT)
+        ).json()
+
+        failed = response.get("failed")
+        if failed is None:
+            self.ts = response["ts"]
+            return [self._parse_event(raw) for raw in response["updates"]]
+        if failed == 1:
+            # Сохранённая позиция устарела: VK больше не хранит эти события
+            logging.warning(
+                "История long poll с ts=%s недоступна, продолжение с ts=%s",
+                self.ts,
+                response["ts"],
+            )
+            self.ts = response["ts"]
+        elif failed == 2:
+            self.update_longpoll_server(update_ts=False)
+        else:
+            self.update_longpoll_server()
+        return []
+
+
+class RecentIds:
+    """
+    Ограниченное множество последних ID событий
+    """
+
+    def __init__(self, size: int = LONGPOLL_DEDUPE):
+        """
+        Args:
+            size (int): Сколько последних ID помнить
+        """
+        self.size = size
+        self.ids = OrderedDict()
+
+    def add(self, event_id) -> bool:
+        """
+        Запоминание ID события.
+
+        Args:
+            event_id: ID события
+
+        Returns:
+            bool: True, если событие новое, False для повтора
+        """
+        if event_id in self.ids:
+            return False
+        self.ids[event_id] = None
+        if len(self.ids) > self.size:
+            self.ids.popitem(last=False)
+        return True
+
+
+class PositionTracker:
+    """
+    Сохранение позиции long poll после обработки пачек.
+
+    Пачки обрабатываются параллельно и могут завершиться не по порядку;
+    позиция пачки сохраняется, только когда обработаны она и все пачки до неё,
+    поэтому после сбоя необработанные сообщения будут получены снова.
+    """
+
+    def __init__(self, save):
+        """
+        Args:
+            save: Функция сохранения позиции save(name, ts)
+                  (database.Saver.save_longpoll_ts)
+        """
+        self.save = save
+        self.pending = deque()
+        self._lock = threading.Lock()
+
+    def add(self, name: str, ts):
+        """
+        Регистрация пачки в порядке получения.
+
+        Args:
+            name (str): Имя потока long poll
+            ts:         Позиция после пачки
+
+        Returns:
+            Функция без аргументов, отмечающая пачку обработанной
+        """
+        entry = [name, ts, False]
+        with self._lock:
+            self.pending.append(entry)
+        return lambda: self.handled(entry)
+
+    def handled(self, entry: list) -> None:
+        """
+        Пачка обработана: сохранение позиции последней пачки, до которой
+        обработано всё.
+
+        Args:
+            entry (list): Запись пачки из add
+        """
+        with self._lock:
+            entry[2] = True
+            last = None
+            while self.pending and self.pending[0][2]:
+                last = self.pending.popleft()
+            if last is None:
+                return
+            try:
+                self.save(last[0], last[1])
+            # pylint: disable = broad-exception-caught
+            except Exception as error:
+                logging.error("Ошибка сохранения позиции long poll: %s", error)
+
+
+def resolve_group_id(vk) -> int:
+    """
+    ID группы, которой принадлежит токен.
+
+    Args:
+        vk: Сессия VK группы
+
+    Returns:
+        int: ID группы
+    """
+    return vk.method("groups.getById")[0]["id"]
+
+
+def message_events(events: list, recent: RecentIds) -> list:
+    """
+    Новые личные сообщения пользователей из ответа long poll.
+
+    Args:
+        events (list):     События VkBotEvent
+        recent (RecentIds): Уже полученные события
+
+    Returns:
+        list: GroupMessage в порядке получения
+    """
+    messages = []
+    for event in events:
+        if event.type != VkBotEventType.MESSAGE_NEW or not event.from_user:
+            continue
+        # С версии API 5.103 сообщение вложено в object.message
+        message = event.obj.get("message") or event.obj
+        event_id = event.raw.get("event_id") or (
+            f"{message['peer_id']}:"
+            f"{message.get('conversation_message_id') or message.get('id')}"
+        )
+        if recent.add(event_id):
+            messages.append(
+                GroupMessage(event_id, message["from_id"], message.get("text", ""))
+            )
+    return messages
+
+
+def receive_batches(vk, saver, group_id: int = 0, wait: int = LONGPOLL_WAIT):
+    """
+    Бесконечный поток пачек сообщений группы с переподключением при сбоях.
+
+    При подключении приём продолжается с позиции, сохранённой в БД
+    (Saver.save_longpoll_ts или Saver.publish_events с position), поэтому
+    позицию нужно сохранять после обработки каждой пачки.
+
+    Args:
+        vk:             Сессия VK группы
+        saver:          database.Saver (позиция long poll)
+        group_id (int): ID группы (0 - определить по токену)
+        wait (int):     Ожидание событий сервером, секунды
+
+    Yields:
+        tuple: (имя потока, список GroupMessage, ts после этих событий)
+    """
+    recent = RecentIds()
+
+    def connect() -> GroupLongPoll:
+        nonlocal group_id
+        # ID группы определяется при подключении, чтобы сбой сети при запуске
+        # тоже приводил к переподключению
+        if not group_id:
+            group_id = resolve_group_id(vk)
+            logging.info("Bots Long Poll группы %s", group_id)
+        return GroupLongPoll(
+            vk, group_id, wait, saver.load_longpoll_ts(f"group{group_id}")
+        )
+
+    def responses(longpoll: GroupLongPoll):
+        while True:
+            events = longpoll.check()
+            yield events, longpoll.ts
+
+    # Позиция читается из БД при каждом подключении: недоступность БД
+    # тоже приводит к переподключению с паузой, а не к остановке приёма
+    for events, ts in reconnecting(connect, responses, errors=CONNECTION_ERRORS):
+        yield f"group{group_id}", message_events(events, recent), ts
@@ -0,0 +1,229 @@
+"""
+Фоновый сбор анкет в локальный индекс.
+
+В непиковые часы обходит популярные выборки (возраст, пол, город, семейное
+положение), запрашивает users.search и топ фото найденных анкет и сохраняет
+компактные записи в таблицу индекса. Бот с use_index = yes отвечает из индекса
+и обращается к API только для несобранных выборок.
+
+Запуск рядом с main.py:
+    python harvester.py          # постоянно, в окне [harvester] hours
+    python harvester.py --once   # один проход сразу
+"""
+
+import argparse
+import logging
+import time
+
+from config import (
+    CONNSTR,
+    LOGGING_FILE,
+    USER_TOKENS,
+    USER_RPS,
+    INDEX_TTL,
+    HARVEST_HOURS,
+    HARVEST_BUCKETS,
+    HARVEST_CITIES,
+    HARVEST_AGES,
+)
+from database import Saver
+from profile_index import compact_profile
+from scoring import SEARCH_FIELDS
+from vkinder import VKinder
+
+# users.search возвращает не больше 1000 анкет на выборку
+SEARCH_LIMIT = 1000
+# Семейное положение: не женат/не замужем, в активном поиске
+DEFAULT_STATUSES = (1, 6)
+# Пауза вне окна сбора, секунды
+IDLE_SLEEP = 60
+
+
+def parse_range(value: str) -> list:
+    """
+    Разбор списка чисел вида "1,2" или "18-40".
+
+    Args:
+        value (str): Список
+
+    Returns:
+        list: Числа
+    """
+    numbers = []
+    for part in value.split(","):
+        first, _, last = part.strip().partition("-")
+        numbers.extend(range(int(first), int(last or first) + 1))
+    return numbers
+
+
+def in_window(hours: str, hour: int) -> bool:
+    """
+    Попадает ли час в окно сбора "с-по" (может переходить через полночь).
+
+    Args:
+        hours (str): Окно, например "2-6" или "23-5"
+        hour (int):  Текущий час
+
+    Returns:
+        bool: True, если сейчас можно собирать
+    """
+    start, _, end = hours.partition("-")
+    start, end = int(start), int(end or start)
+    if start <= end:
+        return start <= hour <= end
+    return hour >= start or hour <= end
+
+
+class Harvester:
+    """
+    Сбор выборок анкет в индекс
+    """
+
+    def __init__(self, vkinder: VKinder, saver: Saver, ttl: float = INDEX_TTL):
+        """
+        Args:
+            vkinder (VKinder): Клиент VK API (без индекса)
+            saver (Saver):     Хранилище индекса
+            ttl (float):       Срок годности выборки, секунды
+        """
+        self.vkinder = vkinder
+        self.saver = saver
+        self.ttl = ttl
+
+    def buckets(self, limit: int = HARVEST_BUCKETS) -> list:
+        """
+        Выборки для сбора: самые частые запросы пользователей бота, дополненные
+        сеткой городов и возрастов из настроек.
+
+        Args:
+            limit (int): Максимум выборок
+
+        Returns:
+            list: Кортежи (age, gender, city, status)
+        """
+        buckets = self.saver.popular_buckets(limit)
+        for city in parse_range(HARVEST_CITIES):
+            for age in parse_range(HARVEST_AGES):
+                for gender in (1, 2):
+                    for status in DEFAULT_STATUSES:
+                        if len(buckets) >= limit:
+                            return buckets
+                        if (age, gender, city, status) not in buckets:
+                            buckets.append((age, gender, city, status))
+        return buckets
+
+    def stale_buckets(self, limit: int = HARVEST_BUCKETS) -> list:
+        """
+        Выборки, которые ещё не собраны или устарели (сначала самые старые).
+
+        Args:
+            limit (int): Максимум выборок
+
+        Returns:
+            list: Кортежи (age, gender, city, status)
+        """
+        harvested = self.saver.harvested_buckets()
+        # Обновляем заранее, за четверть срока годности
+        threshold = self.ttl * 0.75
+        stale = [
+            bucket
+            for bucket in self.buckets(limit)
+            if harvested.get(bucket, float("inf")) >= threshold
+        ]
+        return sorted(stale, key=lambda bucket: -harvested.get(bucket, float("inf")))
+
+    def harvest(self, bucket: tuple) -> int:
+        """
+        Сбор одной выборки.
+
+        Args:
+            bucket (tuple): (age, gender, city, status)
+
+        Returns:
+            int: Количество сохранённых анкет (-1 при ошибке API)
+        """
+        age, gender, city, status = bucket
+        try:
+            # Те же фильтры, что у живого поиска: выборка в индексе должна
+            # совпадать с ответом users.search для тех же параметров
+            response = self.vkinder.tokens.call(
+                "users.search",
+                count=SEARCH_LIMIT,
+                age_from=age,
+                age_to=age,
+                sex=gender,
+                city=city,
+                status=status,
+                fields=SEARCH_FIELDS,
+                **self.vkinder.planner.filters,
+            )
+        # pylint: disable = broad-exception-caught
+        except Exception as error:
+            logging.error("Ошибка сбора выборки %s: %s", bucket, error)
+            return -1
+
+        users = [user for user in response["items"] if not user.get("is_closed", True)]
+        photos = self.vkinder.get_top_photos_batch([user["id"] for user in users])
+        self.saver.store_bucket(
+            bucket,
+            [compact_profile(user, photos.get(user["id"])) for user in users],
+            response["count"],
+        )
+        return len(users)
+
+    def run_once(self, hours: str | None = None) -> int:
+        """
+        Один проход по устаревшим выборкам.
+
+        Args:
+            hours (str): Окно сбора; проход прерывается при выходе из него
+
+        Returns:
+            int: Количество собранных выборок
+        """
+        harvested = 0
+        for bucket in self.stale_buckets():
+            if hours and not in_window(hours, time.localtime().tm_hour):
+                break
+            profiles = self.harvest(bucket)
+            if profiles >= 0:
+                harvested += 1
+                logging.info("Выборка %s: %s анкет", bucket, profiles)
+        return harvested
+
+    def run_forever(self, hours: str = HARVEST_HOURS) -> None:
+        """
+        Сбор в окне hours каждые сутки.
+
+        Args:
+            hours (str): Окно сбора
+        """
+        while True:
+            if in_window(hours, time.localtime().tm_hour):
+                if self.run_once(hours) == 0:
+                    time.sleep(IDLE_SLEEP)
+            else:
+                time.sleep(IDLE_SLEEP)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сбор анкет в локальный индекс")
+    parser.add_argument(
+        "--once", action="store_true", help="один проход сразу, без окна сбора"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        handlers=[logging.FileHandler(LOGGING_FILE), logging.StreamHandler()],
+    )
+    saver = Saver(CONNSTR, pool_size=(1, 2))
+    harvester = Harvester(VKinder(USER_TOKENS, rate=USER_RPS), saver)
+    try:
+        if args.once:
+            logging.info("Собрано выборок: %s", harvester.run_once())
+        else:
+            harvester.run_forever()
+    finally:
+        saver.close()
@@ -2,14 +2,125 @@
 Основной файл для запуска бота
 """
 
+import argparse
 import logging
-
-from vk_api.longpoll import VkLongPoll, VkEventType
+import threading
 
 from vkinder import VkBot
-from config import TOKEN_GROUP, CONNSTR, LOGGING_FILE
+from cluster import QueueConsumer, run_receiver
+from database import Saver
+from dispatcher import EventDispatcher
+from group_longpoll import PositionTracker, receive_batches
+from transport import breaker_states
+from vk_client import get_session
+from metrics import (
+    ACTIVE_SESSIONS,
+    CACHE_EVENTS,
+    CIRCUIT_OPEN,
+    QUEUE_DEPTH,
+    USER_TOKENS as USER_TOKENS_METRIC,
+    MetricsServer,
+    SamplingProfiler,
+)
+from config import (
+    TOKEN_GROUP,
+    USER_TOKENS,
+    CONNSTR,
+    LOGGING_FILE,
+    WORKERS,
+    QUEUE_SIZE,
+    GROUP_RPS,
+    USER_RPS,
+    METRICS_HOST,
+    METRICS_PORT,
+    PROFILER_ENABLED,
+    PROFILER_INTERVAL,
+    CLUSTER_SHARDS,
+    CLUSTER_BATCH,
+    CLUSTER_POLL_INTERVAL,
+    GROUP_ID,
+)
+
+from messages import ERROR_MESSAGE_TYPE, ERROR_BUSY
+
+
+def handle_event(vkinder: VkBot, event) -> None:
+    """
+    Обработка одного события в воркере.
+
+    Args:
+        vkinder (VkBot): Объект бота
+        event:           Событие long poll
+    """
+    if event.text:
+        vkinder.process_message(event)
+    else:
+        vkinder.send_message(event.user_id, ERROR_MESSAGE_TYPE)
 
-from messages import ERROR_MESSAGE_TYPE
+
+def start_metrics_server() -> MetricsServer | None:
+    """
+    Запуск HTTP-эндпоинта /metrics, если он включён в settings.ini.
+
+    Returns:
+        MetricsServer or None: Сервер метрик
+    """
+    if not METRICS_PORT:
+        return None
+    profiler = SamplingProfiler(PROFILER_INTERVAL) if PROFILER_ENABLED else None
+    try:
+        server = MetricsServer(METRICS_HOST, METRICS_PORT, profiler=profiler)
+    except OSError as error:
+        logging.error("Не удалось запустить сервер метрик: %s", error)
+        return None
+    server.start()
+    return server
+
+
+def register_bot_metrics(vkinder: VkBot, dispatcher: EventDispatcher) -> None:
+    """
+    Метрики состояния бота, вычисляемые при каждом чтении /metrics.
+
+    Args:
+        vkinder (VkBot):             Объект бота
+        dispatcher (EventDispatcher): Диспетчер событий
+    """
+    ACTIVE_SESSIONS.set_function(lambda: len(vkinder.worker_cache))
+    CIRCUIT_OPEN.set_function(
+        lambda: {(method,): state for method, state in breaker_states().items()}
+    )
+    QUEUE_DEPTH.set_function(
+        lambda: {
+            (str(index),): depth
+            for index, depth in enumerate(dispatcher.queue_depth())
+        }
+    )
+    CACHE_EVENTS.set_function(
+        lambda: {
+            (name, result): stats[key]
+            for name, stats in vkinder.vkinder.cache_stats().items()
+            for result, key in (("hit", "hits"), ("miss", "misses"))
+        }
+    )
+    USER_TOKENS_METRIC.set_function(
+        lambda: {
+            (str(index), stat): float(value)
+            for index, stats in vkinder.vkinder.token_stats().items()
+            for stat, value in stats.items()
+        }
+    )
+
+
+def start_warm_up(vkinder: VkBot) -> None:
+    """
+    Прогрев соединений с БД и VK API в фоне: бот начинает принимать сообщения сразу.
+
+    Args:
+        vkinder (VkBot): Объект бота
+    """
+    threading.Thread(
+        target=vkinder.warm_up, args=(WORKERS,), name="vkinder-warm-up", daemon=True
+    ).start()
 
 
 def run_vkinder_bot():
@@ -17,25 +128,143 @@ def run_vkinder_bot():
     Запуск бота
     """
     vkinder = VkBot(token=TOKEN_GROUP, connection_string=CONNSTR)
-    longpoll = VkLongPoll(vkinder.session)
-    logging.info("VKinder бот запущен!")
-
-    for event in longpoll.listen():
-        try:
-            if (
-                event.type == VkEventType.MESSAGE_NEW
-                and event.to_me
-                and event.from_user
-            ):
-                if event.text:
-                    vkinder.process_message(event)
-                else:
-                    vkinder.send_message(event.user_id, ERROR_MESSAGE_TYPE)
-        except FileNotFoundError as error:
-            logging.error("Ошибка при обработке сообщения: %s", error)
+    start_warm_up(vkinder)
+    dispatcher = EventDispatcher(
+        lambda event: handle_event(vkinder, event),
+        workers=WORKERS,
+        queue_size=QUEUE_SIZE,
+    )
+    dispatcher.start()
+    metrics_server = start_metrics_server()
+    if metrics_server is not None:
+        register_bot_metrics(vkinder, dispatcher)
+    logging.info("VKinder бот запущен! Воркеров: %s", WORKERS)
+
+    try:
+        # Сообщения одного ответа long poll передаются воркерам пачкой,
+        # позиция сохраняется после их обработки: после перезапуска приём
+        # продолжится с первой необработанной пачки
+        position = PositionTracker(vkinder.worker_db.save_longpoll_ts)
+        last_ts = None
+        for name, events, ts in receive_batches(
+            vkinder.session, vkinder.worker_db, GROUP_ID
+        ):
+            if not events and ts == last_ts:
+                continue
+            try:
+                for event in dispatcher.dispatch_batch(
+                    events, on_handled=position.add(name, ts)
+                ):
+                    vkinder.send_message(event.user_id, ERROR_BUSY)
+                last_ts = ts
+            # pylint: disable = broad-exception-caught
+            except Exception as error:
+                logging.exception("Ошибка при обработке сообщений: %s", error)
+    finally:
+        dispatcher.stop()
+        vkinder.close()
+        if metrics_server is not None:
+            metrics_server.stop()
+
+
+def run_vkinder_receiver():
+    """
+    Запуск приёмника сообщений для распределённого режима
+    """
+    saver = Saver(CONNSTR, pool_size=(1, 2))
+    try:
+        run_receiver(get_session(TOKEN_GROUP), saver, CLUSTER_SHARDS, GROUP_ID)
+    finally:
+        saver.close()
+
+
+def run_vkinder_worker(shards: list):
+    """
+    Запуск воркера распределённого режима.
+
+    Args:
+        shards (list): Номера шардов очереди, которые обрабатывает процесс
+    """
+    vkinder = VkBot(token=TOKEN_GROUP, connection_string=CONNSTR, shared_state=True)
+    start_warm_up(vkinder)
+    consumer = QueueConsumer(
+        vkinder.worker_db,
+        shards,
+        lambda event: handle_event(vkinder, event),
+        workers=WORKERS,
+        batch_size=CLUSTER_BATCH,
+        poll_interval=CLUSTER_POLL_INTERVAL,
+    )
+    metrics_server = start_metrics_server()
+    if metrics_server is not None:
+        register_bot_metrics(vkinder, consumer.dispatcher)
+    try:
+        consumer.run()
+    finally:
+        vkinder.close()
+        if metrics_server is not None:
+            metrics_server.stop()
+
+
+def parse_shards(value: str) -> list:
+    """
+    Разбор списка шардов из командной строки ("0,1" или "0-3").
+
+    Args:
+        value (str): Номера шардов
+
+    Returns:
+        list: Номера шардов
+    """
+    shards = []
+    for part in value.split(","):
+        first, _, last = part.partition("-")
+        shards.extend(range(int(first), int(last or first) + 1))
+    invalid = [shard for shard in shards if not 0 <= shard < CLUSTER_SHARDS]
+    if invalid:
+        raise argparse.ArgumentTypeError(
+            f"шарды {invalid} вне диапазона 0-{CLUSTER_SHARDS - 1}"
+        )
+    return shards
+
+
+def run_vkinder_bot_async():
+    """
+    Запуск бота на asyncio
+    """
+    # pylint: disable = import-outside-toplevel
+    import asyncio
+
+    from async_bot import run_async_bot
+
+    metrics_server = start_metrics_server()
+    try:
+        asyncio.run(
+            run_async_bot(TOKEN_GROUP, USER_TOKENS, CONNSTR, GROUP_RPS, USER_RPS)
+        )
+    finally:
+        if metrics_server is not None:
+            metrics_server.stop()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="VKinder бот")
+    parser.add_argument(
+        "--async", dest="use_async", action="store_true", help="запуск на asyncio"
+    )
+    parser.add_argument(
+        "--receiver",
+        action="store_true",
+        help="распределённый режим: только приём сообщений в очередь",
+    )
+    parser.add_argument(
+        "--worker",
+        metavar="SHARDS",
+        type=parse_shards,
+        help='распределённый режим: обработка шардов очереди, например "0,1" или "0-3"',
+    )
+    args = parser.parse_args()
+
     # Добавим логгирование
     logging.basicConfig(
         level=logging.INFO,
@@ -43,4 +272,11 @@ if __name__ == "__main__":
         handlers=[logging.FileHandler(LOGGING_FILE), logging.StreamHandler()],
     )
     # Запустим бота
-    run_vkinder_bot()
+    if args.receiver:
+        run_vkinder_receiver()
+    elif args.worker is not None:
+        run_vkinder_worker(args.worker)
+    elif args.use_async:
+        run_vkinder_bot_async()
+    else:
+        run_vkinder_bot()
@@ -32,6 +32,7 @@ PROCESS_FINAL = 'Вот эти люди могут тебя заинтересо
 PROCESS_NEXT_PROFILES = 'Окей, вот еще найденные люди:\n'
 TRY_AGAIN = "Давай попробуем заново!"
 NO_MORE_PROFILES = f'Больше анкет нет. Хочешь еще? Напиши "{AGAIN_SEARCH}"'
+CAROUSEL_DESCRIPTION = "Открыть страницу"
 
 
 # Ошибки
@@ -42,3 +43,4 @@ ERROR_MESSAGE_DATA = "Введены некорректные данные. По
 ERROR_TOKEN = "Ошибка при работе с API. Обратитесь к администратору."
 ERROR_FIND = "Пользователи не найдены."
 ERROR_OTHER = "Произошла ошибка. Пожалуйста, начните сначала."
+ERROR_BUSY = "Бот сейчас перегружен. Пожалуйста, повторите сообщение позже."
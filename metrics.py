@@ -0,0 +1,473 @@
+"""
+Метрики бота в формате Prometheus и сэмплирующий профилировщик
+"""
+
+import bisect
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from collections import Counter as StackCounter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Границы корзин гистограмм задержки, секунды
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def escape(value) -> str:
+    """
+    Экранирование значения метки.
+
+    Args:
+        value: Значение метки
+
+    Returns:
+        str: Значение с экранированными \\, " и переводами строк
+    """
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    """
+    Метки метрики в формате {name="value",...}.
+
+    Args:
+        names (tuple):  Имена меток
+        values (tuple): Значения меток
+        extra (str):    Дополнительная метка (например le="0.1")
+
+    Returns:
+        str: Строка меток или пустая строка
+    """
+    parts = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Metric:
+    """
+    Базовый класс метрики с метками
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+        self.callbacks = []
+        self._lock = threading.Lock()
+
+    def key(self, labels: dict) -> tuple:
+        """
+        Ключ значения по меткам.
+
+        Args:
+            labels (dict): Значения меток
+
+        Returns:
+            tuple: Значения меток в порядке объявления
+        """
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def header(self) -> list:
+        """
+        Строки HELP и TYPE.
+
+        Returns:
+            list: Строки описания метрики
+        """
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+    def set_function(self, func) -> None:
+        """
+        Функция, возвращающая значения при каждом чтении метрики.
+
+        Args:
+            func: func() -> число или dict {значения меток (tuple): число}
+        """
+        with self._lock:
+            self.callbacks.append(func)
+
+    def collect(self) -> None:
+        """
+        Обновление значений из функций set_function.
+        """
+        for func in list(self.callbacks):
+            try:
+                result = func()
+            # pylint: disable = broad-exception-caught
+            except Exception as error:
+                logging.error("Ошибка вычисления метрики %s: %s", self.name, error)
+                continue
+            if not isinstance(result, dict):
+                result = {(): result}
+            with self._lock:
+                self.values.update(result)
+
+    def render(self) -> list:
+        """
+        Строки метрики в текстовом формате Prometheus.
+
+        Returns:
+            list: Строки
+        """
+        self.collect()
+        with self._lock:
+            items = sorted(self.values.items())
+        return self.header() + [
+            f"{self.name}{format_labels(self.labels, key)} {value}"
+            for key, value in items
+        ]
+
+
+class Counter(Metric):
+    """
+    Монотонно растущий счётчик (увеличивается inc() или читается из
+    накопленного итога функцией set_function)
+    """
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        """
+        Увеличение счётчика.
+
+        Args:
+            amount (float): Приращение
+            **labels:       Значения меток
+        """
+        key = self.key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    Текущее значение; может вычисляться функцией при каждом чтении
+    """
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        """
+        Установка значения.
+
+        Args:
+            value (float): Значение
+            **labels:      Значения меток
+        """
+        with self._lock:
+            self.values[self.key(labels)] = value
+
+
+class Histogram(Metric):
+    """
+    Распределение значений по корзинам
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple = (),
+        buckets: tuple = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        """
+        Учёт значения.
+
+        Args:
+            value (float): Значение
+            **labels:      Значения меток
+        """
+        key = self.key(labels)
+        # Последняя корзина - +Inf
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            item = self.values.get(key)
+            if item is None:
+                item = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            item[0][index] += 1
+            item[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Замер длительности блока кода.
+
+        Args:
+            **labels: Значения меток
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list:
+        lines = self.header()
+        with self._lock:
+            items = sorted(
+                (key, list(counts), total)
+                for key, (counts, total) in self.values.items()
+            )
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                labels = format_labels(self.labels, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """
+    Набор метрик процесса
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric: Metric) -> Metric:
+        """
+        Регистрация метрики.
+
+        Args:
+            metric (Metric): Метрика
+
+        Returns:
+            Metric: Та же метрика
+        """
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """
+        Все метрики в текстовом формате Prometheus.
+
+        Returns:
+            str: Текст для ответа /metrics
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Метрики горячего пути
+STEP_LATENCY = REGISTRY.register(
+    Histogram("vkinder_step_seconds", "Время обработки шага диалога", ("step",))
+)
+MESSAGE_LATENCY = REGISTRY.register(
+    Histogram("vkinder_process_message_seconds", "Время обработки сообщения")
+)
+API_CALLS = REGISTRY.register(
+    Counter(
+        "vkinder_vk_api_calls_total", "Вызовы VK API по методам", ("method", "code")
+    )
+)
+API_LATENCY = REGISTRY.register(
+    Histogram("vkinder_vk_api_seconds", "Время вызова VK API", ("method",))
+)
+DB_LATENCY = REGISTRY.register(
+    Histogram("vkinder_db_query_seconds", "Время запроса к БД", ("operation",))
+)
+CACHE_EVENTS = REGISTRY.register(
+    Counter(
+        "vkinder_cache_requests_total", "Попадания и промахи кэшей", ("cache", "result")
+    )
+)
+ACTIVE_SESSIONS = REGISTRY.register(
+    Gauge("vkinder_active_sessions", "Диалоги в памяти")
+)
+USER_TOKENS = REGISTRY.register(
+    Gauge("vkinder_user_token", "Использование токенов пользователя", ("token", "stat"))
+)
+QUEUE_DEPTH = REGISTRY.register(
+    Gauge("vkinder_queue_depth", "Событий в очередях воркеров", ("worker",))
+)
+CIRCUIT_OPEN = REGISTRY.register(
+    Gauge("vkinder_circuit_open", "Разомкнутые предохранители методов", ("method",))
+)
+
+
+class SamplingProfiler:
+    """
+    Сэмплирующий профилировщик: периодически снимает стеки всех потоков.
+
+    Результат в формате "кадр;кадр;кадр количество" подходит для flamegraph.pl
+    и speedscope.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        """
+        Args:
+            interval (float): Период снятия стеков, секунды
+        """
+        self.interval = interval
+        self.stacks = StackCounter()
+        self.samples = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.thread = None
+
+    def start(self) -> None:
+        """
+        Запуск профилировщика в фоновом потоке.
+        """
+        self.thread = threading.Thread(
+            target=self._run, name="vkinder-profiler", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self) -> None:
+        """
+        Остановка профилировщика.
+        """
+        self._stop.set()
+
+    def _run(self) -> None:
+        """
+        Цикл снятия стеков.
+        """
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()  # pylint: disable = protected-access
+            collapsed = []
+            for thread_id, frame in frames.items():
+                if thread_id == own:
+                    continue
+                stack = traceback.extract_stack(frame)
+                collapsed.append(
+                    ";".join(
+                        f"{entry.name} ({entry.filename}:{entry.lineno})"
+                        for entry in stack
+                    )
+                )
+            with self._lock:
+                self.samples += 1
+                self.stacks.update(collapsed)
+
+    def render(self, reset: bool = False) -> str:
+        """
+        Накопленные стеки.
+
+        Args:
+            reset (bool): Очистить накопленные данные
+
+        Returns:
+            str: Стеки в свёрнутом формате
+        """
+        with self._lock:
+            stacks = self.stacks.most_common()
+            if reset:
+                self.stacks = StackCounter()
+                self.samples = 0
+        return "\n".join(f"{stack} {count}" for stack, count in stacks) + "\n"
+
+
+class MetricsServer:
+    """
+    HTTP-сервер метрик: /metrics и, если включён профилировщик, /profile
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 9108,
+        registry: Registry = REGISTRY,
+        profiler: SamplingProfiler | None = None,
+    ):
+        """
+        Args:
+            host (str):                  Адрес
+            port (int):                  Порт
+            registry (Registry):         Набор метрик
+            profiler (SamplingProfiler): Профилировщик или None
+        """
+        self.registry = registry
+        self.profiler = profiler
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    def _handler_class(self):
+        """
+        Класс обработчика запросов, связанный с этим сервером.
+        """
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """
+            Обработчик запросов метрик
+            """
+
+            # pylint: disable = invalid-name
+            def do_GET(self):
+                """
+                Ответ на GET-запрос.
+                """
+                path = self.path.split("?")[0]
+                if path == "/metrics":
+                    body = server.registry.render()
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif path == "/profile" and server.profiler is not None:
+                    body = server.profiler.render(reset="reset" in self.path)
+                    content_type = "text/plain; charset=utf-8"
+                else:
+                    self.send_error(404)
+                    return
+                payload = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *_):
+                """
+                Запросы метрик не пишутся в лог.
+                """
+
+        return Handler
+
+    def start(self) -> None:
+        """
+        Запуск сервера в фоновом потоке.
+        """
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, name="vkinder-metrics", daemon=True
+        )
+        self.thread.start()
+        if self.profiler is not None:
+            self.profiler.start()
+        host, port = self.server.server_address[:2]
+        logging.info("Метрики доступны на http://%s:%s/metrics", host, port)
+
+    def stop(self) -> None:
+        """
+        Остановка сервера.
+        """
+        if self.profiler is not None:
+            self.profiler.stop()
+        self.server.shutdown()
+        self.server.server_close()
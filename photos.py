@@ -0,0 +1,86 @@
+"""
+Общие функции получения топ фото пользователей
+"""
+
+import heapq
+import json
+
+# Максимум вызовов API внутри одного execute
+EXECUTE_LIMIT = 25
+
+# VKScript: photos.getAll для списка владельцев за один запрос
+TOP_PHOTOS_CODE = """
+var ids = %s;
+var result = [];
+var i = 0;
+while (i < ids.length) {
+    result.push(API.photos.getAll({"owner_id": ids[i], "extended": 1}));
+    i = i + 1;
+}
+return result;
+"""
+
+
+def chunks(items: list, size: int = EXECUTE_LIMIT):
+    """
+    Разбиение списка на части.
+
+    Args:
+        items (list): Исходный список
+        size (int):   Размер части
+
+    Yields:
+        list: Очередная часть списка
+    """
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def top_photos_code(user_ids: list) -> str:
+    """
+    Код execute для получения фото нескольких пользователей.
+
+    Args:
+        user_ids (list): ID пользователей (не больше EXECUTE_LIMIT)
+
+    Returns:
+        str: Код VKScript
+    """
+    return TOP_PHOTOS_CODE % json.dumps([int(user_id) for user_id in user_ids])
+
+
+def top_photos(photos: dict | None, top_count: int = 3) -> list | None:
+    """
+    Выбор самых популярных фото из ответа photos.getAll.
+
+    Args:
+        photos (dict):   Ответ photos.getAll(extended=1) или None
+        top_count (int): Количество фото
+
+    Returns:
+        list: Топ N фото по лайкам / None, если фото нет
+    """
+    if not photos or photos.get("count", 0) == 0:
+        return None
+    # Частичная сортировка: куча размера top_count вместо полной сортировки
+    return heapq.nlargest(
+        top_count, photos["items"], key=lambda x: x["likes"]["count"]
+    )
+
+
+def parse_top_photos(user_ids: list, response: list, top_count: int = 3) -> dict:
+    """
+    Разбор ответа execute с фото нескольких пользователей.
+
+    Args:
+        user_ids (list):  ID пользователей в порядке запроса
+        response (list): Ответ execute (false для недоступных профилей)
+        top_count (int): Количество фото
+
+    Returns:
+        dict: ID пользователя -> топ N фото / None
+    """
+    return {
+        user_id: top_photos(photos or None, top_count)
+        for user_id, photos in zip(user_ids, response or [])
+    }
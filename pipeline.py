@@ -0,0 +1,235 @@
+"""
+Буфер кандидатов с предварительной загрузкой следующей страницы
+"""
+
+import logging
+import threading
+
+from collections import deque
+
+
+class CandidateBuffer:
+    """
+    Состояние поиска одного пользователя без ввода-вывода.
+
+    Анкеты читаются из потока поиска (search_stream.ProfileStream,
+    VKinder.iter_profiles): позиция потока учитывает все полученные от API
+    анкеты, а не только показанные, поэтому кандидаты не пропускаются и не
+    запрашиваются повторно: лишние остаются в буфере до следующей страницы.
+
+    Найденные анкеты сначала попадают в пул, из которого на страницу
+    отбираются лучшие по оценке scorer; фото загружаются только для них.
+    """
+
+    def __init__(self, stream, page_size: int = 5, max_requests: int = 5, scorer=None):
+        """
+        Args:
+            stream:             Поток анкет поиска (VKinder.iter_profiles)
+            page_size (int):    Анкет на одной странице
+            max_requests (int): Максимум запросов на одно пополнение буфера
+            scorer:             scoring.CandidateScorer или None (порядок API)
+        """
+        self.stream = stream
+        self.page_size = page_size
+        self.max_requests = max_requests
+        self.scorer = scorer
+        self.pool = []
+        self.candidates = deque()
+
+    @property
+    def offset(self) -> int:
+        """
+        Позиция поиска одним числом (сохраняется в состоянии диалога).
+        """
+        return self.stream.position
+
+    @offset.setter
+    def offset(self, position: int) -> None:
+        self.stream.position = position
+
+    @property
+    def exhausted(self) -> bool:
+        """
+        Все сегменты поиска просмотрены.
+        """
+        return self.stream.exhausted
+
+    @property
+    def error(self) -> bool:
+        """
+        Последний запрос поиска завершился ошибкой API.
+        """
+        return self.stream.error
+
+    @error.setter
+    def error(self, value: bool) -> None:
+        self.stream.error = value
+
+    def missing(self) -> int:
+        """
+        Сколько анкет не хватает до полной страницы.
+
+        Returns:
+            int: Количество анкет
+        """
+        return max(0, self.page_size - len(self.candidates))
+
+    def needs_search(self) -> bool:
+        """
+        Нужен ли ещё запрос users.search для следующей страницы.
+
+        Returns:
+            bool: True, если в пуле не хватает анкет и поиск не исчерпан
+        """
+        return len(self.pool) < self.missing() and not self.exhausted
+
+    def select(self) -> list:
+        """
+        Извлечение из пула лучших анкет для следующей страницы.
+
+        Returns:
+            list: Анкеты, для которых нужно загрузить фото
+        """
+        count = min(self.missing(), len(self.pool))
+        if count == 0:
+            return []
+        if self.scorer is None:
+            chosen = list(range(count))
+        else:
+            chosen = self.scorer.top_k(self.pool, count)
+        best = [self.pool[index] for index in chosen]
+        chosen = set(chosen)
+        self.pool = [
+            user for index, user in enumerate(self.pool) if index not in chosen
+        ]
+        return best
+
+    def add(self, users: list, cards: dict) -> None:
+        """
+        Добавление подготовленных анкет в буфер.
+
+        Args:
+            users (list):  Анкеты
+            cards (dict):  ID анкеты -> карточка (cards.ProfileCard)
+        """
+        for user in users:
+            self.candidates.append(dict(user, card=cards.get(user["id"])))
+
+    def ready(self) -> bool:
+        """
+        Достаточно ли анкет для следующей страницы.
+
+        Returns:
+            bool: True, если буфер заполнен или поиск и пул исчерпаны
+        """
+        return len(self.candidates) >= self.page_size or (
+            self.exhausted and not self.pool
+        )
+
+    def take(self, seen) -> list:
+        """
+        Извлечение страницы анкет из буфера.
+
+        Args:
+            seen: Уже показанные пользователю анкеты
+
+        Returns:
+            list: Анкеты для показа
+        """
+        page = []
+        while self.candidates and len(page) < self.page_size:
+            candidate = self.candidates.popleft()
+            if candidate["id"] not in seen:
+                page.append(candidate)
+        return page
+
+
+class CandidatePipeline(CandidateBuffer):
+    """
+    Буфер кандидатов, который загружает следующую страницу в фоне
+    """
+
+    def __init__(self, stream, fetch_cards, executor, **kwargs):
+        """
+        Args:
+            stream:         Поток анкет поиска (VKinder.iter_profiles)
+            fetch_cards:    Функция карточек (VKinder.get_profile_cards)
+            executor:       Пул потоков для фоновой загрузки
+            **kwargs:       Параметры CandidateBuffer
+        """
+        super().__init__(stream, **kwargs)
+        self.fetch_cards = fetch_cards
+        self.executor = executor
+        self.future = None
+        self.lock = threading.Lock()
+
+    def next_page(self, seen) -> list | None:
+        """
+        Следующая страница анкет (из буфера, если она уже загружена).
+
+        Args:
+            seen: Уже показанные пользователю анкеты
+
+        Returns:
+            list: Анкеты / None при ошибке API
+        """
+        self._wait_prefetch()
+        with self.lock:
+            self.error = False
+            self._fill(seen)
+            page = self.take(seen)
+
+        if not page and self.error:
+            return None
+        return page
+
+    def prefetch(self, seen) -> None:
+        """
+        Фоновая загрузка следующей страницы.
+
+        Args:
+            seen: Уже показанные пользователю анкеты
+        """
+        if self.future is not None or self.ready():
+            return
+        self.future = self.executor.submit(self._prefetch, seen)
+
+    def _prefetch(self, seen) -> None:
+        """
+        Пополнение буфера в фоновом потоке.
+
+        Args:
+            seen: Уже показанные пользователю анкеты
+        """
+        with self.lock:
+            self._fill(seen)
+
+    def _wait_prefetch(self) -> None:
+        """
+        Ожидание завершения фоновой загрузки.
+        """
+        if self.future is None:
+            return
+        try:
+            self.future.result()
+        # pylint: disable = broad-exception-caught
+        except Exception as error:
+            logging.error("Ошибка фоновой загрузки анкет: %s", error)
+        self.future = None
+
+    def _fill(self, seen) -> None:
+        """
+        Пополнение буфера до размера страницы.
+
+        Args:
+            seen: Уже показанные пользователю анкеты
+        """
+        self.stream.seen = seen
+        for _ in range(self.max_requests):
+            if not self.needs_search() or self.error:
+                break
+            self.pool.extend(self.stream.fetch())
+
+        best = self.select()
+        if best:
+            self.add(best, self.fetch_cards([user["id"] for user in best]))
@@ -0,0 +1,109 @@
+"""
+Локальный индекс анкет, заранее собранный harvester.py
+"""
+
+import logging
+
+
+def compact_profile(user: dict, photos: list | None) -> tuple:
+    """
+    Компактная запись анкеты для таблицы индекса.
+
+    Args:
+        user (dict):   Анкета из users.search
+        photos (list): Топ фото анкеты или None
+
+    Returns:
+        tuple: (profile_id, first_name, last_name, bdate, interests,
+                last_seen, photo_ids)
+    """
+    last_seen = user.get("last_seen") or {}
+    return (
+        user["id"],
+        user.get("first_name", ""),
+        user.get("last_name", ""),
+        user.get("bdate"),
+        user.get("interests") or None,
+        last_seen.get("time"),
+        [photo["id"] for photo in photos or []],
+    )
+
+
+def expand_profile(row: tuple) -> tuple:
+    """
+    Анкета в формате users.search и её топ фото.
+
+    Args:
+        row (tuple): Запись индекса (как возвращает compact_profile)
+
+    Returns:
+        tuple: (анкета, фото в формате photos.top_photos)
+    """
+    profile_id, first_name, last_name, bdate, interests, last_seen, photo_ids = row
+    user = {
+        "id": profile_id,
+        "first_name": first_name,
+        "last_name": last_name,
+        "is_closed": False,
+        "has_photo": 1 if photo_ids else 0,
+    }
+    if bdate:
+        user["bdate"] = bdate
+    if interests:
+        user["interests"] = interests
+    if last_seen:
+        user["last_seen"] = {"time": last_seen}
+    photos = [{"owner_id": profile_id, "id": photo_id} for photo_id in photo_ids or []]
+    return user, photos
+
+
+class ProfileIndex:
+    """
+    Поиск анкет в локальном индексе.
+
+    Индекс отвечает только за "тёплые" выборки - собранные не раньше ttl
+    секунд назад; для остальных search возвращает None и поиск идёт в API.
+    """
+
+    def __init__(self, store, ttl: float = 86400):
+        """
+        Args:
+            store:       Хранилище с методом search_index (database.Saver)
+            ttl (float): Срок годности собранной выборки, секунды
+        """
+        self.store = store
+        self.ttl = ttl
+
+    # pylint: disable = too-many-arguments
+    def search(
+        self, age: int, gender: int, city: int, status: int, count: int, offset: int
+    ) -> tuple | None:
+        """
+        Страница выборки из индекса.
+
+        Returns:
+            tuple: (анкеты, ID анкеты -> топ фото, размер выборки в VK) / None,
+                   если выборки нет
+        """
+        try:
+            found = self.store.search_index(
+                (int(age), int(gender), int(city), int(status)),
+                int(count),
+                int(offset),
+                self.ttl,
+            )
+        # pylint: disable = broad-exception-caught
+        except Exception as error:
+            logging.error("Ошибка чтения индекса анкет: %s", error)
+            return None
+        if found is None:
+            return None
+
+        total, rows = found
+        users = []
+        photos = {}
+        for row in rows:
+            user, top = expand_profile(row)
+            users.append(user)
+            photos[user["id"]] = top
+        return users, photos, total
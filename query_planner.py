@@ -0,0 +1,134 @@
+"""
+Планировщик запросов users.search: фильтры на стороне VK и сколько анкет
+запрашивать, чтобы получить нужное количество подходящих (открытых и ещё
+не показанных).
+
+Доля подходящих анкет в ответе сильно зависит от города и возраста, поэтому
+для каждой выборки (город, возраст) хранится её скользящее среднее.
+"""
+
+import math
+import threading
+
+# users.search возвращает не больше 1000 анкет за запрос
+MAX_COUNT = 1000
+
+
+class QueryPlanner:
+    """
+    Фильтры и размер запроса users.search по наблюдаемой доле подходящих анкет
+    """
+
+    # pylint: disable = too-many-arguments
+    def __init__(
+        self,
+        has_photo: bool = True,
+        sort: int | None = 0,
+        max_count: int = MAX_COUNT,
+        prior: float = 0.5,
+        alpha: float = 0.2,
+        min_yield: float = 0.05,
+        step: int = 10,
+    ):
+        """
+        Args:
+            has_photo (bool):  Искать только анкеты с фото (без фото анкету
+                               не показать)
+            sort (int):        Порядок users.search: 0 - по популярности,
+                               1 - по дате регистрации, None - по умолчанию VK
+            max_count (int):   Максимум анкет в одном запросе
+            prior (float):     Доля подходящих анкет для новой выборки
+            alpha (float):     Вес нового наблюдения в скользящем среднем
+            min_yield (float): Нижняя граница доли (ограничивает размер запроса)
+            step (int):        Размер запроса округляется вверх до кратного step,
+                               чтобы одинаковые запросы попадали в кэш
+        """
+        # Параметры users.search, которые отсеивают анкеты на стороне VK
+        self.filters = {"has_photo": 1 if has_photo else None, "sort": sort}
+        self.max_count = min(max_count, MAX_COUNT)
+        self.prior = prior
+        self.alpha = alpha
+        self.min_yield = min_yield
+        self.step = step
+        # (город, возраст) -> (доля подходящих, количество наблюдений)
+        self.yields = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def bucket(params: dict) -> tuple:
+        """
+        Выборка, к которой относится запрос.
+
+        Args:
+            params (dict): Параметры поиска (age, gender, city, status)
+
+        Returns:
+            tuple: (город, возраст)
+        """
+        return int(params["city"]), int(params["age"])
+
+    def expected_yield(self, params: dict) -> float:
+        """
+        Ожидаемая доля подходящих анкет в ответе.
+
+        Args:
+            params (dict): Параметры поиска
+
+        Returns:
+            float: Доля от min_yield до 1
+        """
+        with self._lock:
+            ratio, _ = self.yields.get(self.bucket(params), (self.prior, 0))
+        return max(ratio, self.min_yield)
+
+    def count(self, params: dict, wanted: int) -> int:
+        """
+        Сколько анкет запросить, чтобы получить wanted подходящих.
+
+        Args:
+            params (dict): Параметры поиска
+            wanted (int):  Нужно подходящих анкет
+
+        Returns:
+            int: Параметр count для users.search
+        """
+        count = math.ceil(wanted / self.expected_yield(params))
+        count = math.ceil(count / self.step) * self.step
+        return max(1, min(count, self.max_count))
+
+    def record(self, params: dict, returned: int, eligible: int) -> None:
+        """
+        Учёт ответа users.search.
+
+        Args:
+            params (dict):  Параметры поиска
+            returned (int): Анкет в ответе
+            eligible (int): Из них подходящих
+        """
+        if returned <= 0:
+            return
+        observed = eligible / returned
+        key = self.bucket(params)
+        with self._lock:
+            ratio, samples = self.yields.get(key, (None, 0))
+            if ratio is None:
+                ratio = observed
+            else:
+                ratio += self.alpha * (observed - ratio)
+            self.yields[key] = (ratio, samples + 1)
+
+    def stats(self) -> dict:
+        """
+        Статистика планировщика.
+
+        Returns:
+            dict: Количество выборок и ответов, средняя доля подходящих анкет
+        """
+        with self._lock:
+            yields = list(self.yields.values())
+        ratios = [ratio for ratio, _ in yields]
+        return {
+            "buckets": len(yields),
+            "responses": sum(samples for _, samples in yields),
+            "mean_yield": round(sum(ratios) / len(ratios), 3) if ratios else None,
+        }
@@ -0,0 +1,266 @@
+"""
+Ограничение частоты запросов к VK API
+"""
+
+import logging
+import threading
+import time
+
+from config import API_RETRIES, API_BACKOFF
+from metrics import API_CALLS, API_LATENCY
+from transport import (
+    NETWORK_ERRORS,
+    CircuitOpenError,
+    TransportError,
+    backoff_delay,
+    get_breaker,
+    is_transient,
+)
+
+# Коды ошибок VK: слишком много запросов в секунду / контроль флуда
+RATE_LIMIT_CODES = (6, 9)
+
+
+class TokenBucket:
+    """
+    Корзина токенов: не больше rate запросов в секунду с запасом capacity.
+
+    Потокобезопасна и может использоваться из asyncio: токен резервируется
+    под блокировкой, а ожидание выполняется вне её.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        """
+        Args:
+            rate (float):     Запросов в секунду
+            capacity (float): Размер пачки запросов (по умолчанию rate)
+        """
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Резервирование одного токена.
+
+        Returns:
+            float: Сколько секунд нужно подождать перед запросом
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def acquire(self) -> None:
+        """
+        Ожидание разрешения на запрос (блокирует поток).
+        """
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def acquire_async(self) -> None:
+        """
+        Ожидание разрешения на запрос (не блокирует цикл событий).
+        """
+        # pylint: disable = import-outside-toplevel
+        import asyncio
+
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+# Общие корзины: одна на токен для всех пользователей бота
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(token: str, rate: float) -> TokenBucket:
+    """
+    Корзина токенов для токена доступа VK.
+
+    Args:
+        token (str):  Токен доступа
+        rate (float): Запросов в секунду
+
+    Returns:
+        TokenBucket: Общая корзина для этого токена
+    """
+    with _buckets_lock:
+        if token not in _buckets:
+            _buckets[token] = TokenBucket(rate)
+        return _buckets[token]
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """
+    Проверка, что ошибка вызвана превышением лимита запросов.
+
+    Args:
+        error (Exception): Ошибка VK API
+
+    Returns:
+        bool: True для ошибок с кодами 6 и 9
+    """
+    return getattr(error, "code", None) in RATE_LIMIT_CODES
+
+
+def method_name(method, args: tuple) -> str:
+    """
+    Имя метода API для метрик.
+
+    Args:
+        method:       Метод vk_api (api.users.search) или функция запроса
+        args (tuple): Позиционные аргументы вызова (имя метода для AsyncVkApi)
+
+    Returns:
+        str: Имя метода
+    """
+    name = getattr(method, "_method", None)
+    if name is None and args and isinstance(args[0], str):
+        name = args[0]
+    return name or getattr(method, "__name__", "unknown")
+
+
+def record_call(name: str, started: float, error: Exception | None = None) -> None:
+    """
+    Учёт вызова API в метриках.
+
+    Args:
+        name (str):        Имя метода
+        started (float):   Время начала вызова (perf_counter)
+        error (Exception): Ошибка вызова или None
+    """
+    API_LATENCY.observe(time.perf_counter() - started, method=name)
+    code = "ok" if error is None else getattr(error, "code", type(error).__name__)
+    API_CALLS.inc(method=name, code=code)
+
+
+def should_retry(name: str, error: Exception, breaker) -> bool:
+    """
+    Учёт ошибки в предохранителе метода и решение о повторе.
+
+    Args:
+        name (str):                Имя метода
+        error (Exception):         Ошибка вызова
+        breaker (CircuitBreaker):  Предохранитель метода
+
+    Returns:
+        bool: True для ошибок лимита и временных ошибок сети и сервера
+    """
+    if is_rate_limited(error):
+        logging.warning("Превышен лимит запросов VK: %s", error)
+        return True
+    if not is_transient(error):
+        # Ошибка запроса (нет доступа и т.п.): сервер VK исправен
+        breaker.record_success()
+        return False
+    if breaker.record_failure():
+        logging.error("Метод %s отключён после серии ошибок: %s", name, error)
+    else:
+        logging.warning("Временная ошибка VK в %s: %s", name, error)
+    return True
+
+
+def call_limited(
+    bucket: TokenBucket,
+    method,
+    *args,
+    retries: int = API_RETRIES,
+    backoff: float = API_BACKOFF,
+    **kwargs,
+):
+    """
+    Вызов метода API с учётом лимита, предохранителя метода и повтором
+    при ошибке "слишком много запросов" и временных ошибках сети и сервера.
+
+    Args:
+        bucket (TokenBucket): Корзина токена
+        method:               Метод API
+        retries (int):        Количество повторов
+        backoff (float):      Начальная пауза перед повтором, секунды
+
+    Returns:
+        Результат вызова метода
+
+    Raises:
+        CircuitOpenError: Предохранитель метода разомкнут
+        TransportError:   Сетевая ошибка после всех повторов
+    """
+    name = method_name(method, args)
+    breaker = get_breaker(name)
+    for attempt in range(retries + 1):
+        if not breaker.allow():
+            raise CircuitOpenError(name)
+        bucket.acquire()
+        started = time.perf_counter()
+        try:
+            result = method(*args, **kwargs)
+        except Exception as error:  # pylint: disable = broad-exception-caught
+            record_call(name, started, error)
+            if not should_retry(name, error, breaker) or attempt == retries:
+                if isinstance(error, NETWORK_ERRORS):
+                    raise TransportError(name, error) from error
+                raise
+            time.sleep(backoff_delay(attempt, backoff))
+        else:
+            breaker.record_success()
+            record_call(name, started)
+            return result
+    return None
+
+
+async def call_limited_async(
+    bucket: TokenBucket,
+    method,
+    *args,
+    retries: int = API_RETRIES,
+    backoff: float = API_BACKOFF,
+    **kwargs,
+):
+    """
+    Асинхронный вариант call_limited.
+
+    Args:
+        bucket (TokenBucket): Корзина токена
+        method:               Корутинная функция вызова API
+        retries (int):        Количество повторов
+        backoff (float):      Начальная пауза перед повтором, секунды
+
+    Returns:
+        Результат вызова метода
+    """
+    # asyncio нужен только асинхронной среде: не замедляем запуск остальных
+    # pylint: disable = import-outside-toplevel
+    import asyncio
+
+    name = method_name(method, args)
+    breaker = get_breaker(name)
+    for attempt in range(retries + 1):
+        if not breaker.allow():
+            raise CircuitOpenError(name)
+        await bucket.acquire_async()
+        started = time.perf_counter()
+        try:
+            result = await method(*args, **kwargs)
+        except Exception as error:  # pylint: disable = broad-exception-caught
+            record_call(name, started, error)
+            if not should_retry(name, error, breaker) or attempt == retries:
+                if isinstance(error, NETWORK_ERRORS):
+                    raise TransportError(name, error) from error
+                raise
+            await asyncio.sleep(backoff_delay(attempt, backoff))
+        else:
+            breaker.record_success()
+            record_call(name, started)
+            return result
+    return None
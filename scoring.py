@@ -0,0 +1,171 @@
+"""
+Ранжирование найденных анкет по признакам профиля
+"""
+
+import functools
+import heapq
+import logging
+import math
+import time
+
+# Поля users.search, нужные для ранжирования (запрашиваются в том же вызове)
+SEARCH_FIELDS = "has_photo,bdate,interests,common_count,last_seen,online"
+
+# Веса признаков: общие друзья, недавняя активность, наличие фото,
+# заполненные интересы, полная дата рождения, сейчас в сети
+DEFAULT_WEIGHTS = {
+    "common_friends": 1.0,
+    "activity": 2.0,
+    "has_photo": 1.5,
+    "interests": 0.5,
+    "full_bdate": 0.25,
+    "online": 0.5,
+}
+
+# Время, за которое вклад активности уменьшается в e раз, секунды
+ACTIVITY_DECAY = 3 * 24 * 3600
+
+
+@functools.cache
+def numpy_module():
+    """
+    NumPy, загруженный при первом ранжировании (импорт заметно замедляет
+    запуск бота, поэтому не выполняется при импорте модуля).
+
+    Returns:
+        module: numpy или None, если он не установлен
+    """
+    try:
+        # pylint: disable = import-outside-toplevel
+        import numpy
+    except ImportError:  # pragma: no cover
+        logging.warning("NumPy не установлен, анкеты ранжируются без векторизации")
+        return None
+    return numpy
+
+
+def raw_features(user: dict) -> tuple:
+    """
+    Исходные значения признаков анкеты.
+
+    Args:
+        user (dict): Анкета из users.search
+
+    Returns:
+        tuple: (общие друзья, время последнего визита, фото, интересы,
+                дата рождения с годом, в сети)
+    """
+    last_seen = user.get("last_seen") or {}
+    return (
+        user.get("common_count") or 0,
+        last_seen.get("time") or 0,
+        1 if user.get("has_photo", 1 if user.get("photo_id") else 0) else 0,
+        1 if user.get("interests") else 0,
+        1 if str(user.get("bdate", "")).count(".") == 2 else 0,
+        1 if user.get("online") else 0,
+    )
+
+
+class CandidateScorer:
+    """
+    Оценка пачки анкет линейной комбинацией признаков.
+
+    С NumPy признаки всей пачки считаются векторно, а лучшие k анкет
+    выбираются частичной сортировкой (argpartition); без NumPy - тот же
+    расчёт на чистом Python и heapq.nlargest.
+    """
+
+    def __init__(self, weights: dict | None = None, now=time.time):
+        """
+        Args:
+            weights (dict): Веса признаков (по умолчанию DEFAULT_WEIGHTS)
+            now:            Функция текущего времени (unix time)
+        """
+        weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.weights = [weights[name] for name in DEFAULT_WEIGHTS]
+        self.now = now
+
+    def score(self, users: list) -> list:
+        """
+        Оценки анкет.
+
+        Args:
+            users (list): Анкеты из users.search
+
+        Returns:
+            list: Оценка каждой анкеты (в порядке users)
+        """
+        np = numpy_module()
+        if np is not None:
+            return self._score_vector(users, np).tolist()
+        return self._score_python(users)
+
+    def _score_vector(self, users: list, np):
+        """
+        Векторный расчёт оценок.
+
+        Args:
+            users (list): Анкеты
+            np:           Модуль numpy
+
+        Returns:
+            numpy.ndarray: Оценки
+        """
+        matrix = np.array([raw_features(user) for user in users], dtype=np.float64)
+        matrix = matrix.reshape(len(users), len(self.weights))
+        matrix[:, 0] = np.log1p(matrix[:, 0])
+        seen = matrix[:, 1]
+        age = np.maximum(self.now() - seen, 0.0) / ACTIVITY_DECAY
+        matrix[:, 1] = np.where(seen > 0, np.exp(-age), 0.0)
+        return matrix @ np.array(self.weights, dtype=np.float64)
+
+    def _score_python(self, users: list) -> list:
+        """
+        Расчёт оценок без NumPy.
+
+        Returns:
+            list: Оценки
+        """
+        now = self.now()
+        scores = []
+        for user in users:
+            common, seen, *flags = raw_features(user)
+            activity = (
+                math.exp(-max(now - seen, 0.0) / ACTIVITY_DECAY) if seen > 0 else 0.0
+            )
+            features = (math.log1p(common), activity, *flags)
+            scores.append(sum(w * x for w, x in zip(self.weights, features)))
+        return scores
+
+    def top_k(self, users: list, count: int) -> list:
+        """
+        Индексы лучших анкет по убыванию оценки.
+
+        При равных оценках сохраняется порядок выдачи users.search.
+
+        Args:
+            users (list): Анкеты
+            count (int):  Сколько анкет выбрать
+
+        Returns:
+            list: Индексы в users
+        """
+        count = min(count, len(users))
+        if count <= 0:
+            return []
+
+        np = numpy_module()
+        if np is not None:
+            scores = self._score_vector(users, np)
+            if count < len(users):
+                best = np.argpartition(-scores, count - 1)[:count]
+            else:
+                best = np.arange(len(users))
+            # Упорядочиваем только выбранные k по оценке, затем по позиции
+            order = np.lexsort((best, -scores[best]))
+            return best[order].tolist()
+
+        scores = self._score_python(users)
+        return heapq.nlargest(
+            count, range(len(users)), key=lambda index: (scores[index], -index)
+        )
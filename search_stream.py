@@ -0,0 +1,326 @@
+"""
+Позиция в поиске users.search с обходом ограничения в 1000 результатов и поток
+подходящих анкет поиска
+"""
+
+import calendar
+
+from collections import deque
+
+# users.search возвращает не больше 1000 анкет на запрос с любым offset
+SEARCH_LIMIT = 1000
+MONTHS = 12
+# Номера сегментов: 0 - весь запрос, 1-12 - месяц рождения,
+# DAYS_START и дальше - день рождения внутри месяца (по 31 на месяц)
+DAYS_START = MONTHS + 1
+
+
+def days_in_month(month: int) -> int:
+    """
+    Количество дней в месяце (високосный год, чтобы не пропустить 29 февраля).
+    """
+    return calendar.monthrange(2000, month)[1]
+
+
+def day_segment(month: int, day: int) -> int:
+    """
+    Номер сегмента дня рождения.
+    """
+    return DAYS_START + (month - 1) * 31 + (day - 1)
+
+
+def segment_filter(segment: int) -> dict:
+    """
+    Дополнительные параметры users.search для сегмента.
+
+    Args:
+        segment (int): Номер сегмента
+
+    Returns:
+        dict: {}, {"birth_month": m} или {"birth_month": m, "birth_day": d}
+    """
+    if segment == 0:
+        return {}
+    if segment < DAYS_START:
+        return {"birth_month": segment}
+    month, day = divmod(segment - DAYS_START, 31)
+    return {"birth_month": month + 1, "birth_day": day + 1}
+
+
+def first_child(segment: int) -> int | None:
+    """
+    Первый сегмент более узкого разбиения (None, если разбивать некуда).
+    """
+    if segment == 0:
+        return 1
+    if segment < DAYS_START:
+        return day_segment(segment, 1)
+    return None
+
+
+def next_segment(segment: int) -> int | None:
+    """
+    Следующий сегмент после полностью просмотренного (None - поиск окончен).
+    """
+    if segment == 0:
+        return None
+    if segment < DAYS_START:
+        return segment + 1 if segment < MONTHS else None
+    month, day = divmod(segment - DAYS_START, 31)
+    month += 1
+    if day + 1 < days_in_month(month):
+        return segment + 1
+    return month + 1 if month < MONTHS else None
+
+
+class SearchCursor:
+    """
+    Позиция в поиске.
+
+    Если выборка больше SEARCH_LIMIT, запрос делится на месяцы рождения,
+    а слишком большие месяцы - на дни. Позиция кодируется одним числом
+    segment * SEARCH_LIMIT + offset, которое сохраняется в состоянии диалога.
+    """
+
+    __slots__ = ("segment", "offset", "exhausted")
+
+    def __init__(self, position: int = 0):
+        """
+        Args:
+            position (int): Сохранённая позиция (см. position)
+        """
+        self.segment, self.offset = divmod(int(position), SEARCH_LIMIT)
+        self.exhausted = False
+
+    @property
+    def position(self) -> int:
+        """
+        Позиция одним числом.
+        """
+        return self.segment * SEARCH_LIMIT + self.offset
+
+    def request(self, params: dict, count: int) -> dict:
+        """
+        Параметры следующего запроса.
+
+        Args:
+            params (dict): Параметры поиска (age, gender, city, status)
+            count (int):   Желаемое количество анкет
+
+        Returns:
+            dict: Аргументы VKinder.search_page
+        """
+        return dict(
+            params,
+            **segment_filter(self.segment),
+            count=min(count, SEARCH_LIMIT - self.offset),
+            offset=self.offset,
+        )
+
+    def advance(self, response: dict) -> None:
+        """
+        Переход к следующей позиции по ответу users.search.
+
+        Args:
+            response (dict): {"items": анкеты, "count": размер выборки}; ответ
+                             локального индекса помечен "indexed"
+        """
+        items = response["items"]
+        total = response.get("count", 0)
+        self.offset += len(items)
+        child = first_child(self.segment) if total > SEARCH_LIMIT else None
+        if child is not None and not response.get("indexed"):
+            # Больше SEARCH_LIMIT не получить: сразу делим запрос
+            self.move(child)
+        elif not items or self.offset >= min(total, SEARCH_LIMIT):
+            self.move(child if child is not None else next_segment(self.segment))
+
+    def move(self, segment: int | None) -> None:
+        """
+        Переход в начало сегмента.
+
+        Args:
+            segment (int): Номер сегмента или None (поиск окончен)
+        """
+        if segment is None:
+            self.exhausted = True
+        else:
+            self.segment, self.offset = segment, 0
+
+
+def eligible(users: list, seen) -> list:
+    """
+    Открытые анкеты, которых нет в seen.
+
+    Args:
+        users (list): Анкеты из users.search
+        seen:         Уже показанные анкеты (SeenIndex, SharedSeen или множество)
+
+    Returns:
+        list: Анкеты в исходном порядке
+    """
+    open_ids = [user["id"] for user in users if not user.get("is_closed", True)]
+    if hasattr(seen, "filter_unseen"):
+        # Одна пакетная проверка по индексу показанных анкет
+        unseen = set(seen.filter_unseen(open_ids))
+    else:
+        unseen = {profile_id for profile_id in open_ids if profile_id not in seen}
+    return [user for user in users if user["id"] in unseen]
+
+
+class ProfileStream:
+    """
+    Поток открытых и ещё не показанных анкет одного поиска.
+
+    Страницы users.search запрашиваются по мере чтения, выборки больше
+    SEARCH_LIMIT анкет делятся по дате рождения. Анкеты страницы, после
+    которой выборка разделена, повторятся в более узких сегментах и
+    отбрасываются; повторы внутри сегмента тоже. Память постоянна: буфер
+    одной страницы и ID анкет текущего сегмента.
+
+    Поток останавливается, когда выборка исчерпана или API вернул ошибку
+    (error = True); после сброса error чтение продолжается с той же позиции.
+    """
+
+    # pylint: disable = too-many-arguments, too-many-instance-attributes
+    def __init__(
+        self,
+        search,
+        params: dict,
+        seen=(),
+        position: int = 0,
+        page_size: int = 50,
+        planner=None,
+    ):
+        """
+        Args:
+            search:          Функция поиска (VKinder.search_page)
+            params (dict):   Параметры поиска (age, gender, city, status)
+            seen:            Уже показанные анкеты (SeenIndex или множество)
+            position (int):  Позиция, с которой продолжить (SearchCursor.position)
+            page_size (int): Подходящих анкет, ожидаемых от одного запроса
+                             (без planner - размер запроса)
+            planner:         query_planner.QueryPlanner или None
+        """
+        self.search = search
+        self.params = params
+        self.seen = seen
+        self.page_size = page_size
+        self.planner = planner
+        self.position = position
+
+    @property
+    def position(self) -> int:
+        """
+        Позиция поиска одним числом (сохраняется в состоянии диалога).
+        """
+        return self.cursor.position
+
+    @position.setter
+    def position(self, position: int) -> None:
+        self.cursor = SearchCursor(position)
+        self.buffer = deque()
+        # ID анкет текущего сегмента и страниц, после которых выборка разделена
+        self.recent = set()
+        self.overlap = set()
+        self.error = False
+
+    @property
+    def exhausted(self) -> bool:
+        """
+        Все сегменты поиска просмотрены и прочитаны.
+        """
+        return self.cursor.exhausted and not self.buffer
+
+    def request(self) -> dict:
+        """
+        Параметры следующего запроса users.search.
+
+        Returns:
+            dict: Аргументы VKinder.search_page
+        """
+        count = self.page_size
+        if self.planner is not None:
+            count = self.planner.count(self.params, self.page_size)
+        return self.cursor.request(self.params, count)
+
+    def accept(self, response: dict | None) -> list:
+        """
+        Учёт ответа users.search.
+
+        Args:
+            response (dict): Страница поиска (VKinder.search_page) или None
+                             при ошибке API
+
+        Returns:
+            list: Новые подходящие анкеты
+        """
+        if response is None:
+            self.error = True
+            return []
+
+        segment = self.cursor.segment
+        self.cursor.advance(response)
+        users = eligible(response["items"], self.seen)
+        # Анкеты индекса уже отобраны и не говорят о доле подходящих в API
+        if self.planner is not None and not response.get("indexed"):
+            self.planner.record(self.params, len(response["items"]), len(users))
+
+        fresh = [
+            user
+            for user in users
+            if user["id"] not in self.recent and user["id"] not in self.overlap
+        ]
+        self.recent.update(user["id"] for user in fresh)
+        if self.cursor.segment == first_child(segment):
+            self.overlap |= self.recent
+        if self.cursor.segment != segment:
+            self.recent = set()
+        return fresh
+
+    def fetch(self) -> list:
+        """
+        Один запрос users.search.
+
+        Returns:
+            list: Новые подходящие анкеты (может быть пустым)
+        """
+        return self.accept(self.search(**self.request()))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> dict:
+        while not self.buffer:
+            if self.error or self.cursor.exhausted:
+                raise StopIteration
+            self.buffer.extend(self.fetch())
+        return self.buffer.popleft()
+
+
+class AsyncProfileStream(ProfileStream):
+    """
+    Асинхронный поток анкет (search - корутинная функция, чтение через
+    async for)
+    """
+
+    __iter__ = None
+
+    async def fetch(self) -> list:
+        """
+        Один запрос users.search.
+
+        Returns:
+            list: Новые подходящие анкеты (может быть пустым)
+        """
+        return self.accept(await self.search(**self.request()))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> dict:
+        while not self.buffer:
+            if self.error or self.cursor.exhausted:
+                raise StopAsyncIteration
+            self.buffer.extend(await self.fetch())
+        return self.buffer.popleft()
@@ -0,0 +1,145 @@
+"""
+Компактный индекс показанных пользователю анкет
+"""
+
+import logging
+
+from array import array
+from bisect import bisect_left
+
+
+class SeenIndex:
+    """
+    Множество ID показанных анкет.
+
+    Основная часть хранится в отсортированном массиве int32 (4 байта на анкету),
+    новые ID накапливаются в небольшом множестве и периодически сливаются
+    в массив. Проверка принадлежности - O(1) для новых и O(log n) для старых ID.
+    """
+
+    __slots__ = ("ids", "recent", "merge_threshold")
+
+    def __init__(self, ids=(), merge_threshold: int = 256):
+        """
+        Args:
+            ids:                   Начальные ID анкет
+            merge_threshold (int): Размер буфера новых ID до слияния с массивом
+        """
+        self.ids = array("i", sorted(set(ids)))
+        self.recent = set()
+        self.merge_threshold = merge_threshold
+
+    def __contains__(self, profile_id: int) -> bool:
+        if profile_id in self.recent:
+            return True
+        position = bisect_left(self.ids, profile_id)
+        return position < len(self.ids) and self.ids[position] == profile_id
+
+    def __len__(self) -> int:
+        return len(self.ids) + len(self.recent)
+
+    def __iter__(self):
+        self.merge()
+        return iter(self.ids)
+
+    def add(self, profile_id: int) -> None:
+        """
+        Добавление ID анкеты.
+
+        Args:
+            profile_id (int): ID анкеты
+        """
+        if profile_id in self:
+            return
+        self.recent.add(profile_id)
+        if len(self.recent) >= self.merge_threshold:
+            self.merge()
+
+    def extend(self, profile_ids) -> None:
+        """
+        Добавление нескольких ID анкет.
+
+        Args:
+            profile_ids: ID анкет
+        """
+        for profile_id in profile_ids:
+            self.add(profile_id)
+
+    def merge(self) -> None:
+        """
+        Слияние буфера новых ID с отсортированным массивом.
+        """
+        if not self.recent:
+            return
+        self.ids = array("i", sorted(self.recent.union(self.ids)))
+        self.recent = set()
+
+    def filter_unseen(self, profile_ids) -> list:
+        """
+        Отбор ещё не показанных анкет.
+
+        Args:
+            profile_ids: ID анкет
+
+        Returns:
+            list: ID, которых нет в индексе (в исходном порядке)
+        """
+        return [profile_id for profile_id in profile_ids if profile_id not in self]
+
+    def to_list(self) -> list:
+        """
+        Все ID в виде списка.
+
+        Returns:
+            list: Отсортированные ID анкет
+        """
+        self.merge()
+        return self.ids.tolist()
+
+
+class SharedSeen:
+    """
+    Показанные анкеты пользователя, которому анкеты могли показывать и другие
+    процессы (распределённый режим): локальный индекс дополняется проверкой
+    по первичному ключу таблицы показанных анкет.
+    """
+
+    __slots__ = ("local", "store", "user_id")
+
+    def __init__(self, local: SeenIndex, store, user_id: int):
+        """
+        Args:
+            local (SeenIndex): Анкеты, показанные этим процессом
+            store:             Хранилище с методом filter_seen (database.Saver)
+            user_id (int):     ID пользователя
+        """
+        self.local = local
+        self.store = store
+        self.user_id = user_id
+
+    def __contains__(self, profile_id: int) -> bool:
+        return profile_id in self.local
+
+    def __len__(self) -> int:
+        return len(self.local)
+
+    def filter_unseen(self, profile_ids) -> list:
+        """
+        Отбор анкет, не показанных ни этим, ни другими процессами
+        (один запрос к БД на пачку).
+
+        Args:
+            profile_ids: ID анкет
+
+        Returns:
+            list: ID непоказанных анкет (в исходном порядке)
+        """
+        unseen = self.local.filter_unseen(profile_ids)
+        if not unseen:
+            return unseen
+        try:
+            return self.store.filter_seen(self.user_id, unseen)
+        # pylint: disable = broad-exception-caught
+        except Exception as error:
+            logging.error("Ошибка проверки показанных анкет в БД: %s", error)
+            return unseen
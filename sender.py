@@ -0,0 +1,77 @@
+"""
+Очередь исходящих сообщений бота
+"""
+
+from dispatcher import EventDispatcher
+
+
+class MessageSender:
+    """
+    Асинхронная отправка сообщений через пул потоков.
+
+    Сообщения одного пользователя отправляются строго по порядку,
+    общий темп ограничивается корзиной токенов внутри deliver.
+    Пачка сообщений (send_many) отправляется одним вызовом deliver_many.
+    """
+
+    def __init__(
+        self, deliver, workers: int = 4, queue_size: int = 1000, deliver_many=None
+    ):
+        """
+        Args:
+            deliver:          Функция отправки deliver(user_id, message, attachments,
+                              [template])
+            workers (int):    Количество потоков отправки
+            queue_size (int): Максимальная длина очереди потока
+            deliver_many:     Функция отправки пачки deliver_many(user_id, batch)
+                              или None (сообщения пачки отправляются по одному)
+        """
+        self.deliver = deliver
+        self.deliver_many = deliver_many
+        # Ожидаем место в очереди без ограничения: сообщения не теряются
+        self.dispatcher = EventDispatcher(
+            self._deliver, workers=workers, queue_size=queue_size, put_timeout=None
+        )
+        self.dispatcher.start()
+
+    def send(self, user_id: int, message: str, attachments: str | None = None) -> None:
+        """
+        Постановка сообщения в очередь.
+
+        Args:
+            user_id (int): Идентификатор пользователя
+            message (str): Сообщение
+            attachments (str, optional): Прикрепленные объекты VK
+        """
+        self.dispatcher.dispatch(user_id, (user_id, [(message, attachments)]))
+
+    def send_many(self, user_id: int, batch: list) -> None:
+        """
+        Постановка нескольких сообщений одного пользователя одной задачей.
+
+        Args:
+            user_id (int): Идентификатор пользователя
+            batch (list):  Параметры сообщений: (сообщение, вложения[, шаблон])
+        """
+        if batch:
+            self.dispatcher.dispatch(user_id, (user_id, batch))
+
+    def close(self) -> None:
+        """
+        Отправка оставшихся сообщений и остановка потоков.
+        """
+        self.dispatcher.stop()
+
+    def _deliver(self, item: tuple) -> None:
+        """
+        Отправка задачи из очереди.
+
+        Args:
+            item (tuple): (user_id, параметры сообщений)
+        """
+        user_id, batch = item
+        if len(batch) > 1 and self.deliver_many is not None:
+            self.deliver_many(user_id, batch)
+            return
+        for params in batch:
+            self.deliver(user_id, *params)
@@ -0,0 +1,103 @@
+"""
+Миграция схемы БД на поддельном пуле соединений (без PostgreSQL)
+"""
+
+import re
+import threading
+
+import pytest
+
+import database
+
+
+class FakeCursor:
+    """
+    Курсор, понимающий запросы миграции к таблице версий
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.result = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return False
+
+    def execute(self, query, params=None):
+        self.db.queries.append(query)
+        if "COALESCE(max(version)" in query:
+            self.result = (max(self.db.versions, default=0),)
+        elif "information_schema.tables" in query:
+            self.result = (False,)
+        elif re.search(r"INSERT INTO \w+ \(version\)", query):
+            self.db.versions.add(params[0])
+
+    def fetchone(self):
+        return self.result
+
+
+class FakeConnection:
+    closed = 0
+
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self):
+        return FakeCursor(self.db)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class FakeDatabase:
+    """
+    Пул соединений ThreadedConnectionPool с общим состоянием схемы
+    """
+
+    def __init__(self, versions=()):
+        self.versions = set(versions)
+        self.queries = []
+        self.in_use = 0
+        self.peak = 0
+
+    def __call__(self, minconn, maxconn, **_):
+        self.maxconn = maxconn
+        return self
+
+    def getconn(self):
+        if self.in_use >= self.maxconn:
+            raise AssertionError("пул исчерпан")
+        self.in_use += 1
+        self.peak = max(self.peak, self.in_use)
+        return FakeConnection(self)
+
+    def putconn(self, connection, close=False):
+        self.in_use -= 1
+
+    def closeall(self):
+        pass
+
+
+@pytest.mark.parametrize("versions", [(), (1, 2, 3, 4, 5, 6)])
+def test_migrate_single_connection_pool(monkeypatch, versions):
+    fake = FakeDatabase(versions)
+    monkeypatch.setattr(database, "ThreadedConnectionPool", fake)
+
+    result = {}
+    thread = threading.Thread(
+        target=lambda: result.setdefault("version", database.migrate("dsn")),
+        daemon=True,
+    )
+    thread.start()
+    thread.join(5)
+
+    assert not thread.is_alive(), "миграция зависла"
+    assert result["version"] == database.Saver.migrations[-1][0]
+    assert fake.versions == {number for number, _ in database.Saver.migrations}
+    assert fake.peak == 1 and fake.in_use == 0
+    assert any("pg_advisory_unlock" in query for query in fake.queries)
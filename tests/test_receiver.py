@@ -0,0 +1,54 @@
+"""
+Приёмник long poll при недоступной БД
+"""
+
+import psycopg2
+
+import cluster
+import group_longpoll
+
+
+class FlakySaver:
+    """
+    Saver, первые failures вызовов которого завершаются ошибкой соединения
+    """
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.published = []
+
+    def fail(self) -> None:
+        if self.failures:
+            self.failures -= 1
+            raise psycopg2.OperationalError("server closed the connection")
+
+    def load_longpoll_ts(self, name: str):
+        self.fail()
+        return None
+
+    def publish_events(self, events: list, shards: int, position: tuple) -> None:
+        self.fail()
+        self.published.append((events, shards, position))
+
+
+def test_publish_retries_until_saved(monkeypatch):
+    monkeypatch.setattr(cluster.time, "sleep", lambda delay: None)
+    saver = FlakySaver(failures=3)
+    cluster.publish(saver, [(1, "привет")], 4, ("group1", 10))
+    assert saver.published == [([(1, "привет")], 4, ("group1", 10))]
+
+
+def test_connect_retries_when_position_unavailable(monkeypatch):
+    class FakeLongPoll:
+        def __init__(self, vk, group_id, wait, ts):
+            self.ts = 5
+
+        def check(self):
+            return []
+
+    monkeypatch.setattr(group_longpoll, "GroupLongPoll", FakeLongPoll)
+    monkeypatch.setattr("transport.time.sleep", lambda delay: None)
+    saver = FlakySaver(failures=2)
+    batches = group_longpoll.receive_batches(None, saver, group_id=1)
+    assert next(batches) == ("group1", [], 5)
+    assert saver.failures == 0
@@ -0,0 +1,76 @@
+"""
+Поток анкет поиска: деление выборки больше 1000 анкет и отсев повторов
+"""
+
+import asyncio
+
+from search_stream import AsyncProfileStream, ProfileStream
+
+# 3000 открытых анкет, рождённых равномерно по месяцам и дням
+PEOPLE = [
+    {"id": index, "is_closed": False, "month": index % 12 + 1, "day": index % 28 + 1}
+    for index in range(1, 3001)
+]
+PARAMS = {"age": 25, "gender": 1, "city": 1, "status": 6}
+
+
+def fake_search(calls):
+    """
+    users.search с ограничением в 1000 результатов на запрос
+    """
+
+    def search(count, offset, birth_month=None, birth_day=None, **_):
+        calls.append((birth_month, birth_day, offset, count))
+        found = [
+            person
+            for person in PEOPLE
+            if birth_month in (None, person["month"])
+            and birth_day in (None, person["day"])
+        ]
+        return {"items": found[:1000][offset : offset + count], "count": len(found)}
+
+    return search
+
+
+def test_stream_splits_large_search_without_duplicates():
+    calls = []
+    profiles = list(ProfileStream(fake_search(calls), PARAMS, page_size=100))
+
+    ids = [profile["id"] for profile in profiles]
+    assert len(ids) == len(set(ids)) == len(PEOPLE)
+    # Запросы по месяцам после первой страницы всей выборки
+    assert calls[0][0] is None and calls[1][0] == 1
+
+
+def test_stream_skips_seen_and_stops_on_error():
+    calls = []
+    search = fake_search(calls)
+    failing = iter([True, False])
+
+    def flaky(**params):
+        return search(**params) if next(failing, True) else None
+
+    stream = ProfileStream(flaky, PARAMS, seen={1, 2}, page_size=50)
+    first = [profile["id"] for profile in stream]  # первая страница, затем ошибка
+    assert first == list(range(3, 51))
+    assert stream.error and not stream.cursor.exhausted
+
+    position = stream.position
+    stream.error = False
+    assert next(stream)["id"] not in first
+    assert stream.position > position
+
+
+def test_async_stream_reads_same_profiles():
+    calls = []
+    search = fake_search(calls)
+
+    async def async_search(**params):
+        return search(**params)
+
+    async def read():
+        stream = AsyncProfileStream(async_search, PARAMS, page_size=200)
+        return [profile["id"] async for profile in stream]
+
+    ids = asyncio.run(read())
+    assert sorted(ids) == [person["id"] for person in PEOPLE]
@@ -0,0 +1,44 @@
+"""
+Распределённый режим: диалог в памяти сверяется с общей БД
+"""
+
+from benchmarks.fake_vk import FakeSaver, FakeVkSession
+from vkinder import VkBot, VKinder
+
+
+def make_bot(saver: FakeSaver) -> VkBot:
+    return VkBot(
+        "test-group-token",
+        None,
+        session=FakeVkSession(0, 0, seed=1),
+        vkinder=VKinder("test-user-token", session=FakeVkSession(0, 0, seed=2)),
+        saver=saver,
+        shared_state=True,
+    )
+
+
+def test_newer_shared_state_replaces_local_dialog():
+    saver = FakeSaver()
+    bot = make_bot(saver)
+    local = bot.worker_cache.initialize_user_data(
+        1, [10], {"step": "final", "offset": 5, "age": 25}
+    )
+    saver.save_state(1, local.export_state())
+    assert bot.refresh_shared_state(1, local) is local
+
+    # Пока шард был у другого процесса, поиск продвинулся
+    saver.save_state(1, {"step": "final", "offset": 40, "age": 30})
+    data = bot.refresh_shared_state(1, local)
+
+    assert data is not local and data is bot.worker_cache.get_user_data(1)
+    assert (data.offset, data.age, data.pipeline) == (40, 30, None)
+    assert 10 in data.seen
+    bot.close()
+
+
+def test_local_dialog_kept_without_shared_state():
+    saver = FakeSaver()
+    bot = make_bot(saver)
+    local = bot.worker_cache.initialize_user_data(1, [], {"step": "final"})
+    assert bot.refresh_shared_state(1, local) is local
+    bot.close()
@@ -0,0 +1,34 @@
+"""
+Вытеснение диалогов из UserDataCache и повтор неудавшегося сохранения
+"""
+
+from bot_core import UserDataCache
+
+
+def test_failed_save_is_retried_on_next_sweep():
+    cache = UserDataCache(max_users=1, sweep_interval=0)
+    cache.initialize_user_data(1, [])
+    cache.initialize_user_data(2, [])
+
+    evicted = cache.collect_evicted()
+    assert [user_id for user_id, _ in evicted] == [1]
+
+    # Ошибка БД: состояние не теряется и возвращается при следующей проверке
+    cache.save_failed(1)
+    assert [user_id for user_id, _ in cache.collect_evicted()] == [1]
+
+    cache.confirm_saved(1)
+    assert not cache.collect_evicted()
+    assert 1 not in cache.pending
+
+
+def test_failed_save_of_returned_dialog_is_not_retried():
+    cache = UserDataCache(max_users=1, sweep_interval=0)
+    cache.initialize_user_data(1, [])
+    cache.initialize_user_data(2, [])
+    cache.collect_evicted()
+    cache.save_failed(1)
+
+    # Пользователь вернулся раньше повтора: диалог снова в кэше
+    assert cache.get_user_data(1) is not None
+    assert [user_id for user_id, _ in cache.collect_evicted()] == [2]
@@ -0,0 +1,301 @@
+"""
+Пул токенов пользователя VK для поиска и загрузки фото
+"""
+
+import itertools
+import logging
+import threading
+import time
+
+from config import API_BACKOFF
+from ratelimit import RATE_LIMIT_CODES, call_limited, call_limited_async, get_bucket
+from transport import backoff_delay, is_transient
+
+# Капча и исчерпание дневного лимита метода: токен выводится надолго
+CAPTCHA_CODE = 14
+QUOTA_CODE = 29
+
+# Стратегии выбора токена
+ROUND_ROBIN = "round_robin"
+LEAST_LOADED = "least_loaded"
+
+
+class PooledToken:
+    """
+    Токен пула со статистикой использования
+    """
+
+    __slots__ = (
+        "index",
+        "token",
+        "client",
+        "bucket",
+        "in_flight",
+        "calls",
+        "errors",
+        "quarantines",
+        "failures",
+        "quarantined_until",
+        "probation",
+    )
+
+    def __init__(self, index: int, token: str, client, bucket):
+        self.index = index
+        self.token = token
+        self.client = client
+        self.bucket = bucket
+        self.in_flight = 0
+        self.calls = 0
+        self.errors = 0
+        self.quarantines = 0
+        # Ошибки подряд: от них зависит длительность карантина
+        self.failures = 0
+        self.quarantined_until = 0.0
+        # После карантина первый запрос проверяет, что токен снова работает
+        self.probation = False
+
+    def stats(self) -> dict:
+        """
+        Статистика токена (без самого токена).
+
+        Returns:
+            dict: Вызовы, ошибки, карантины и текущая нагрузка
+        """
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "quarantines": self.quarantines,
+            "in_flight": self.in_flight,
+            "quarantined": self.quarantined_until > time.monotonic(),
+        }
+
+
+class TokenPool:
+    """
+    Несколько токенов пользователя с общим интерфейсом вызова методов API.
+
+    Каждый токен имеет свою корзину лимита, поэтому пропускная способность
+    растёт пропорционально числу токенов. Токен, получивший ошибку лимита
+    (6, 9, 29) или капчу (14), выводится из работы на время карантина,
+    которое удваивается при повторных ошибках; по окончании карантина первый
+    запрос через токен служит проверкой его работоспособности.
+    """
+
+    # Повторов сверх числа токенов при ошибках лимита
+    retries = 3
+    # Начальная пауза перед повтором после временной ошибки сети или сервера
+    backoff = API_BACKOFF
+
+    # pylint: disable = too-many-arguments
+    def __init__(
+        self,
+        clients: list,
+        rate: float,
+        strategy: str = ROUND_ROBIN,
+        quarantine: float = 1.0,
+        long_quarantine: float = 600.0,
+        max_quarantine: float = 3600.0,
+        max_wait: float = 5.0,
+    ):
+        """
+        Args:
+            clients (list):          Пары (токен, клиент): vk_api.VkApi или AsyncVkApi
+            rate (float):            Лимит запросов в секунду на токен
+            strategy (str):          round_robin или least_loaded
+            quarantine (float):      Карантин после ошибки лимита, секунды
+            long_quarantine (float): Карантин после капчи или дневного лимита
+            max_quarantine (float):  Максимальный карантин
+            max_wait (float):        Максимальное ожидание, если все токены
+                                     в карантине
+        """
+        if not clients:
+            raise ValueError("Пул токенов пуст")
+        if strategy not in (ROUND_ROBIN, LEAST_LOADED):
+            raise ValueError(f"Неизвестная стратегия выбора токена: {strategy}")
+        self.entries = [
+            PooledToken(index, token, client, get_bucket(token, rate))
+            for index, (token, client) in enumerate(clients)
+        ]
+        self.strategy = strategy
+        self.quarantine = quarantine
+        self.long_quarantine = long_quarantine
+        self.max_quarantine = max_quarantine
+        self.max_wait = max_wait
+        self._cycle = itertools.cycle(self.entries)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def acquire(self) -> tuple:
+        """
+        Выбор токена для запроса.
+
+        Returns:
+            tuple: (PooledToken, сколько секунд подождать перед запросом)
+        """
+        with self._lock:
+            now = time.monotonic()
+            available = [
+                entry
+                for entry in self.entries
+                if entry.quarantined_until <= now
+                and not (entry.probation and entry.in_flight)
+            ]
+            delay = 0.0
+            if not available:
+                # Все токены в карантине: ждём ближайший
+                entry = min(self.entries, key=lambda item: item.quarantined_until)
+                delay = min(max(entry.quarantined_until - now, 0.0), self.max_wait)
+            elif self.strategy == LEAST_LOADED:
+                # Меньше всего запросов в работе и в очереди корзины
+                entry = min(
+                    available,
+                    key=lambda item: (item.in_flight - item.bucket.tokens, item.calls),
+                )
+            else:
+                entry = next(self._cycle)
+                while entry not in available:
+                    entry = next(self._cycle)
+            entry.in_flight += 1
+            entry.calls += 1
+        return entry, delay
+
+    def release(self, entry: PooledToken, error: Exception | None = None) -> bool:
+        """
+        Завершение запроса через токен.
+
+        Args:
+            entry (PooledToken): Токен
+            error (Exception):   Ошибка запроса или None
+
+        Returns:
+            bool: True, если токен отправлен в карантин (запрос можно повторить
+                  через другой токен)
+        """
+        code = getattr(error, "code", None)
+        with self._lock:
+            entry.in_flight -= 1
+            if error is None:
+                entry.failures = 0
+                entry.probation = False
+                return False
+
+            entry.errors += 1
+            if code not in RATE_LIMIT_CODES + (CAPTCHA_CODE, QUOTA_CODE):
+                return False
+
+            base = self.quarantine if code in RATE_LIMIT_CODES else self.long_quarantine
+            duration = min(base * 2**entry.failures, self.max_quarantine)
+            entry.failures += 1
+            entry.quarantines += 1
+            entry.probation = True
+            entry.quarantined_until = time.monotonic() + duration
+
+        logging.warning(
+            "Токен пользователя №%s в карантине на %.0f с: %s",
+            entry.index,
+            duration,
+            error,
+        )
+        return True
+
+    def retry_delay(
+        self, entry: PooledToken, error: Exception, attempt: int, attempts: int
+    ) -> float:
+        """
+        Завершение неудачного запроса и пауза перед повтором.
+
+        Args:
+            entry (PooledToken): Токен
+            error (Exception):   Ошибка запроса
+            attempt (int):       Номер попытки
+            attempts (int):      Всего попыток
+
+        Returns:
+            float: Пауза перед повтором через другой токен, секунды
+
+        Raises:
+            Exception: Исходная ошибка, если повторять запрос не нужно
+        """
+        if self.release(entry, error) and attempt < attempts - 1:
+            return 0.0
+        if is_transient(error) and attempt < min(self.retries, attempts - 1):
+            return backoff_delay(attempt, self.backoff)
+        raise error
+
+    def call(self, method: str, **params):
+        """
+        Вызов метода API через токен пула (клиенты vk_api.VkApi).
+
+        При ошибке лимита или капче запрос повторяется через другой токен,
+        при временной ошибке сети или сервера - через другой токен после паузы.
+
+        Args:
+            method (str): Имя метода, например "users.search"
+            **params:     Параметры метода
+
+        Returns:
+            Ответ метода
+        """
+        # Необязательные параметры со значением None не передаются
+        params = {key: value for key, value in params.items() if value is not None}
+        attempts = len(self.entries) + self.retries
+        for attempt in range(attempts):
+            entry, delay = self.acquire()
+            if delay:
+                time.sleep(delay)
+            try:
+                result = call_limited(
+                    entry.bucket, entry.client.method, method, params, retries=0
+                )
+            except Exception as error:  # pylint: disable = broad-exception-caught
+                delay = self.retry_delay(entry, error, attempt, attempts)
+                if delay:
+                    time.sleep(delay)
+                continue
+            self.release(entry)
+            return result
+        return None
+
+    async def call_async(self, method: str, **params):
+        """
+        Асинхронный вариант call (клиенты async_bot.AsyncVkApi).
+
+        Args:
+            method (str): Имя метода, например "users.search"
+            **params:     Параметры метода
+
+        Returns:
+            Ответ метода
+        """
+        # pylint: disable = import-outside-toplevel
+        import asyncio
+
+        attempts = len(self.entries) + self.retries
+        for attempt in range(attempts):
+            entry, delay = self.acquire()
+            if delay:
+                await asyncio.sleep(delay)
+            try:
+                result = await call_limited_async(
+                    entry.bucket, entry.client.request, method, retries=0, **params
+                )
+            except Exception as error:  # pylint: disable = broad-exception-caught
+                delay = self.retry_delay(entry, error, attempt, attempts)
+                if delay:
+                    await asyncio.sleep(delay)
+                continue
+            self.release(entry)
+            return result
+        return None
+
+    def stats(self) -> dict:
+        """
+        Статистика использования токенов.
+
+        Returns:
+            dict: Номер токена -> статистика
+        """
+        with self._lock:
+            return {entry.index: entry.stats() for entry in self.entries}
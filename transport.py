@@ -0,0 +1,235 @@
+"""
+Устойчивость обращений к VK API: таймауты, повторы с джиттером и предохранитель
+"""
+
+import logging
+import random
+import threading
+import time
+
+import requests
+
+from vk_api.exceptions import ApiHttpError, VkApiError
+
+from config import (
+    CONNECT_TIMEOUT,
+    READ_TIMEOUT,
+    BACKOFF_CAP,
+    BREAKER_THRESHOLD,
+    BREAKER_RESET,
+)
+
+# Временные ошибки VK: неизвестная ошибка / внутренняя ошибка сервера
+SERVER_ERROR_CODES = (1, 10)
+# Сетевые ошибки: обрыв соединения, таймаут, HTTP-статус не 200
+# (ошибки aiohttp async_bot сам заворачивает в TransportError)
+NETWORK_ERRORS = (requests.RequestException, ApiHttpError, TimeoutError)
+
+
+class TransportError(Exception):
+    """
+    Запрос к VK API не выполнен из-за сети или недоступности сервера
+    """
+
+    def __init__(self, method: str, error: Exception | None = None):
+        self.method = method
+        self.error = error
+        super().__init__(f"{method}: {error}")
+
+
+class CircuitOpenError(TransportError):
+    """
+    Предохранитель метода разомкнут: запрос не отправлялся
+    """
+
+    def __init__(self, method: str):
+        super().__init__(method, "слишком много ошибок подряд, запрос пропущен")
+
+
+def is_transient(error: Exception) -> bool:
+    """
+    Проверка, что ошибка временная и запрос можно повторить.
+
+    Args:
+        error (Exception): Ошибка вызова
+
+    Returns:
+        bool: True для сетевых ошибок и ошибок сервера VK (коды 1 и 10)
+    """
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, (TransportError,) + NETWORK_ERRORS):
+        return True
+    return getattr(error, "code", None) in SERVER_ERROR_CODES
+
+
+def backoff_delay(attempt: int, base: float, cap: float = BACKOFF_CAP) -> float:
+    """
+    Пауза перед повтором: экспоненциальный рост со случайной половиной,
+    чтобы повторы разных потоков и процессов не совпадали.
+
+    Args:
+        attempt (int): Номер повтора, начиная с 0
+        base (float):  Начальная пауза, секунды
+        cap (float):   Максимальная пауза, секунды
+
+    Returns:
+        float: Пауза, секунды
+    """
+    delay = min(cap, base * 2**attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class CircuitBreaker:
+    """
+    Предохранитель метода API.
+
+    После threshold временных ошибок подряд размыкается, и запросы сразу
+    завершаются CircuitOpenError, не занимая лимит и потоки. Через reset_timeout
+    секунд пропускает один пробный запрос: успех замыкает предохранитель,
+    ошибка снова размыкает его.
+    """
+
+    def __init__(
+        self, threshold: int = BREAKER_THRESHOLD, reset_timeout: float = BREAKER_RESET
+    ):
+        """
+        Args:
+            threshold (int):       Временных ошибок подряд до размыкания
+            reset_timeout (float): Пауза до пробного запроса, секунды
+        """
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        """
+        Разомкнут ли предохранитель.
+        """
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        """
+        Можно ли отправить запрос.
+
+        Returns:
+            bool: False, если предохранитель разомкнут
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self.opened_at < self.reset_timeout:
+                return False
+            # Пробный запрос: остальные ждут его результата ещё reset_timeout
+            self.opened_at = now
+            return True
+
+    def record_success(self) -> None:
+        """
+        Учёт успешного запроса.
+        """
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self) -> bool:
+        """
+        Учёт временной ошибки.
+
+        Returns:
+            bool: True, если предохранитель разомкнулся
+        """
+        with self._lock:
+            self.failures += 1
+            if self.failures < self.threshold:
+                return False
+            self.opened_at = time.monotonic()
+            return True
+
+
+# Предохранители по имени метода, общие для всех токенов
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(method: str) -> CircuitBreaker:
+    """
+    Предохранитель метода API.
+
+    Args:
+        method (str): Имя метода, например "users.search"
+
+    Returns:
+        CircuitBreaker: Общий предохранитель этого метода
+    """
+    with _breakers_lock:
+        if method not in _breakers:
+            _breakers[method] = CircuitBreaker()
+        return _breakers[method]
+
+
+def breaker_states() -> dict:
+    """
+    Состояние предохранителей для метрик.
+
+    Returns:
+        dict: Имя метода -> 1 (разомкнут) / 0
+    """
+    with _breakers_lock:
+        return {method: int(breaker.is_open) for method, breaker in _breakers.items()}
+
+
+class TimeoutSession(requests.Session):
+    """
+    HTTP-сессия с таймаутами по умолчанию для каждого запроса.
+
+    Без таймаута зависшее соединение блокирует поток обработчика навсегда.
+    """
+
+    def __init__(self, timeout: tuple = (CONNECT_TIMEOUT, READ_TIMEOUT)):
+        """
+        Args:
+            timeout (tuple): (таймаут соединения, таймаут чтения), секунды
+        """
+        super().__init__()
+        self.timeout = timeout
+
+    # pylint: disable = arguments-differ
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+def reconnecting(connect, listen, backoff: float = 1.0, errors: tuple = ()):
+    """
+    Бесконечный поток событий long poll с переподключением при сбоях.
+
+    Args:
+        connect:         Функция создания клиента long poll (VkLongPoll)
+        listen:          Функция listen(client), возвращающая поток событий
+        backoff (float): Начальная пауза перед переподключением, секунды
+        errors (tuple):  Другие ошибки, после которых нужно переподключиться
+                         (например, ошибки соединения с БД в connect)
+
+    Yields:
+        События из listen
+    """
+    attempt = 0
+    while True:
+        try:
+            for item in listen(connect()):
+                attempt = 0
+                yield item
+        except NETWORK_ERRORS + (VkApiError, ValueError) + errors as error:
+            delay = backoff_delay(attempt, backoff)
+            logging.warning(
+                "Соединение long poll потеряно (%s), переподключение через %.1f с",
+                error,
+                delay,
+            )
+            time.sleep(delay)
+            attempt += 1
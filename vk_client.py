@@ -0,0 +1,163 @@
+"""
+Общий клиент VK API: сессии vk_api с пулом keep-alive соединений, общий прокси
+методов и пакетные вызовы через execute
+"""
+
+import functools
+import json
+import logging
+import threading
+
+import vk_api
+
+from vk_api.exceptions import ApiError, LoginRequired
+from requests.adapters import HTTPAdapter
+
+from config import HTTP_POOL_SIZE
+from photos import EXECUTE_LIMIT, chunks
+from transport import TimeoutSession
+
+VK_API_HOST = "https://api.vk.com"
+
+# Сессии по токену: один пул соединений на токен для всего процесса
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def create_session(token: str, pool_size: int = HTTP_POOL_SIZE) -> vk_api.VkApi:
+    """
+    Сессия vk_api с таймаутами, сжатием ответов и пулом соединений на
+    pool_size одновременных запросов (по умолчанию requests держит 10).
+
+    Args:
+        token (str):     Токен доступа
+        pool_size (int): Соединений с api.vk.com в пуле
+
+    Returns:
+        vk_api.VkApi: Сессия VK
+    """
+    session = vk_api.VkApi(token=token)
+    http = TimeoutSession()
+    http.headers.update(session.http.headers)
+    http.headers["Accept-Encoding"] = "gzip, deflate"
+    # Повторы выполняет ratelimit.call_limited, а не urllib3
+    http.mount(VK_API_HOST, HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+    session.http = http
+    return session
+
+
+def get_session(token: str) -> vk_api.VkApi | None:
+    """
+    Общая сессия VK для токена.
+
+    Args:
+        token (str): Токен группы или пользователя
+
+    Returns:
+        vk_api.VkApi: Сессия или None при ошибке
+    """
+    with _sessions_lock:
+        session = _sessions.get(token)
+        if session is not None:
+            return session
+        try:
+            session = create_session(token)
+        except (ApiError, LoginRequired) as error:
+            logging.error("Ошибка создания сессии VK: %s", error)
+            return None
+        _sessions[token] = session
+        return session
+
+
+@functools.cache
+def get_api(session):
+    """
+    Прокси методов (session.get_api()), один на сессию.
+
+    Args:
+        session: vk_api.VkApi
+
+    Returns:
+        vk_api.VkApiMethod: Объект вызова методов api.users.search(...)
+    """
+    return session.get_api()
+
+
+def execute_code(calls: list) -> str:
+    """
+    Код execute, выполняющий несколько независимых вызовов.
+
+    Каждый вызов записан отдельной строкой, параметры - в JSON.
+
+    Args:
+        calls (list): Пары (метод, параметры), не больше EXECUTE_LIMIT
+
+    Returns:
+        str: Код VKScript, возвращающий список ответов
+    """
+    lines = [
+        f"API.{method}({json.dumps(params, ensure_ascii=False)}),"
+        for method, params in calls
+    ]
+    return "return [\n" + "\n".join(lines) + "\n];"
+
+
+def execute_calls(calls: list) -> list:
+    """
+    Подготовка пачки вызовов: параметры со значением None не передаются.
+
+    Args:
+        calls (list): Пары (метод, параметры)
+
+    Returns:
+        list: Пары (метод, параметры без None)
+    """
+    return [
+        (method, {key: value for key, value in params.items() if value is not None})
+        for method, params in calls
+    ]
+
+
+def log_failures(results: list) -> None:
+    """
+    Запись в журнал числа неудачных вызовов пачки.
+
+    Args:
+        results (list): Ответы call_many
+    """
+    failed = results.count(False)
+    if failed:
+        logging.warning("Ошибок в пакетном вызове: %s из %s", failed, len(results))
+
+
+def call_many(call, calls: list) -> list:
+    """
+    Выполнение независимых вызовов пачками по EXECUTE_LIMIT через execute:
+    один HTTP-запрос и одна единица лимита вместо вызова на каждый метод.
+
+    Args:
+        call:         Функция вызова метода call(method, **params)
+                      (TokenPool.call, VkBot.call)
+        calls (list): Пары (метод, параметры)
+
+    Returns:
+        list: Ответы в порядке calls (False для вызовов, завершившихся ошибкой)
+    """
+    results = []
+    for chunk in chunks(execute_calls(calls), EXECUTE_LIMIT):
+        response = call("execute", code=execute_code(chunk))
+        results.extend(response or [False] * len(chunk))
+    log_failures(results)
+    return results
+
+
+async def call_many_async(call, calls: list) -> list:
+    """
+    Асинхронный вариант call_many (call - корутинная функция).
+    """
+    results = []
+    for chunk in chunks(execute_calls(calls), EXECUTE_LIMIT):
+        response = await call("execute", code=execute_code(chunk))
+        results.extend(response or [False] * len(chunk))
+    log_failures(results)
+    return results
@@ -5,17 +5,62 @@
 import logging
 import time
 
+from concurrent.futures import ThreadPoolExecutor
+
 import vk_api
 
 from vk_api.exceptions import ApiError
 
 import messages
-
-from config import TOKEN_USER
-from database import Saver
+import photos as top_photos
+
+from bot_core import BotCore, UserDataCache  # pylint: disable = unused-import
+from cache import ResponseCache
+from cards import CardCache
+from config import (
+    USER_TOKENS,
+    USER_TOKEN_STRATEGY,
+    USER_TOKEN_QUARANTINE,
+    DB_POOL_MIN,
+    DB_POOL_MAX,
+    DB_FLUSH_INTERVAL,
+    DB_FLUSH_ROWS,
+    GROUP_RPS,
+    USER_RPS,
+    SEARCH_CACHE_SIZE,
+    SEARCH_CACHE_TTL,
+    PHOTOS_CACHE_SIZE,
+    PHOTOS_CACHE_TTL,
+    CARDS_CACHE_SIZE,
+    CARDS_CACHE_TTL,
+    DELIVERY_MODE,
+    CACHE_PERSISTENT,
+    MAX_SESSIONS,
+    SESSION_IDLE_TIMEOUT,
+    MAX_SEEN_PROFILES,
+    SEARCH_FETCH_COUNT,
+    SEARCH_HAS_PHOTO,
+    SEARCH_SORT,
+    SEARCH_MAX_COUNT,
+    INDEX_ENABLED,
+    INDEX_TTL,
+)
+from dialog import Session, parse_command
+from metrics import MESSAGE_LATENCY, STEP_LATENCY
+from pipeline import CandidatePipeline
+from profile_index import ProfileIndex
+from query_planner import QueryPlanner
+from ratelimit import call_limited, get_bucket
+from scoring import SEARCH_FIELDS, numpy_module
+from search_stream import ProfileStream
+from seen import SharedSeen
+from sender import MessageSender
+from token_pool import TokenPool
+from transport import TransportError
+from vk_client import call_many, get_api, get_session
 
 # Токен пользователя для поиска
-VK_USER_TOKEN = TOKEN_USER
+VK_USER_TOKEN = USER_TOKENS
 
 
 class VKinder:
@@ -23,31 +68,46 @@ class VKinder:
     Класс для поиска пользователей
     """
 
-    def __init__(self, token):
-        self.logger = logging.getLogger(__name__)
-        self.session = self.get_vk_session(token)
-        self.token = token
-
-    @staticmethod
-    def get_vk_session(token: str) -> vk_api.VkApi | None:
+    # pylint: disable = too-many-arguments
+    def __init__(
+        self,
+        token,
+        rate: float = USER_RPS,
+        store=None,
+        session=None,
+        strategy: str = USER_TOKEN_STRATEGY,
+        index: ProfileIndex | None = None,
+    ):
         """
-        Получение сессии VK.
-
         Args:
-            token (str): Токен пользователя
-
-        Returns:
-            Union[vk_api.VkApi, None]: Объект сессии или None при ошибке
+            token (str | list):   Токен пользователя или список токенов
+            rate (float):         Лимит запросов в секунду на токен
+            store:                Постоянное хранилище кэша (Saver) или None
+            session:              Готовая сессия VK (по умолчанию по токену)
+            strategy (str):       Выбор токена: round_robin или least_loaded
+            index (ProfileIndex): Локальный индекс анкет или None
         """
-        try:
-            session = vk_api.VkApi(token=token)
-        except vk_api.exceptions.ApiError as error:
-            logging.error("Ошибка создании сессии ВК пользователя: %s", error)
-            return None
-        except vk_api.exceptions.LoginRequired as error:
-            logging.error("Ошибка создании сессии ВК пользователя: %s", error)
-            return None
-        return session
+        self.logger = logging.getLogger(__name__)
+        tokens = [token] if isinstance(token, str) else list(token)
+        # Запросы распределяются по токенам, у каждого свой лимит
+        self.tokens = TokenPool(
+            [(item, session or get_session(item)) for item in tokens],
+            rate,
+            strategy,
+            quarantine=USER_TOKEN_QUARANTINE,
+        )
+        self.index = index
+        # Общие для всех пользователей кэши ответов API
+        self.search_cache = ResponseCache(
+            "users.search", SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL, store
+        )
+        self.photos_cache = ResponseCache(
+            "photos", PHOTOS_CACHE_SIZE, PHOTOS_CACHE_TTL, store
+        )
+        # Готовые карточки анкет: повторный показ без запросов фото
+        self.cards = CardCache(CARDS_CACHE_SIZE, CARDS_CACHE_TTL)
+        # Фильтры users.search и размер запроса по доле подходящих анкет
+        self.planner = QueryPlanner(SEARCH_HAS_PHOTO, SEARCH_SORT, SEARCH_MAX_COUNT)
 
     # pylint: disable = too-many-arguments
     def search_users(
@@ -73,10 +133,80 @@ class VKinder:
         Returns:
             list: Список пользователей / None
         """
-        api = self.session.get_api()
+        page = self.search_page(age, gender, city, status, count, offset)
+        return None if page is None else page["items"]
+
+    # pylint: disable = too-many-arguments
+    def search_page(
+        self,
+        age: int,
+        gender: int,
+        city: int,
+        status: int,
+        count: int = 15,
+        offset: int = 0,
+        birth_month: int | None = None,
+        birth_day: int | None = None,
+    ) -> dict | None:
+        """
+        Страница поиска вместе с размером выборки.
+
+        Args:
+            age (int):         Возраст
+            gender (int):      Пол
+            city (int):        Город
+            status (int):      Семейное положение
+            count (int):       Количество пользователей
+            offset (int):      Смещение
+            birth_month (int): Месяц рождения (сегмент большой выборки)
+            birth_day (int):   День рождения (сегмент большого месяца)
+
+        Returns:
+            dict: {"items": анкеты, "count": размер выборки} / None
+        """
+        # Одинаковые запросы разных пользователей обслуживаются из кэша
+        key = self.search_cache.key(
+            *(int(value) for value in (age, gender, city, status, count, offset)),
+            birth_month,
+            birth_day,
+        )
+        return self.search_cache.get_or_load(
+            key,
+            lambda: self._search_page(
+                age, gender, city, status, count, offset, birth_month, birth_day
+            ),
+        )
+
+    # pylint: disable = too-many-arguments
+    def _search_page(
+        self,
+        age: int,
+        gender: int,
+        city: int,
+        status: int,
+        count: int,
+        offset: int,
+        birth_month: int | None,
+        birth_day: int | None,
+    ) -> dict | None:
+        """
+        Запрос users.search без кэша: из локального индекса, если выборка
+        собрана заранее, иначе через API.
+
+        Returns:
+            dict: {"items": анкеты, "count": размер выборки} / None
+        """
+        if self.index is not None and birth_month is None:
+            found = self.index.search(age, gender, city, status, count, offset)
+            if found is not None:
+                users, photos, total = found
+                # Карточки из индекса не требуют запросов к API
+                self.cards.store(photos)
+                return {"items": users, "count": total, "indexed": True}
 
         try:
-            users = api.users.search(
+            response = self.tokens.call(
+                "users.search",
                 count=count,
                 age_from=age,
                 age_to=age,
@@ -84,13 +214,51 @@ class VKinder:
                 city=city,
                 offset=offset,
                 status=status,
-                fields="photo_id",
+                birth_month=birth_month,
+                birth_day=birth_day,
+                fields=SEARCH_FIELDS,
+                **self.planner.filters,
             )
-        except vk_api.exceptions.ApiError as error:
+        except (vk_api.exceptions.ApiError, TransportError) as error:
             logging.error("Ошибка при поиске пользователей:  %s", error)
             return None
 
-        return users["items"]
+        return {"items": response["items"], "count": response["count"]}
+
+    # pylint: disable = too-many-arguments
+    def iter_profiles(
+        self,
+        age: int,
+        gender: int,
+        city: int,
+        status: int,
+        seen=(),
+        position: int = 0,
+        page_size: int = 50,
+    ) -> ProfileStream:
+        """
+        Поток открытых и ещё не показанных анкет.
+
+        Страницы запрашиваются по мере чтения (размер запроса подбирает
+        planner), выборки больше 1000 анкет делятся по дате рождения. Поток
+        заканчивается, когда выборка исчерпана или API вернул ошибку.
+
+        Args:
+            age (int):       Возраст
+            gender (int):    Пол
+            city (int):      Город
+            status (int):    Семейное положение
+            seen:            Уже показанные анкеты (SeenIndex или множество)
+            position (int):  Позиция, с которой продолжить (SearchCursor.position)
+            page_size (int): Подходящих анкет, ожидаемых от одного запроса
+
+        Returns:
+            ProfileStream: Итератор анкет (dict) с позицией поиска
+        """
+        params = {"age": age, "gender": gender, "city": city, "status": status}
+        return ProfileStream(
+            self.search_page, params, seen, position, page_size, self.planner
+        )
 
     def get_photo_popularity(self, photo_id: int) -> int:
         """
@@ -102,10 +270,9 @@ class VKinder:
         Returns:
             int: Количество лайков и комментариев
         """
-        api = self.session.get_api()
         try:
-            photo_data = api.photos.getById(photos=photo_id)[0]
-        except vk_api.exceptions.ApiError as error:
+            photo_data = self.tokens.call("photos.getById", photos=photo_id)[0]
+        except (vk_api.exceptions.ApiError, TransportError) as error:
             logging.error("Ошибка при получении информации о фото:  %s", error)
             return 0
 
@@ -122,144 +289,333 @@ class VKinder:
         Returns:
             list: Топ N фото
         """
-        api = self.session.get_api()
+        return self.photos_cache.get_or_load(
+            self.photos_cache.key(int(user_id), top_count),
+            lambda: self._get_top_photos(user_id, top_count),
+        )
+
+    def _get_top_photos(self, user_id: int, top_count: int) -> list | None:
+        """
+        Запрос фото пользователя без кэша.
+
+        Returns:
+            list: Топ N фото
+        """
         try:
             # Получаем фото пользователя
-            photos = api.photos.getAll(owner_id=user_id, extended=1)
-            if photos.get("count", 0) == 0:
-                return None
-            # Возвращаем топ n фото
-            return sorted(
-                photos["items"], key=lambda x: x["likes"]["count"], reverse=True
-            )[:top_count]
-        except vk_api.exceptions.ApiError as error:
+            photos = self.tokens.call("photos.getAll", owner_id=user_id, extended=1)
+        except (vk_api.exceptions.ApiError, TransportError) as error:
             logging.error("Ошибка при получении фото пользователя:  %s", error)
             return None
+        # Возвращаем топ n фото
+        return top_photos.top_photos(photos, top_count)
 
+    def get_top_photos_batch(self, user_ids: list, top_count: int = 3) -> dict:
+        """
+        Получение топ N фото нескольких пользователей через execute.
 
-class UserDataCache:
-    """
-    Класс для кэширования данных пользователей
-    """
+        Один запрос к API на каждые 25 пользователей вместо запроса на каждого.
 
-    def __init__(self):
-        self.cache = {}
+        Args:
+            user_ids (list): Идентификаторы пользователей
+            top_count (int): Количество фото (по умолчанию 3)
 
-    def initialize_user_data(self, user_id: int, connector) -> None:
-        """
-        Инициализация данных пользователя при первом взаимодействии.
+        Returns:
+            dict: ID пользователя -> топ N фото / None
+        """
+        result = {}
+        missing = []
+        for user_id in user_ids:
+            key = self.photos_cache.key(int(user_id), top_count)
+            cached = self.photos_cache.get(key)
+            if cached is None:
+                missing.append(user_id)
+            else:
+                result[user_id] = cached
+
+        for chunk in top_photos.chunks(missing):
+            try:
+                response = self.tokens.call(
+                    "execute", code=top_photos.top_photos_code(chunk)
+                )
+            except (vk_api.exceptions.ApiError, TransportError) as error:
+                logging.error("Ошибка при получении фото пользователей:  %s", error)
+                response = None
+            fetched = top_photos.parse_top_photos(chunk, response, top_count)
+            for user_id, photos in fetched.items():
+                self.photos_cache.set(
+                    self.photos_cache.key(int(user_id), top_count), photos
+                )
+            result.update(fetched)
+        return result
+
+    def get_profile_cards(self, user_ids: list) -> dict:
+        """
+        Карточки анкет: из кэша, для остальных - по топ 3 фото.
 
         Args:
-            user_id (int): Идентификатор пользователя.
-            connector:     Объект для работы с базой данных.
-        """
-        self.cache[user_id] = {
-            "step": None,
-            "in_db": connector.get_user_data_from_db(user_id),
-            "offset": 0,
-        }
+            user_ids (list): Идентификаторы анкет
 
-    def get_user_data(self, user_id: int) -> dict:
+        Returns:
+            dict: ID анкеты -> cards.ProfileCard
         """
-        Получение данных пользователя из кэша.
+        cards, missing = self.cards.lookup(user_ids)
+        if missing:
+            cards.update(self.cards.store(self.get_top_photos_batch(missing)))
+        return cards
 
-        Args:
-            user_id (int): Идентификатор пользователя.
+    def cache_stats(self) -> dict:
+        """
+        Статистика кэшей.
 
         Returns:
-            dict or None: Данные пользователя или None, если пользователь не найден.
+            dict: Имя кэша -> количество записей, попаданий и промахов
         """
-        return self.cache.get(user_id)
+        return {
+            "search": self.search_cache.stats(),
+            "photos": self.photos_cache.stats(),
+            "cards": self.cards.stats(),
+        }
 
-    def save_user_data(self, user_id: int, param: str, data):
+    def token_stats(self) -> dict:
         """
-        Сохранение данных пользователя в кэше.
+        Статистика использования токенов пользователя.
 
-        Args:
-            user_id (int): Идентификатор пользователя.
-            param (str):   Ключ данных.
-            data:          Данные пользователя.
+        Returns:
+            dict: Номер токена -> вызовы, ошибки, карантины
         """
-        self.cache[user_id][param] = data
+        return self.tokens.stats()
 
-    def add_user_to_db(self, user_id: int, profile_id: int) -> None:
+    def warm_up(self) -> None:
         """
-        Добавление ID пользователя в базу данных.
-
-        Args:
-            user_id (int):    Идентификатор пользователя.
-            profile_id (int): ID профиля.
+        Установка соединений с VK API для всех токенов пользователя
+        (один лёгкий запрос на токен) и загрузка кэшей ответов API
+        из постоянного хранилища.
         """
-        if user_id in self.cache:
-            self.cache[user_id]["in_db"].append(profile_id)
+        for cache in (self.search_cache, self.photos_cache):
+            loaded = cache.preload()
+            if loaded:
+                logging.info("Кэш %s: загружено записей из БД: %s", cache.name, loaded)
+        for entry in self.tokens.entries:
+            try:
+                call_limited(
+                    entry.bucket, entry.client.method, "utils.getServerTime", retries=0
+                )
+            except (ApiError, TransportError) as error:
+                logging.warning("Не удалось прогреть токен №%s: %s", entry.index, error)
 
 
-class VkBot:
+class VkBot(BotCore):
     """
     Бот для группы
     """
 
-    def __init__(self, token: str, connection_string: str):
-        # Локальное сохранение данных
-        self.worker_cache = UserDataCache()
-        # Сохранение в базе
-        self.worker_db = Saver(connection_string)
+    # pylint: disable = too-many-arguments
+    def __init__(
+        self,
+        token: str,
+        connection_string: str,
+        *,
+        session=None,
+        vkinder: VKinder | None = None,
+        saver=None,
+        group_rate: float = GROUP_RPS,
+        shared_state: bool = False,
+        delivery: str = DELIVERY_MODE,
+    ):
+        """
+        Args:
+            token (str):             Токен группы
+            connection_string (str): Строка подключения к БД
+            session:                 Готовая сессия VK группы (для тестов)
+            vkinder (VKinder):       Готовый объект поиска (для тестов)
+            saver:                   Готовый объект работы с БД (для тестов)
+            group_rate (float):      Лимит запросов токена группы в секунду
+            shared_state (bool):     Сохранять состояние диалога в БД после
+                                     каждого сообщения (несколько процессов)
+            delivery (str):          Способ отправки анкет (cards.PAGE_LAYOUTS)
+        """
+        super().__init__(
+            UserDataCache(MAX_SESSIONS, SESSION_IDLE_TIMEOUT, MAX_SEEN_PROFILES),
+            delivery,
+        )
+        # Сохранение в базе (psycopg2 не нужен, если хранилище передано готовым)
+        if saver is None:
+            # pylint: disable = import-outside-toplevel
+            from database import Saver
+
+            saver = Saver(
+                connection_string,
+                pool_size=(DB_POOL_MIN, DB_POOL_MAX),
+                flush_interval=DB_FLUSH_INTERVAL,
+                flush_rows=DB_FLUSH_ROWS,
+            )
+        self.worker_db = saver
 
         # Объекты работы с api vk
         self.token = token
-        self.session = self.get_vk_session(token)
-        self.api = self.session.get_api()
-        self.vkinder = VKinder(VK_USER_TOKEN)
-        # Количество сохраняемых пользователей за один поиск
-        self.users_in_find = 5
-
-        # Состояния при работе с пользователем
-        self.step_handlers = {
-            None: self.process_age,
-            "age": self.process_gender,
-            "gender": self.process_city,
-            "city": self.process_status,
-            "status": self.process_search_users,
-            "final": self.process_search_users,
-            "again": self.process_age,
-        }
+        self.session = session or get_session(token)
+        self.api = get_api(self.session)
+        self.vkinder = vkinder or VKinder(
+            VK_USER_TOKEN,
+            store=self.worker_db if CACHE_PERSISTENT else None,
+            index=ProfileIndex(self.worker_db, INDEX_TTL) if INDEX_ENABLED else None,
+        )
+
+        # Исходящие сообщения: очередь и общий лимит токена группы
+        self.bucket = get_bucket(token, group_rate)
+        self.sender = MessageSender(
+            self.deliver_message, deliver_many=self.deliver_many
+        )
+
+        # Состояние диалогов в общей БД для распределённого режима
+        self.shared_state = shared_state
+
+        # Фоновая загрузка следующих страниц анкет
+        self.prefetch_executor = ThreadPoolExecutor(
+            thread_name_prefix="vkinder-prefetch"
+        )
+
+    def warm_up(self, connections: int = DB_POOL_MIN) -> None:
+        """
+        Прогрев после запуска (выполняется в фоновом потоке): соединения с БД
+        и VK API, очистка устаревшего кэша в БД и загрузка NumPy. Первые
+        сообщения после перезапуска не ждут этой работы.
+
+        Args:
+            connections (int): Сколько соединений с БД открыть заранее
+        """
+        started = time.perf_counter()
+        numpy_module()
+        try:
+            self.worker_db.warm_up(connections)
+            if CACHE_PERSISTENT:
+                self.worker_db.cache_purge()
+        # pylint: disable = broad-exception-caught
+        except Exception as error:
+            logging.warning("Не удалось прогреть соединения с БД: %s", error)
+        try:
+            call_limited(self.bucket, self.api.utils.getServerTime, retries=0)
+        except (ApiError, TransportError) as error:
+            logging.warning("Не удалось прогреть токен группы: %s", error)
+        self.vkinder.warm_up()
+        logging.info("Прогрев завершён за %.2f с", time.perf_counter() - started)
 
     def send_message(
         self, user_id: int, message: str, attachments: str | None = None
     ) -> None:
         """
-        Отправка сообщения пользователю.
+        Отправка сообщения пользователю через очередь исходящих сообщений.
 
         Args:
             user_id (int): Идентификатор пользователя.
             message (str): Сообщение.
             attachments (str, optional): Прикрепленные объекты VK. Defaults to None.
         """
+        self.sender.send(user_id, message, attachments)
+
+    def deliver_message(
+        self,
+        user_id: int,
+        message: str,
+        attachments: str | None = None,
+        template: str | None = None,
+    ) -> None:
+        """
+        Непосредственная отправка сообщения с учётом лимита запросов.
+
+        Args:
+            user_id (int): Идентификатор пользователя.
+            message (str): Сообщение.
+            attachments (str, optional): Прикрепленные объекты VK. Defaults to None.
+            template (str, optional): Шаблон сообщения (карусель) в JSON.
+        """
         try:
-            self.api.messages.send(
-                user_id=user_id, message=message, attachment=attachments, random_id=0
+            call_limited(
+                self.bucket,
+                self.api.messages.send,
+                user_id=user_id,
+                message=message,
+                attachment=attachments,
+                template=template,
+                random_id=0,
             )
-        except ApiError as error:
+        except (ApiError, TransportError) as error:
             logging.error("Ошибка отправки сообщения: %s", error)
 
-    def send_profiles(self, user_id: int, profiles: list) -> None:
+    def deliver_many(self, user_id: int, batch: list) -> None:
+        """
+        Отправка нескольких сообщений пользователю одним запросом execute
+        (сообщения доставляются по порядку).
+
+        Args:
+            user_id (int): Идентификатор пользователя
+            batch (list):  Сообщения (cards.PageMessage или пары (сообщение, вложения))
+        """
+        calls = [
+            ("messages.send", self.message_params(user_id, *item)) for item in batch
+        ]
+        try:
+            call_many(self.call, calls)
+        except (ApiError, TransportError) as error:
+            logging.error("Ошибка отправки сообщений: %s", error)
+
+    def call(self, method: str, **params):
+        """
+        Вызов метода API от имени группы с учётом лимита токена группы.
+
+        Args:
+            method (str): Имя метода, например "execute"
+            **params:     Параметры метода
+
+        Returns:
+            Ответ метода
+        """
+        return call_limited(self.bucket, self.session.method, method, params)
+
+    def close(self) -> None:
+        """
+        Завершение работы: отправка оставшихся сообщений и сохранение диалогов.
+        """
+        self.prefetch_executor.shutdown(wait=False, cancel_futures=True)
+        self.sender.close()
+        self.persist_sessions(self.worker_cache.drain())
+        self.worker_db.close()
+        logging.info("Статистика кэшей: %s", self.vkinder.cache_stats())
+        logging.info("Статистика токенов: %s", self.vkinder.token_stats())
+        logging.info("Статистика поиска: %s", self.vkinder.planner.stats())
+
+    def send_profiles(
+        self, user_id: int, profiles: list, header: str | None = None
+    ) -> None:
         """
         Отправка профилей
         Args:
             user_id (int):  ID пользователя
             profiles:       Список профилей пользователей
+            header (str):   Сообщение перед анкетами
 
         """
-        # Отправляем анкеты
-        for profile in profiles:
-            top_photos = self.vkinder.get_top_photos(profile["id"])
-            attachments = ",".join(
-                [f"photo{photo['owner_id']}_{photo['id']}" for photo in top_photos]
-            )
-            self.send_message(user_id, f"https://vk.com/id{profile['id']}", attachments)
+        # Карточки анкет, не подготовленных заранее (кэш или один запрос фото)
+        cards = self.vkinder.get_profile_cards(self.missing_cards(profiles))
+
+        # Отправляем заголовок и анкеты одной пачкой
+        self.sender.send_many(user_id, self.page_messages(profiles, cards, header))
 
-            # Добавим задержку для ограничения контроля флуда
-            time.sleep(1)
+    def send_prompt(self, user_id: int, handler_name: str) -> str:
+        """
+        Отправка вопроса шага.
+
+        Args:
+            user_id (int):      Идентификатор пользователя.
+            handler_name (str): Имя обработчика шага.
+
+        Returns:
+            str: Статус пользователя в боте.
+        """
+        message, next_step = self.prompt_steps[handler_name]
+        self.send_message(user_id, message)
+        return next_step
 
     def process_age(self, user_id: int, *_) -> str:
         """
@@ -271,8 +627,7 @@ class VkBot:
         Returns:
             str: Статус пользователя в боте.
         """
-        self.send_message(user_id, messages.PROCESS_AGE)
-        return "age"
+        return self.send_prompt(user_id, "process_age")
 
     def process_gender(self, user_id: int, *_) -> str:
         """
@@ -284,8 +639,7 @@ class VkBot:
         Returns:
             str: Статус пользователя в боте.
         """
-        self.send_message(user_id, messages.PROCESS_GENDER)
-        return "gender"
+        return self.send_prompt(user_id, "process_gender")
 
     def process_city(self, user_id: int, *_) -> str:
         """
@@ -297,8 +651,7 @@ class VkBot:
         Returns:
             str: Статус пользователя в боте.
         """
-        self.send_message(user_id, messages.PROCESS_CITY)
-        return "city"
+        return self.send_prompt(user_id, "process_city")
 
     def process_status(self, user_id: int, *_) -> str:
         """
@@ -310,72 +663,79 @@ class VkBot:
         Returns:
             str: Статус пользователя в боте.
         """
-        self.send_message(user_id, messages.PROCESS_STATUS)
-        return "status"
+        return self.send_prompt(user_id, "process_status")
 
-    def process_search_users(self, user_id: int, text: str, current_step: str) -> str:
+    def process_search_users(self, user_id: int, data: Session) -> str:
         """
         Обработка поиска пользователей
 
         Args:
-            user_id (int): Идентификатор пользователя
-            text (str): Текст сообщения
-            current_step (str): Текущий шаг
+            user_id (int):  Идентификатор пользователя
+            data (Session): Диалог пользователя
 
         Returns:
             str: Следующий шаг
         """
-        data = self.worker_cache.get_user_data(user_id)
-
-        # Если мы заполняем данные
-        if current_step == "status":
-            data["status"] = text
-
-        # Иначе ищем пользователей
-        age, gender, city, status = (
-            data["age"],
-            data["gender"],
-            data["city"],
-            data["status"],
-        )
-
-        users = self.vkinder.search_users(
-            age, gender, city, status, offset=data["offset"]
-        )
+        current_step = data.step
+        pipeline = self.candidate_pipeline(data)
+        seen = self.seen_profiles(user_id, data)
+        profiles = pipeline.next_page(seen)
 
         # Найдены ли пользователи
-        if users is None:
+        if profiles is None:
             self.send_message(user_id, messages.ERROR_TOKEN)
             return current_step
-        elif not users:
-            self.send_message(user_id, messages.ERROR_FIND)
+        elif not profiles:
+            self.send_message(user_id, self.empty_result_message(current_step))
             return current_step
 
-        data["offset"] += self.users_in_find
-        data["profiles"] = [
-            user
-            for user in users
-            if not user.get("is_closed", True)
-            and user["id"] not in self.worker_cache.get_user_data(user_id).get("in_db")
-        ][: self.users_in_find]
-
-        # Добавим интуитивное взаимодействие
-        self.send_message(
-            user_id,
-            messages.PROCESS_FINAL
-            if current_step == "status"
-            else messages.PROCESS_NEXT_PROFILES,
-        )
-
-        self.send_profiles(user_id, data["profiles"])
+        data.offset = pipeline.offset
+        data.profiles = profiles
+        self.send_profiles(user_id, profiles, self.search_header(current_step))
 
-        profiles_id = [profile["id"] for profile in data["profiles"]]
         # Сохраняем новые результаты в бд
-        self.worker_db.save_session_to_db(user_id, profiles_id)
-        # Добавим в список найденных пользователей, чтобы не обращаться заново к базе
-        data["in_db"].extend(profiles_id)
+        self.worker_db.save_session_to_db(
+            user_id, self.remember_profiles(data, profiles)
+        )
+        # Готовим следующую страницу, пока пользователь смотрит текущую
+        pipeline.prefetch(seen)
         return "final"
 
+    def seen_profiles(self, user_id: int, data: Session):
+        """
+        Показанные пользователю анкеты для отбора кандидатов.
+
+        В распределённом режиме пользователю могли показывать анкеты другие
+        процессы, поэтому кандидаты дополнительно проверяются по БД.
+
+        Args:
+            user_id (int):  Идентификатор пользователя
+            data (Session): Диалог пользователя
+
+        Returns:
+            SeenIndex | SharedSeen: Показанные анкеты
+        """
+        if self.shared_state:
+            return SharedSeen(data.seen, self.worker_db, user_id)
+        return data.seen
+
+    def create_pipeline(self, params: dict) -> CandidatePipeline:
+        """
+        Создание буфера кандидатов с фоновой загрузкой.
+
+        Args:
+            params (dict): Параметры поиска.
+
+        Returns:
+            CandidatePipeline: Буфер кандидатов.
+        """
+        return CandidatePipeline(
+            self.vkinder.iter_profiles(**params, page_size=SEARCH_FETCH_COUNT),
+            self.vkinder.get_profile_cards,
+            self.prefetch_executor,
+            scorer=self.scorer,
+        )
+
     def process_message(self, event) -> None:
         """
         Обработка входящего сообщения.
@@ -383,91 +743,93 @@ class VkBot:
         Args:
             event: Событие.
         """
-        current_data = self.worker_cache.get_user_data(event.user_id)
-        if current_data is None:
-            self.worker_cache.initialize_user_data(event.user_id, self.worker_db)
+        with MESSAGE_LATENCY.time():
+            self._process_message(event)
 
-            # Отправим приветствие
-            greet_message = (
-                messages.GREET_AGAIN
-                if self.worker_cache.get_user_data(event.user_id).get("in_db")
-                else messages.GREET_FIRST
-            )
-            self.send_message(event.user_id, greet_message)
-            current_step = None
-        else:
-            current_step = current_data["step"]
-
-        self.handle_current_step(event.user_id, event.text, current_step)
-
-    def handle_current_step(self, user_id: int, text: str, current_step: str) -> None:
+    def _process_message(self, event) -> None:
         """
-        Обработка текущего шага бота
+        Обработка входящего сообщения без замера времени.
 
         Args:
-            user_id (int):      Идентификатор пользователя
-            text (str):         Текст сообщения
-            current_step (str): Текущий шаг
+            event: Событие.
         """
-        if text.lower() == messages.AGAIN_SEARCH.lower():
-            self.send_message(
-                user_id, "\n".join([messages.GREET_AGAIN, messages.PROCESS_AGE])
+        data = self.worker_cache.get_user_data(event.user_id)
+        if data is not None and self.shared_state:
+            data = self.refresh_shared_state(event.user_id, data)
+        if data is None:
+            # Восстанавливаем диалог, сохранённый при вытеснении или перезапуске
+            data = self.worker_cache.initialize_user_data(
+                event.user_id,
+                self.worker_db.get_user_data_from_db(event.user_id),
+                self.worker_db.load_state(event.user_id),
             )
-            self.worker_cache.get_user_data(user_id)["step"] = "age"
-            return
-
-        if current_step in self.step_handlers:
-            handler = self.step_handlers[current_step]
-            if self.is_valid_input(text, current_step):
-                next_step = handler(user_id, text, current_step)
-                self.worker_cache.get_user_data(user_id)[current_step] = text
-            else:
-                self.send_message(user_id, messages.ERROR_MESSAGE_DATA)
-                next_step = current_step
-        else:
-            self.send_message(user_id, messages.ERROR_MESSAGE_DATA)
-            next_step = current_step
+            # Отправим приветствие
+            if data.step is None:
+                self.send_message(event.user_id, self.greet_message(data))
 
-        self.worker_cache.get_user_data(user_id)["step"] = next_step
+        self.handle_current_step(event.user_id, event.text, data)
+        if self.shared_state:
+            # Диалог можно продолжить в другом процессе после смены шардов
+            self.persist_sessions([(event.user_id, data.export_state())])
+        self.persist_sessions(self.worker_cache.collect_evicted())
 
-    @staticmethod
-    def get_vk_session(token: str) -> vk_api.VkApi | None:
+    def refresh_shared_state(self, user_id: int, data: Session) -> Session:
         """
-        Получение сессии VK.
+        Сверка диалога в памяти с общей БД (распределённый режим).
+
+        Пока шард пользователя обслуживал другой процесс, диалог мог
+        продвинуться: тогда локальный диалог устарел и заменяется
+        сохранённым состоянием (буфер кандидатов создаётся заново).
 
         Args:
-            token (str): Токен пользователя.
+            user_id (int):  Идентификатор пользователя
+            data (Session): Диалог в памяти
 
         Returns:
-            vk_api.VkApi or None: Объект сессии VK или None при ошибке.
+            Session: Актуальный диалог
         """
-        try:
-            session = vk_api.VkApi(token=token)
-        except vk_api.exceptions.ApiError as error:
-            logging.error(error)
-            return None
-        return session
+        state = self.worker_db.load_state(user_id)
+        if state is None or state == data.export_state():
+            return data
+        return self.worker_cache.initialize_user_data(user_id, data.seen, state)
 
-    @staticmethod
-    def is_valid_input(text: str, step: str) -> bool:
+    def persist_sessions(self, sessions: list) -> None:
         """
-        Проверка корректности ввода состояния.
+        Сохранение вытесненных из кэша диалогов в БД.
 
         Args:
-            text (str): Текст сообщения.
-            step (str): Шаг.
+            sessions (list): Пары (user_id, состояние).
+        """
+        for user_id, state in sessions:
+            try:
+                self.worker_db.save_state(user_id, state)
+            # pylint: disable = broad-exception-caught
+            except Exception as error:
+                logging.error("Ошибка сохранения диалога %s: %s", user_id, error)
+                self.worker_cache.save_failed(user_id)
+            else:
+                self.worker_cache.confirm_saved(user_id)
 
-        Returns:
-            bool: True, если ввод корректен, иначе False.
-        """
-        valid_inputs = {
-            None: lambda text: True,
-            "age": lambda text: text.isdigit() and (12 < int(text) < 90),
-            "gender": lambda text: text in ("1", "2"),
-            "city": lambda text: text.isdigit(),
-            "status": lambda text: text in ("0", "1", "2", "3", "4", "5"),
-            "final": lambda text: text.lower()
-            in [messages.NEXT_PEOPLE.lower(), messages.AGAIN_SEARCH.lower()],
-            "again": lambda text: text.lower() == messages.AGAIN_SEARCH.lower(),
-        }
-        return valid_inputs.get(step, lambda text: False)(text)
+    def handle_current_step(self, user_id: int, text: str, data: Session) -> None:
+        """
+        Обработка текущего шага бота
+
+        Args:
+            user_id (int):  Идентификатор пользователя
+            text (str):     Текст сообщения
+            data (Session): Диалог пользователя
+        """
+        command = parse_command(text)
+        if self.is_again_command(command):
+            self.send_message(
+                user_id, "\n".join([messages.GREET_AGAIN, messages.PROCESS_AGE])
+            )
+            data.step = "age"
+            return
+
+        handler = self.resolve_handler(data, text, command)
+        if handler is None:
+            self.send_message(user_id, messages.ERROR_MESSAGE_DATA)
+            return
+        with STEP_LATENCY.time(step=data.step or "greet"):
+            data.step = handler(user_id, data)